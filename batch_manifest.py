@@ -0,0 +1,106 @@
+"""
+Module to load and validate a batch manifest of transactions.
+"""
+
+import csv
+import json
+import os
+from datetime import datetime
+from user_input import UserInput
+
+
+class BatchManifest:
+    """
+    This class loads the transactions of a headless batch run from a CSV or JSON manifest and validates them.
+
+    Each entry has the keys 'Filename' (empty for a transaction without a receipt), 'Date', 'Provider',
+    'Amount', 'Type', 'Category' and 'Payment Method', and optionally 'Notes' and 'Receipt Number'.
+    """
+
+    required_columns = ['Date', 'Provider', 'Amount', 'Type', 'Category', 'Payment Method']
+    optional_columns = ['Filename', 'Notes', 'Receipt Number']
+
+    def __init__(self, manifest_path: str, directory_path: str):
+        """
+        Initializes the BatchManifest instance.
+
+        Parameters:
+        manifest_path (str): Path to the CSV or JSON manifest.
+        directory_path (str): Directory containing the receipts named in the manifest.
+        """
+        self.manifest_path = manifest_path
+        self.directory_path = directory_path
+        self.entries = []
+        self.errors = []
+
+    def load(self) -> list[dict]:
+        """
+        Reads the manifest entries, stripping whitespace and filling in missing optional columns.
+
+        Returns:
+        list[dict]: Manifest entries.
+        """
+        if self.manifest_path.lower().endswith('.json'):
+            with open(self.manifest_path, encoding='utf-8') as manifest_file:
+                raw_entries = json.load(manifest_file)
+        else:
+            with open(self.manifest_path, newline='', encoding='utf-8-sig') as manifest_file:
+                raw_entries = list(csv.DictReader(manifest_file))
+        entries = []
+        for raw_entry in raw_entries:
+            entry = {key.strip(): str(value).strip() if value is not None else '' for key, value in raw_entry.items()}
+            for column in self.optional_columns:
+                entry.setdefault(column, '')
+            entries.append(entry)
+        self.entries = entries
+        return entries
+
+    def validate(self) -> list[str]:
+        """
+        Checks every entry with the same rules as the interactive prompts, before anything is changed.
+
+        Returns:
+        list[str]: Error messages, empty if the manifest is valid.
+        """
+        errors = []
+        seen_filenames = set()
+        seen_receipt_numbers = set()
+        for line_number, entry in enumerate(self.entries, start=1):
+            prefix = f"Entry {line_number}"
+            missing = [column for column in self.required_columns if not entry.get(column)]
+            if missing:
+                errors.append(f"{prefix}: missing {', '.join(missing)}.")
+                continue
+            date_error = UserInput.date_error(entry['Date'])
+            if date_error:
+                errors.append(f"{prefix}: {date_error}.")
+            else:
+                try:
+                    datetime.strptime(entry['Date'], '%m/%d/%Y')
+                except ValueError:
+                    errors.append(f"{prefix}: date '{entry['Date']}' is not a real MM/DD/YYYY date.")
+            amount_error = UserInput.amount_error(entry['Amount'])
+            if amount_error:
+                errors.append(f"{prefix}: {amount_error}.")
+            for column, choices in [('Type', UserInput.type_choices), ('Category', UserInput.category_choices),
+                                    ('Payment Method', UserInput.payment_method_choices)]:
+                if entry[column] not in choices:
+                    errors.append(f"{prefix}: {column} '{entry[column]}' is not one of {choices}.")
+            filename = entry['Filename']
+            if filename:
+                if not filename.lower().endswith('.pdf'):
+                    errors.append(f"{prefix}: '{filename}' is not a PDF file.")
+                elif not os.path.isfile(os.path.join(self.directory_path, filename)):
+                    errors.append(f"{prefix}: '{filename}' not found in {self.directory_path}.")
+                if filename in seen_filenames:
+                    errors.append(f"{prefix}: '{filename}' is listed more than once.")
+                seen_filenames.add(filename)
+            receipt_number = entry['Receipt Number']
+            if receipt_number:
+                if receipt_number[0] not in ('F', 'R'):
+                    errors.append(f"{prefix}: receipt number '{receipt_number}' must begin with 'F' or 'R'.")
+                if receipt_number in seen_receipt_numbers:
+                    errors.append(f"{prefix}: receipt number '{receipt_number}' is listed more than once.")
+                seen_receipt_numbers.add(receipt_number)
+        self.errors = errors
+        return errors
@@ -0,0 +1,186 @@
+"""
+Module to run the whole receipt workflow unattended from a batch manifest.
+"""
+
+import json
+import os
+import pandas as pd
+from batch_manifest import BatchManifest
+from browser_session_pool import BrowserSessionPool
+from ledger_batch_writer import LedgerBatchWriter
+from receipt_journal import ReceiptJournal
+from receipt_number_allocator import ReceiptNumberAllocator
+from submission_backend import create_backend
+from user_input import UserInput
+
+
+class BatchRunner:
+    """
+    This class renames the receipts, writes the ledger rows and submits the purchases listed in a manifest,
+    without prompting, and records the outcome of every entry in a JSON results file.
+    """
+
+    def __init__(self, directory_path: str, excel_file_loc: str, url: str, email: str, password: str,
+                 sessions: int = 1, backend: str = 'selenium'):
+        """
+        Initializes the BatchRunner instance.
+
+        Parameters:
+        directory_path (str): Directory containing the receipts.
+        excel_file_loc (str): Location of the Excel file.
+        url (str): URL of the login page.
+        email (str): User's email address.
+        password (str): User's password.
+        sessions (int): Number of headless browser sessions to submit with in parallel (default is 1).
+        backend (str): Submission backend, 'selenium' or 'http' (default is 'selenium').
+        """
+        self.directory_path = directory_path
+        self.excel_file_loc = excel_file_loc
+        self.url = url
+        self.email = email
+        self.password = password
+        self.sessions = sessions
+        self.backend = backend
+        self.allocator = ReceiptNumberAllocator.for_workbook(excel_file_loc)
+        self.journal = ReceiptJournal.for_workbook(excel_file_loc)
+
+    def build_transaction(self, entry: dict, entry_number: int) -> dict:
+        """
+        Builds the transaction details of a manifest entry, allocating a receipt number if it has none.
+
+        Parameters:
+        entry (dict): Validated manifest entry.
+        entry_number (int): Position of the entry in the manifest.
+
+        Returns:
+        dict: Transaction details in the same form as UserInput.get_user_inputs.
+        """
+        user_input = UserInput(entry['Filename'], self.excel_file_loc, entry_number, bool(entry['Filename']),
+                               self.allocator)
+        user_input.date = entry['Date']
+        user_input.provider = entry['Provider']
+        user_input.amount = entry['Amount']
+        receipt_number = entry['Receipt Number']
+        if receipt_number:
+            self.allocator.reserve(receipt_number)
+        else:
+            receipt_number = self.allocator.allocate('R' if entry['Payment Method'] == "HSA Account" else 'F')
+        return user_input.build_transaction(entry['Type'], entry['Category'], entry['Payment Method'],
+                                            receipt_number, entry['Notes'])
+
+    def rename_receipt(self, filename: str, new_filename: str):
+        """
+        Renames a receipt to its receipt number and amount.
+
+        Parameters:
+        filename (str): Current name of the PDF file.
+        new_filename (str): New name of the PDF file, without extension.
+        """
+        file_path = os.path.join(self.directory_path, filename)
+        new_file_path = os.path.join(self.directory_path, new_filename + '.pdf')
+        if os.path.exists(new_file_path):
+            raise FileExistsError(f"'{new_filename}.pdf' already exists in {self.directory_path}.")
+        os.rename(file_path, new_file_path)
+
+    @staticmethod
+    def write_results(results_path: str, results: dict):
+        """
+        Writes the results file.
+
+        Parameters:
+        results_path (str): Path to the JSON results file.
+        results (dict): Results to write.
+        """
+        with open(results_path, 'w', encoding='utf-8') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    def run(self, manifest_path: str, results_path: str) -> dict:
+        """
+        Validates the manifest and, if it is valid, processes every entry end to end.
+
+        Parameters:
+        manifest_path (str): Path to the CSV or JSON manifest.
+        results_path (str): Path to the JSON results file.
+
+        Returns:
+        dict: Results, as written to the results file.
+
+        Raises:
+        Exception: Whatever stopped the batch, such as a failed ledger save or submission, after the results
+                   file was written with the status 'failed', the error and the entries processed so far.
+        """
+        manifest = BatchManifest(manifest_path, self.directory_path)
+        manifest.load()
+        errors = manifest.validate()
+        results = {'manifest': manifest_path, 'status': 'invalid', 'errors': errors, 'entries': []}
+        if errors:
+            self.write_results(results_path, results)
+            print(f"Manifest has {len(errors)} error(s); nothing was processed. See {results_path}.")
+            return results
+
+        entry_results = []
+        transactions = []
+        # Until the batch completes, the results file records it as failed with the entries processed so far
+        results.update(status='failed', entries=entry_results)
+        try:
+            with LedgerBatchWriter(self.excel_file_loc, self.journal) as ledger_writer:
+                for entry_number, entry in enumerate(manifest.entries, start=1):
+                    entry_result = {'entry': entry_number, 'filename': entry['Filename'], 'receipt_number': None,
+                                    'renamed': False, 'ledger': False, 'purchase_created': False,
+                                    'uploaded': False, 'error': None}
+                    entry_results.append(entry_result)
+                    try:
+                        transaction = self.build_transaction(entry, entry_number)
+                        entry_result['receipt_number'] = transaction['Receipt Number']
+                        self.journal.begin(transaction, entry['Filename'] or None)
+                        if entry['Filename']:
+                            self.rename_receipt(entry['Filename'], transaction['New Filename'])
+                            self.journal.record(transaction['Receipt Number'], 'renamed')
+                            entry_result['renamed'] = True
+                    except Exception as error:
+                        entry_result['error'] = str(error)
+                        if entry_result['receipt_number'] is not None:
+                            self.journal.discard(entry_result['receipt_number'])
+                        continue
+                    ledger_writer.add_transaction(transaction)
+                    transactions.append((entry_result, transaction))
+            for entry_result, transaction in transactions:
+                entry_result['ledger'] = True
+
+            if transactions:
+                self.submit(transactions)
+            self.journal.compact()
+            results['status'] = 'completed'
+        except Exception as error:
+            results['error'] = str(error)
+            print(f"Batch failed: {error}. See {results_path}.")
+            raise
+        finally:
+            self.write_results(results_path, results)
+        failed = sum(1 for entry_result in entry_results if entry_result['error'])
+        print(f"Processed {len(entry_results)} entries, {failed} with errors. See {results_path}.")
+        return results
+
+    def submit(self, transactions: list[tuple[dict, dict]]):
+        """
+        Creates the portal purchases and uploads the receipts, recording the outcome per entry.
+
+        Parameters:
+        transactions (list[tuple[dict, dict]]): Entry result and transaction details of each processed entry.
+        """
+        df = pd.DataFrame([transaction for entry_result, transaction in transactions])
+        entry_results = [entry_result for entry_result, transaction in transactions]
+        upload_indexes = {index for index, entry_result in zip(df.index, entry_results) if entry_result['renamed']}
+        destination_directory = os.path.join(self.directory_path, "Receipts")
+        if self.sessions > 1 and self.backend == 'selenium':
+            with BrowserSessionPool(self.url, self.email, self.password, size=self.sessions) as pool:
+                results = pool.submit(df, self.directory_path, destination_directory, upload_indexes, self.journal)
+        else:
+            with create_backend(self.backend, self.url, self.email, self.password) as backend:
+                results = backend.submit(df, self.directory_path, destination_directory, upload_indexes,
+                                         self.journal)
+        for result, entry_result in zip(results, entry_results):
+            entry_result['purchase_created'] = result['purchase_created']
+            entry_result['uploaded'] = result['uploaded']
+            if result['error']:
+                entry_result['error'] = result['error']
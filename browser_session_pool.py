@@ -0,0 +1,214 @@
+"""
+Module to submit transactions over several logged-in browser sessions in parallel.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from browser_setup import BrowserSetup
+from form_automation import FormAutomation
+from purchase_index import PurchaseIndex
+from receipt_uploader import ReceiptUploader
+
+
+class BrowserSessionPool:
+    """
+    This class starts several logged-in BrowserSetup sessions, headless by default, splits the
+    transactions into one shard per session and lets each session create its shard's purchases and
+    upload their receipts, while capping how many portal actions run at the same time.
+
+    By default at most default_max_concurrency actions are in flight, however many sessions are started,
+    so a large pool does not flood the portal; extra sessions still overlap their page loads and waits.
+    """
+
+    default_max_concurrency = 2
+
+    def __init__(self, url: str, email: str, password: str, size: int = 2, headless: bool = True,
+                 max_concurrency: int = None, wait_timeouts: dict = None, session_factory=None):
+        """
+        Initializes the BrowserSessionPool instance.
+
+        Parameters:
+        url (str): URL of the login page.
+        email (str): User's email address.
+        password (str): User's password.
+        size (int): Number of browser sessions to start (default is 2).
+        headless (bool): Whether to run the browsers without a window (default is True).
+        max_concurrency (int): Most portal actions in flight at once (default is None, which uses
+                               default_max_concurrency, or the pool size if that is smaller).
+        wait_timeouts (dict): Timeouts in seconds per page state, see PortalWaits (default is None).
+        session_factory (callable): Called without arguments to start each logged-in session (default is None,
+                                    which starts a BrowserSetup).
+        """
+        self.url = url
+        self.email = email
+        self.password = password
+        self.size = max(1, size)
+        self.headless = headless
+        self.wait_timeouts = wait_timeouts
+        self.session_factory = session_factory
+        self.max_concurrency = max(1, min(max_concurrency or self.default_max_concurrency, self.size))
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self.sessions = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def start(self):
+        """
+        Starts and logs in the browser sessions in parallel.
+
+        Sessions that fail to start are reported and left out; the pool works with the others.
+
+        Raises:
+        RuntimeError: If no session could be started.
+        """
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            futures = [executor.submit(self._start_session) for worker in range(self.size)]
+            for worker, future in enumerate(futures):
+                try:
+                    self.sessions.append(future.result())
+                except Exception as error:
+                    print(f"Browser session {worker + 1} failed to start: {error}")
+        if not self.sessions:
+            raise RuntimeError("No browser session could be started.")
+
+    def _start_session(self) -> BrowserSetup:
+        """
+        Starts one browser session and logs it in, reusing the saved session when it is still valid.
+
+        Returns:
+        BrowserSetup: Logged-in browser session.
+        """
+        if self.session_factory is not None:
+            return self.session_factory()
+        browser = BrowserSetup(self.url, self.email, self.password, self.wait_timeouts, self.headless)
+        browser.start()
+        return browser
+
+    def shard(self, df: pd.DataFrame) -> list[pd.DataFrame]:
+        """
+        Splits the transactions round-robin into one shard per session.
+
+        Parameters:
+        df (pd.DataFrame): Transactions to split.
+
+        Returns:
+        list[pd.DataFrame]: Non-empty shards, keeping the original index.
+        """
+        shards = [df.iloc[worker::len(self.sessions)] for worker in range(len(self.sessions))]
+        return [shard for shard in shards if not shard.empty]
+
+    def _run_shard(self, worker: int, shard: pd.DataFrame, directory: str, destination_directory: str,
+                   upload_indexes: set, journal=None) -> list[dict]:
+        """
+        Creates the purchases of one shard and uploads their receipts in one session.
+
+        Parameters:
+        worker (int): Position of the session in the pool.
+        shard (pd.DataFrame): Transactions of this session.
+        directory (str): Directory containing the receipts, or None to skip uploads.
+        destination_directory (str): Directory to move the uploaded receipts.
+        upload_indexes (set): Indexes of the transactions whose receipts are uploaded, or None for all.
+        journal (ReceiptJournal): Journal recording each step, or None.
+
+        Returns:
+        list[dict]: Outcome of each transaction of the shard.
+        """
+        browser = self.sessions[worker]
+        form_automation = FormAutomation(browser, shard)
+        results = []
+        for index, row in shard.iterrows():
+            result = {'index': index, 'worker': worker, 'purchase_created': False, 'uploaded': False, 'error': None}
+            results.append(result)
+            try:
+                if journal is not None:
+                    journal.record(row.get('Receipt Number'), 'purchase_started')
+                with self.semaphore:
+                    form_automation.fill_row(row)
+                result['purchase_created'] = True
+                if journal is not None:
+                    journal.record(row.get('Receipt Number'), 'purchase_created')
+            except Exception as error:
+                result['error'] = str(error)
+
+        if directory is None:
+            return results
+        purchase_index = PurchaseIndex(browser)
+        for (index, row), result in zip(shard.iterrows(), results):
+            if not result['purchase_created'] or row['In HSA?'] != "Y":
+                continue
+            if upload_indexes is not None and index not in upload_indexes:
+                continue
+            uploader = ReceiptUploader(browser, shard.loc[[index]], directory, destination_directory,
+                                       purchase_index)
+            try:
+                if journal is not None:
+                    journal.record(row.get('Receipt Number'), 'upload_started')
+                with self.semaphore:
+                    outcome = uploader.search_and_upload_receipt().get(f"{row['New Filename']}.pdf")
+                result['uploaded'] = outcome == 'uploaded'
+                if outcome != 'uploaded':
+                    result['error'] = "Purchase not found on the portal."
+                elif journal is not None:
+                    # The uploader moves the receipt to the destination right after uploading it
+                    journal.record(row.get('Receipt Number'), 'uploaded')
+                    journal.record(row.get('Receipt Number'), 'archived')
+            except Exception as error:
+                result['error'] = str(error)
+        return results
+
+    def submit(self, df: pd.DataFrame, directory: str = None, destination_directory: str = None,
+               upload_indexes: set = None, journal=None) -> list[dict]:
+        """
+        Creates the purchases and uploads the receipts of the transactions across all sessions.
+
+        Parameters:
+        df (pd.DataFrame): Transactions, in the form of the ledger rows, with a unique index.
+        directory (str): Directory containing the receipts (default is None, which skips uploads).
+        destination_directory (str): Directory to move the uploaded receipts (default is None).
+        upload_indexes (set): Indexes of the transactions whose receipts are uploaded (default is None,
+                              which uploads every transaction marked as in the HSA).
+        journal (ReceiptJournal): Journal recording each step (default is None).
+
+        Returns:
+        list[dict]: Index, session, 'purchase_created', 'uploaded' and 'error' of each transaction, in df order.
+
+        Raises:
+        ValueError: If the index of df has duplicates.
+        """
+        if not df.index.is_unique:
+            raise ValueError("The transactions need a unique index to be sharded.")
+        if not self.sessions:
+            self.start()
+        shards = self.shard(df)
+        with ThreadPoolExecutor(max_workers=len(shards) or 1) as executor:
+            futures = [executor.submit(self._run_shard, worker, shard, directory, destination_directory,
+                                       upload_indexes, journal) for worker, shard in enumerate(shards)]
+            results = [result for future in futures for result in future.result()]
+        position = {index: order for order, index in enumerate(df.index)}
+        return sorted(results, key=lambda result: position[result['index']])
+
+    def report(self):
+        """
+        Prints the time each session spent waiting for each portal state.
+        """
+        for worker, browser in enumerate(self.sessions):
+            print(f"Session {worker + 1}:")
+            browser.waits.report()
+
+    def close(self):
+        """
+        Quits every browser session.
+        """
+        for browser in self.sessions:
+            try:
+                browser.quit()
+            except Exception as error:
+                print(f"Could not close a browser session: {error}")
+        self.sessions = []
@@ -2,48 +2,156 @@
 Module to set up the browser and handle login.
 """
 
-import time
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
+from portal_session_store import PortalSessionStore
+from portal_waits import PortalWaits
+from instrumentation import instrumentation
 
 class BrowserSetup:
     """
     This class sets up the initial browser settings and logs in the user.
+
+    The browser is only started when its driver is first used. A session saved by an earlier run is
+    restored when the portal still accepts it; otherwise the user is logged in and the new session is saved.
     """
-    def __init__(self, url_open: str, EMAIL: str, PASSWORD: str):
+    cookie_fields = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'expiry')
+
+    def __init__(self, url_open: str, EMAIL: str, PASSWORD: str, wait_timeouts: dict = None, headless: bool = False,
+                 session_store: PortalSessionStore = None):
         """
-        Initializes the BrowserSetup instance and logs in the user.
+        Initializes the BrowserSetup instance, without starting the browser yet.
 
         Parameters:
         url_open (str): URL of the login page.
         EMAIL (str): User's email address.
         PASSWORD (str): User's password.
+        wait_timeouts (dict): Timeouts in seconds per page state, see PortalWaits (default is None).
+        headless (bool): Whether to run Chrome without a window (default is False).
+        session_store (PortalSessionStore): Store of saved sessions (default is None, which uses the default file).
         """
         self.url_to_open = url_open
-        self.driver = None
+        self._driver = None
         self.EMAIL = EMAIL
         self.PASSWORD = PASSWORD
-        self.set_browser_up()
-        self.login()
+        self.headless = headless
+        self.session_store = session_store or PortalSessionStore()
+        self.session_restored = False
+        self.waits = PortalWaits(self, wait_timeouts)
+
+    @property
+    def driver(self) -> webdriver.Chrome:
+        """
+        Gets the WebDriver, starting the browser and logging in on first use.
+
+        Returns:
+        webdriver.Chrome: Logged-in WebDriver.
+        """
+        if self._driver is None:
+            self.start()
+        return self._driver
+
+    @property
+    def started(self) -> bool:
+        """
+        Checks if the browser has been started.
+
+        Returns:
+        bool: True if the browser is running, False otherwise.
+        """
+        return self._driver is not None
+
+    def start(self):
+        """
+        Starts the browser and restores the saved session, logging in if there is none or it has expired.
+        """
+        with instrumentation.span('portal.start_browser', headless=self.headless):
+            self.set_browser_up()
+        with instrumentation.span('portal.login'):
+            self.session_restored = self.restore_session()
+            if not self.session_restored:
+                self.login()
 
     def set_browser_up(self):
         """
         Sets up the Selenium WebDriver and opens the browser.
         """
         chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_experimental_option("detach", True)
-        self.driver = webdriver.Chrome(options=chrome_options)
+        if self.headless:
+            chrome_options.add_argument("--headless=new")
+            chrome_options.add_argument("--window-size=1920,1080")
+        else:
+            chrome_options.add_experimental_option("detach", True)
+        self._driver = webdriver.Chrome(options=chrome_options)
         self.driver.get(self.url_to_open)
-        self.driver.maximize_window()
-        time.sleep(3)
+        if not self.headless:
+            self.driver.maximize_window()
+        self.waits.login_form()
+
+    def restore_session(self) -> bool:
+        """
+        Loads the saved session cookies and probes the post-login page with them.
+
+        Returns:
+        bool: True if the portal accepted the saved session, False if the user has to log in.
+        """
+        session = self.session_store.load(self.url_to_open, self.EMAIL)
+        if session is None:
+            return False
+        for cookie in session['cookies']:
+            try:
+                self.driver.add_cookie({key: cookie[key] for key in self.cookie_fields if cookie.get(key) is not None})
+            except Exception:
+                # Cookies of another domain than the login page cannot be set from here
+                continue
+        self.driver.get(session['landing_url'])
+        try:
+            self.waits.wait_for('navigation', lambda driver: driver.execute_script(
+                "return document.readyState") == "complete")
+        except TimeoutException:
+            pass
+        if not self.driver.find_elements(By.ID, "login_email"):
+            instrumentation.count('session_restores')
+            return True
+        self.session_store.clear(self.url_to_open, self.EMAIL)
+        if self.driver.current_url != self.url_to_open:
+            self.driver.get(self.url_to_open)
+        self.waits.login_form()
+        return False
 
     def login(self):
         """
         Logs in the user using the provided email and password.
         """
+        instrumentation.count('portal_logins')
         user_field = self.driver.find_element(By.ID, value="login_email")
         user_field.send_keys(self.EMAIL)
         pass_field = self.driver.find_element(By.ID, value="login_pass")
         pass_field.send_keys(self.PASSWORD)
         sign_in_button_2 = self.driver.find_element(By.ID, value="login")
         sign_in_button_2.click()
+        self.save_session(sign_in_button_2)
+
+    def save_session(self, sign_in_button):
+        """
+        Saves the session once the login has left the login page.
+
+        Parameters:
+        sign_in_button (WebElement): Sign in button of the login page.
+        """
+        try:
+            self.waits.navigation_from(sign_in_button)
+        except TimeoutException:
+            return
+        if self.driver.find_elements(By.ID, "login_email"):
+            return
+        self.session_store.save(self.url_to_open, self.EMAIL, self.driver.get_cookies(), self.driver.current_url)
+
+    def quit(self):
+        """
+        Closes the browser if it was started.
+        """
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
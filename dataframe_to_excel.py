@@ -4,38 +4,37 @@ Module to handle processing and saving DataFrames to Excel.
 
 import pandas as pd
 from openpyxl import load_workbook
-from openpyxl.styles import Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
+from instrumentation import instrumentation
+from ledger_styles import LedgerStyles
 
 
 class DataFrameToExcel:
     """
     This class handles the processing and saving of DataFrames to Excel.
+
+    Rows are styled with the workbook's named ledger styles (see LedgerStyles), which are registered
+    once and assigned by name.
     """
 
-    def __init__(self, df: pd.DataFrame, workbook_path: str):
+    def __init__(self, df: pd.DataFrame, workbook_path: str, workbook=None):
         """
         Initializes the DataFrameToExcel instance.
 
         Parameters:
         df (pd.DataFrame): DataFrame containing the data.
         workbook_path (str): Path to the Excel workbook.
+        workbook (Workbook): Already loaded workbook to write into (default is None, which loads it from disk).
         """
         self.df = df
         self.workbook_path = workbook_path
-        self.workbook = load_workbook(self.workbook_path)
+        if workbook is None:
+            with instrumentation.span('excel.load_workbook'):
+                workbook = load_workbook(self.workbook_path)
+            instrumentation.count('workbook_loads')
+        self.workbook = workbook
         self.sheet = self.workbook.active
-        self.fill_colors = {
-            'R': PatternFill(start_color="92D050", end_color="92D050", fill_type="solid"),
-            'F': PatternFill(start_color="00B0F0", end_color="00B0F0", fill_type="solid"),
-            'default': PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        }
-        self.thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        LedgerStyles.register(self.workbook)
 
     def preprocess_data(self):
         """
@@ -45,46 +44,37 @@ class DataFrameToExcel:
         self.df['Date'] = pd.to_datetime(self.df['Date'], format='%m/%d/%Y')
         self.df.sort_values(by='Date', ascending=False, inplace=True)
 
-    def apply_cell_styles(self, cell, col_name: str):
-        """
-        Applies styles to a cell in the Excel sheet.
-
-        Parameters:
-        cell (Cell): Cell to apply styles to.
-        col_name (str): Name of the column the cell belongs to.
-        """
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = self.thin_border
-        if col_name.lower() == 'date':
-            cell.number_format = 'MM/DD/YYYY'
-        elif col_name.lower() == 'amount':
-            cell.number_format = '0.00'
-
-    def get_fill_color(self, receipt_number: str) -> PatternFill:
+    def get_style_names(self, receipt_number: str) -> list[str]:
         """
-        Gets the fill color based on the receipt number prefix.
+        Gets the named style of each column for a row, based on the receipt number prefix.
 
         Parameters:
         receipt_number (str): Receipt number.
 
         Returns:
-        PatternFill: Fill color for the cell.
+        list[str]: Style name of each DataFrame column.
         """
-        prefix = receipt_number[0] if isinstance(receipt_number, str) else ''
-        return self.fill_colors.get(prefix, self.fill_colors['default'])
+        return LedgerStyles.row_style_names(receipt_number, list(self.df.columns))
 
     def insert_data_into_sheet(self):
         """
         Inserts data from the DataFrame into the Excel sheet.
-        """
-        for index, row in self.df.iterrows():
-            self.sheet.insert_rows(2)
-            receipt_number = str(row['Receipt Number'])
-            fill_color = self.get_fill_color(receipt_number)
-            for col_num, (col_name, value) in enumerate(row.items(), start=1):
-                cell = self.sheet.cell(row=2, column=col_num, value=value)
-                self.apply_cell_styles(cell, col_name)
-                cell.fill = fill_color
+
+        The whole block is inserted below the header with a single row shift,
+        keeping the DataFrame order (newest first after preprocessing).
+        """
+        self.sheet.insert_rows(2, amount=len(self.df))
+        # Rows of the same kind share their list of style names
+        style_names = {}
+        for offset, row in enumerate(self.df.itertuples(index=False, name=None)):
+            row_num = 2 + offset
+            receipt_number = str(row[self.df.columns.get_loc('Receipt Number')])
+            prefix = receipt_number[:1]
+            if prefix not in style_names:
+                style_names[prefix] = self.get_style_names(receipt_number)
+            cells = [self.sheet.cell(row=row_num, column=col_num, value=value)
+                     for col_num, value in enumerate(row, start=1)]
+            LedgerStyles.apply_row(cells, style_names[prefix])
 
     def adjust_column_widths(self):
         """
@@ -98,13 +88,18 @@ class DataFrameToExcel:
         """
         Saves the workbook with changes.
         """
-        self.workbook.save(self.workbook_path)
+        with instrumentation.span('excel.save'):
+            self.workbook.save(self.workbook_path)
+        instrumentation.count('workbook_saves')
 
     def process(self):
         """
         Processes the DataFrame and saves it to the Excel sheet.
         """
-        self.preprocess_data()
-        self.insert_data_into_sheet()
-        self.adjust_column_widths()
+        with instrumentation.span('excel.preprocess', rows=len(self.df)):
+            self.preprocess_data()
+        with instrumentation.span('excel.insert_rows', rows=len(self.df)):
+            self.insert_data_into_sheet()
+        with instrumentation.span('excel.adjust_widths'):
+            self.adjust_column_widths()
         self.save_workbook()
@@ -0,0 +1,353 @@
+"""
+Module to index receipts and ledger rows so duplicate receipts are caught before they are numbered.
+"""
+
+import hashlib
+import os
+import re
+from datetime import datetime
+import pandas as pd
+from ledger_partitions import LedgerPartitions
+from pdf_cache import PDFCache
+from pdf_extraction_pool import PDFExtraction, PDFExtractionPool
+from receipt_field_extractor import ReceiptFieldExtractor
+
+
+class DuplicateIndex:
+    """
+    This class indexes the PDFs of the inbox and the Receipts archive, and the rows of the ledger, under
+    three keys held in dictionaries, so checking a file is a constant number of lookups:
+
+    - 'identical': the SHA-256 of the file content (the same download saved twice);
+    - 'same text': a fingerprint of the normalized text without times of day and page numbers (the same
+      receipt downloaded again, with a new print time or from another export);
+    - 'same transaction': the date, amount and provider (another document for a purchase already filed,
+      or a PDF matching a ledger row whose receipt was uploaded).
+
+    Ledger rows still waiting for their receipt (Attachments is not 'Y') are kept apart under 'awaiting
+    receipt': a PDF matching one is most likely that receipt, to be attached through the missing receipts
+    flow rather than filed again or discarded as a duplicate.
+
+    Hashes and text come from the PDFCache, so rebuilding the index at the start of a run only re-reads
+    files that changed. refresh rescans the folders and carries entries of moved files over without
+    hashing them again.
+    """
+
+    VOLATILE_PATTERN = re.compile(r'\b\d{1,2}:\d{2}(:\d{2})?\s*([ap]\.?m\.?)?|\bpage\s+\d+\s+of\s+\d+\b',
+                                  re.IGNORECASE)
+
+    def __init__(self, directories: list[str], excel_file_loc: str = None, pdf_cache: PDFCache = None,
+                 field_extractor: ReceiptFieldExtractor = None, min_confidence: float = 0.6):
+        """
+        Initializes the DuplicateIndex instance, empty until build is called.
+
+        Parameters:
+        directories (list[str]): Folders whose PDFs are indexed, such as the inbox and its Receipts archive.
+        excel_file_loc (str): Location of the Excel file whose rows are indexed (default is None).
+        pdf_cache (PDFCache): Cache of hashes and extracted text (default is None, which opens the default cache).
+        field_extractor (ReceiptFieldExtractor): Extractor of the date, amount and provider (default is None,
+                                                 which learns the providers from the ledger).
+        min_confidence (float): Lowest confidence of the extracted fields for a transaction key (default is 0.6).
+        """
+        self.directories = [directory for directory in directories if directory]
+        self.excel_file_loc = excel_file_loc
+        self.pdf_cache = pdf_cache or PDFCache()
+        self.field_extractor = field_extractor
+        self.min_confidence = min_confidence
+        self.files = {}
+        self.keys = {'identical': {}, 'same text': {}, 'same transaction': {}, 'awaiting receipt': {}}
+
+    @classmethod
+    def for_inbox(cls, directory_path: str, excel_file_loc: str = None, pdf_cache: PDFCache = None,
+                  field_extractor: ReceiptFieldExtractor = None) -> 'DuplicateIndex':
+        """
+        Builds the index of an inbox folder, its Receipts archive and the ledger.
+
+        Parameters:
+        directory_path (str): Directory containing the PDF receipts.
+        excel_file_loc (str): Location of the Excel file (default is None).
+        pdf_cache (PDFCache): Cache of hashes and extracted text (default is None).
+        field_extractor (ReceiptFieldExtractor): Extractor of the date, amount and provider (default is None).
+
+        Returns:
+        DuplicateIndex: Built index.
+        """
+        index = cls([directory_path, os.path.join(directory_path, "Receipts")], excel_file_loc, pdf_cache,
+                    field_extractor)
+        index.build()
+        return index
+
+    @classmethod
+    def fingerprint(cls, text: str) -> str | None:
+        """
+        Fingerprints receipt text, ignoring layout, case, times of day and page numbers.
+
+        Parameters:
+        text (str): Extracted text.
+
+        Returns:
+        str | None: Fingerprint, or None if the text is empty (such as a scanned image).
+        """
+        normalized = ReceiptFieldExtractor.normalize(cls.VOLATILE_PATTERN.sub(' ', text or ''))
+        if not normalized:
+            return None
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def transaction_key(date, amount, provider) -> tuple | None:
+        """
+        Builds the key of a transaction from its date, amount and provider.
+
+        Parameters:
+        date: Date as a datetime or an MM/DD/YYYY string.
+        amount: Amount as a number or a string.
+        provider (str): Provider name.
+
+        Returns:
+        tuple | None: Date, amount in cents and normalized provider, or None if a value is missing or invalid.
+        """
+        if date is None or amount is None or not provider or pd.isna(date) or pd.isna(amount):
+            return None
+        try:
+            if not isinstance(date, datetime):
+                date = datetime.strptime(str(date).strip(), '%m/%d/%Y')
+            cents = round(float(str(amount).replace('$', '').replace(',', '')) * 100)
+        except ValueError:
+            return None
+        return date.strftime('%Y-%m-%d'), cents, ReceiptFieldExtractor.normalize(str(provider))
+
+    def get_field_extractor(self) -> ReceiptFieldExtractor:
+        """
+        Gets the field extractor, learning the providers from the ledger on first use.
+
+        Returns:
+        ReceiptFieldExtractor: Field extractor.
+        """
+        if self.field_extractor is None:
+            if self.excel_file_loc:
+                self.field_extractor = ReceiptFieldExtractor.from_ledger(self.excel_file_loc)
+            else:
+                self.field_extractor = ReceiptFieldExtractor()
+        return self.field_extractor
+
+    def build(self):
+        """
+        Indexes every PDF of the folders, extracting the uncached ones in parallel, and the ledger rows.
+
+        The cache first forgets the files that were deleted or moved since the last build.
+        """
+        self.pdf_cache.prune()
+        file_paths = [file_path for directory in self.directories if os.path.isdir(directory)
+                      for file_path in PDFExtractionPool.list_pdf_files(directory)]
+        if file_paths:
+            with PDFExtractionPool(cache=self.pdf_cache) as extraction_pool:
+                extractions = extraction_pool.extract_all(file_paths)
+            for file_path, extraction in zip(file_paths, extractions):
+                self.add_file(file_path, extraction)
+        if self.excel_file_loc:
+            self.add_ledger()
+
+    def _index(self, kind: str, key, location: str):
+        """
+        Adds a location under a key.
+
+        Parameters:
+        kind (str): Kind of key.
+        key: Key, nothing is indexed if None.
+        location (str): Path of the file or label of the ledger row.
+        """
+        if key is not None:
+            self.keys[kind].setdefault(key, set()).add(location)
+
+    def _unindex(self, kind: str, key, location: str):
+        """
+        Removes a location from under a key.
+
+        Parameters:
+        kind (str): Kind of key.
+        key: Key.
+        location (str): Path of the file or label of the ledger row.
+        """
+        locations = self.keys[kind].get(key)
+        if locations is not None:
+            locations.discard(location)
+            if not locations:
+                del self.keys[kind][key]
+
+    def _file_keys(self, file_path: str, extraction: PDFExtraction = None) -> dict:
+        """
+        Computes the index keys of a PDF file.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+        extraction (PDFExtraction): Extraction of the file (default is None, which uses the cache).
+
+        Returns:
+        dict: Key per kind, None where a key cannot be computed.
+        """
+        if extraction is None:
+            extraction = self.pdf_cache.get_or_extract(file_path)
+        keys = {'identical': self.pdf_cache.hash_file(file_path), 'same text': None, 'same transaction': None}
+        if extraction.error is None:
+            keys['same text'] = self.fingerprint(extraction.text)
+            proposals = self.get_field_extractor().extract(extraction.text)
+            if all(proposals.get(field) is not None and proposals[field].confidence >= self.min_confidence
+                   for field in ('Date', 'Amount', 'Provider')):
+                keys['same transaction'] = self.transaction_key(
+                    proposals['Date'].value, proposals['Amount'].value, proposals['Provider'].value)
+        return keys
+
+    def add_file(self, file_path: str, extraction: PDFExtraction = None):
+        """
+        Adds a PDF file to the index, replacing its previous entry.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+        extraction (PDFExtraction): Extraction of the file (default is None, which uses the cache).
+        """
+        file_path = os.path.abspath(file_path)
+        self.remove_file(file_path)
+        stat = os.stat(file_path)
+        entry = {'keys': self._file_keys(file_path, extraction), 'signature': (stat.st_size, stat.st_mtime_ns)}
+        self.files[file_path] = entry
+        for kind, key in entry['keys'].items():
+            self._index(kind, key, file_path)
+
+    def remove_file(self, file_path: str):
+        """
+        Removes a PDF file from the index.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+        """
+        entry = self.files.pop(os.path.abspath(file_path), None)
+        if entry is None:
+            return
+        for kind, key in entry['keys'].items():
+            self._unindex(kind, key, os.path.abspath(file_path))
+
+    def move_file(self, old_path: str, new_path: str):
+        """
+        Moves the entry of a renamed or archived PDF file, without hashing or extracting it again.
+
+        Parameters:
+        old_path (str): Previous path of the file.
+        new_path (str): New path of the file.
+        """
+        old_path, new_path = os.path.abspath(old_path), os.path.abspath(new_path)
+        entry = self.files.get(old_path)
+        if entry is None:
+            self.add_file(new_path)
+            return
+        self.remove_file(old_path)
+        self.files[new_path] = entry
+        for kind, key in entry['keys'].items():
+            self._index(kind, key, new_path)
+
+    def add_ledger(self):
+        """
+        Indexes the date, amount and provider of every ledger row, apart for the rows still waiting for
+        their receipt.
+        """
+        try:
+            df = LedgerPartitions(self.excel_file_loc).read(['Date', 'Provider', 'Amount', 'Receipt no',
+                                                             'Attachments'])
+        except (OSError, ValueError):
+            return
+        for date, provider, amount, receipt_number, attachments in df.itertuples(index=False):
+            self.add_transaction(date, amount, provider, receipt_number, has_receipt=attachments == "Y")
+
+    def add_transaction(self, date, amount, provider, receipt_number, has_receipt: bool = True):
+        """
+        Adds a ledger row to the index.
+
+        Parameters:
+        date: Date as a datetime or an MM/DD/YYYY string.
+        amount: Amount as a number or a string.
+        provider (str): Provider name.
+        receipt_number (str): Receipt number of the row.
+        has_receipt (bool): Whether the row's receipt was filed or uploaded (default is True, as for the rows
+                            of receipts just renamed).
+        """
+        label = f"ledger row {receipt_number}" if not pd.isna(receipt_number) else "ledger row"
+        kind = 'same transaction' if has_receipt else 'awaiting receipt'
+        self._index(kind, self.transaction_key(date, amount, provider), label)
+
+    def refresh(self):
+        """
+        Rescans the folders: new and changed files are indexed, deleted files dropped and moved files,
+        recognized by their size and modification time, carried over.
+        """
+        current = {}
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith('.pdf'):
+                        stat = entry.stat()
+                        current[os.path.abspath(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+        vanished = {self.files[path]['signature']: path for path in self.files if path not in current}
+        for path, signature in current.items():
+            entry = self.files.get(path)
+            if entry is not None and entry['signature'] == signature:
+                continue
+            if entry is None and signature in vanished:
+                self.move_file(vanished.pop(signature), path)
+            else:
+                self.add_file(path)
+        for path in vanished.values():
+            self.remove_file(path)
+
+    def check(self, file_path: str, extraction: PDFExtraction = None, ignore=()) -> list[tuple[str, str]]:
+        """
+        Finds the indexed receipts and ledger rows a PDF file duplicates.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+        extraction (PDFExtraction): Extraction of the file (default is None, which uses the cache).
+        ignore: Paths not to report, such as inbox files still waiting to be processed, so that of two
+                copies only the second one processed is flagged (default is empty).
+
+        Returns:
+        list[tuple[str, str]]: Kind of duplicate and the path or ledger row it duplicates, most certain first;
+                               'awaiting receipt' for a ledger row the file is probably the receipt of.
+        """
+        file_path = os.path.abspath(file_path)
+        entry = self.files.get(file_path)
+        keys = entry['keys'] if entry is not None else self._file_keys(file_path, extraction)
+        duplicates = []
+        seen = {file_path, *(os.path.abspath(path) for path in ignore)}
+        for kind, key in [*keys.items(), ('awaiting receipt', keys['same transaction'])]:
+            for location in sorted(self.keys[kind].get(key, ())) if key is not None else ():
+                if location not in seen:
+                    seen.add(location)
+                    duplicates.append((kind, location))
+        return duplicates
+
+    @staticmethod
+    def awaited(duplicates: list[tuple[str, str]]) -> bool:
+        """
+        Checks whether a file only matches ledger rows waiting for their receipt.
+
+        Parameters:
+        duplicates (list[tuple[str, str]]): Result of check.
+
+        Returns:
+        bool: True if the file is probably the missing receipt of a ledger row rather than a duplicate.
+        """
+        return bool(duplicates) and all(kind == 'awaiting receipt' for kind, location in duplicates)
+
+    @staticmethod
+    def describe(duplicates: list[tuple[str, str]]) -> str:
+        """
+        Describes duplicates for the user.
+
+        Parameters:
+        duplicates (list[tuple[str, str]]): Result of check.
+
+        Returns:
+        str: One line per duplicate.
+        """
+        return '\n'.join(f"  {kind}: {os.path.basename(location) if os.path.isabs(location) else location}"
+                         for kind, location in duplicates)
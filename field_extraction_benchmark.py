@@ -0,0 +1,160 @@
+"""
+Benchmark for the receipt field extraction engine against labeled receipt fixtures.
+
+Usage:
+    python field_extraction_benchmark.py --generate 200 --fixtures fixtures_dir
+    python field_extraction_benchmark.py --fixtures fixtures_dir --ledger transactions.xlsx
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+import fitz
+import pandas as pd
+from pdf_extraction_pool import PDFExtractionPool
+from receipt_field_extractor import ReceiptFieldExtractor
+
+LABELS_FILENAME = 'labels.json'
+
+PROVIDERS = ['CVS Pharmacy', 'Walgreens', 'Bright Smile Dental', 'Quest Diagnostics', 'LabCorp',
+             'Riverside Family Medicine', 'Clear Vision Eye Care', 'Mindful Counseling']
+
+TEMPLATES = [
+    "{provider}\n{street} Main St\nDate: {date}\nRx {rx} GENERIC {item}\n{price}\nSubtotal {price}\n"
+    "Tax 0.00\nTOTAL ${amount}\nThank you for shopping",
+    "{provider}\nSTATEMENT\nStatement Date: {statement_date}\nDate of Service\n{date} Office visit {charge}\n"
+    "Insurance paid {insurance}\nPatient Responsibility\n${amount}",
+    "{provider}\nPatient Invoice\nService date {date_named}\nDescription Amount\nPanel {charge}\n"
+    "Amount Due: {amount}\nPlease remit within 30 days",
+]
+
+
+def generate_fixtures(directory: str, count: int, seed: int = 7):
+    """
+    Writes synthetic receipt PDFs and their labels to a directory.
+
+    Parameters:
+    directory (str): Directory to write the fixtures to.
+    count (int): Number of receipts to generate.
+    seed (int): Random seed (default is 7).
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    labels = {}
+    start = datetime(2022, 1, 1)
+    for number in range(count):
+        provider = rng.choice(PROVIDERS)
+        date = start + timedelta(days=rng.randrange(900))
+        amount = rng.randrange(500, 150000) / 100
+        insurance = rng.randrange(0, 50000) / 100
+        text = rng.choice(TEMPLATES).format(
+            provider=provider,
+            street=rng.randrange(10, 9999),
+            date=date.strftime('%m/%d/%Y'),
+            date_named=date.strftime('%b %d, %Y'),
+            statement_date=(date + timedelta(days=rng.randrange(5, 40))).strftime('%m/%d/%Y'),
+            rx=rng.randrange(1000000, 9999999),
+            item=rng.choice(['AMOXICILLIN', 'LISINOPRIL', 'IBUPROFEN']),
+            price=f"{amount:.2f}",
+            charge=f"{amount + insurance:.2f}",
+            insurance=f"{insurance:.2f}",
+            amount=f"{amount:,.2f}")
+        filename = f"receipt_{number:05d}.pdf"
+        document = fitz.open()
+        page = document.new_page()
+        page.insert_text((72, 72), text)
+        document.save(os.path.join(directory, filename))
+        labels[filename] = {'Date': date.strftime('%m/%d/%Y'), 'Provider': provider, 'Amount': f"{amount:.2f}"}
+    with open(os.path.join(directory, LABELS_FILENAME), 'w', encoding='utf-8') as labels_file:
+        json.dump(labels, labels_file, indent=1)
+
+
+def run_benchmark(fixture_dir: str, ledger_path: str = None, workers: int = None, holdout: float = 0.5,
+                  seed: int = 7) -> dict:
+    """
+    Extracts the labeled fixtures and compares the proposals with the labels.
+
+    Providers are learned the way the app learns them, from past rows that are not the receipts being
+    scored: from the ledger if one is given, otherwise from the labels of a random split of the fixtures
+    that is then left out of the scoring.
+
+    Parameters:
+    fixture_dir (str): Directory containing the PDFs and labels.json.
+    ledger_path (str): Excel ledger to learn providers from (default is None, which learns them from the
+                       labels of the fixtures left out of the scoring).
+    workers (int): Number of extraction processes (default is the number of CPUs).
+    holdout (float): Share of the fixtures scored when no ledger is given (default is 0.5).
+    seed (int): Random seed of the split (default is 7).
+
+    Returns:
+    dict: Accuracy per field and throughput figures over the scored receipts.
+    """
+    with open(os.path.join(fixture_dir, LABELS_FILENAME), encoding='utf-8') as labels_file:
+        labels = json.load(labels_file)
+    if ledger_path:
+        extractor = ReceiptFieldExtractor.from_ledger(ledger_path)
+        provider_source = 'ledger'
+    else:
+        filenames = sorted(labels)
+        random.Random(seed).shuffle(filenames)
+        scored = max(1, round(len(filenames) * holdout)) if filenames else 0
+        learned = filenames[scored:]
+        extractor = ReceiptFieldExtractor()
+        extractor.learn_from_ledger(pd.DataFrame({'Provider': [labels[filename]['Provider'] for filename in learned]}))
+        labels = {filename: labels[filename] for filename in sorted(filenames[:scored])}
+        provider_source = f'{len(learned)} held-out fixtures'
+
+    file_paths = [os.path.join(fixture_dir, filename) for filename in labels]
+    start = time.perf_counter()
+    with PDFExtractionPool(max_workers=workers) as extraction_pool:
+        extractions = extraction_pool.extract_all(file_paths)
+    text_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proposals = extractor.extract_batch(extractions)
+    field_seconds = time.perf_counter() - start
+
+    fields = ['Date', 'Provider', 'Amount']
+    correct = {field: 0 for field in fields}
+    all_correct = 0
+    for filename, proposal in zip(labels, proposals):
+        matches = [proposal[field] is not None and proposal[field].value == labels[filename][field]
+                   for field in fields]
+        for field, match in zip(fields, matches):
+            correct[field] += match
+        all_correct += all(matches)
+    total = len(labels) or 1
+    return {
+        'receipts': len(labels),
+        'providers_learned_from': provider_source,
+        # These can only be right through the header line fallback
+        'unseen_provider_receipts': sum(label['Provider'] not in extractor.providers for label in labels.values()),
+        'accuracy': {field: correct[field] / total for field in fields},
+        'all_fields_accuracy': all_correct / total,
+        'text_extraction_receipts_per_second': len(labels) / text_seconds if text_seconds else None,
+        'field_extraction_receipts_per_second': len(labels) / field_seconds if field_seconds else None,
+    }
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', required=True, help="Directory with the fixture PDFs and labels.json.")
+    parser.add_argument('--generate', type=int, default=0, help="Generate this many synthetic fixtures first.")
+    parser.add_argument('--ledger', help="Excel ledger to learn provider names from.")
+    parser.add_argument('--workers', type=int, help="Number of extraction processes.")
+    parser.add_argument('--holdout', type=float, default=0.5,
+                        help="Share of the fixtures scored when no ledger is given; the rest teach the providers.")
+    args = parser.parse_args()
+    if args.generate:
+        generate_fixtures(args.fixtures, args.generate)
+    print(json.dumps(run_benchmark(args.fixtures, args.ledger, args.workers, args.holdout), indent=2))
+
+
+if __name__ == "__main__":
+    main()
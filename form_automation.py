@@ -2,10 +2,10 @@
 Module to automate form filling using the provided data.
 """
 
-import time
 import pandas as pd
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
+from instrumentation import instrumentation
 
 
 class FormAutomation:
@@ -53,12 +53,23 @@ class FormAutomation:
         notes_field.send_keys(note)
         save_button = self.browser.driver.find_element(By.NAME, value="create_purchase")
         save_button.click()
+        self.browser.waits.navigation_from(save_button)
+
+    def fill_row(self, row: pd.Series):
+        """
+        Waits for the form to be ready and fills it with one row of the DataFrame.
+
+        Parameters:
+        row (pd.Series): Row of data from the DataFrame.
+        """
+        print(row)
+        with instrumentation.span('portal.create_purchase', receipt=row['New Filename']):
+            self.browser.waits.purchase_form()
+            self.fill_form(row)
 
     def run(self):
         """
         Runs the form automation process for each row in the DataFrame.
         """
         for index, row in self.df.iterrows():
-            print(row)
-            time.sleep(1)
-            self.fill_form(row)
+            self.fill_row(row)
@@ -0,0 +1,213 @@
+"""
+Module to time the stages of a run with spans and counters, and export them as a trace.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class Instrumentation:
+    """
+    This class records timed spans and event counters across the pipeline, prints a summary table and
+    exports the run as JSON or as a Chrome trace (open it in chrome://tracing or Perfetto).
+
+    It is disabled by default; while disabled, span returns a shared no-op context manager and count
+    returns immediately, so instrumented code pays next to nothing.
+    """
+
+    def __init__(self):
+        """
+        Initializes the Instrumentation instance, disabled and empty.
+        """
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.counter_events = []
+
+    def enable(self):
+        """
+        Starts recording, discarding anything recorded before.
+        """
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stops recording, keeping what was recorded.
+        """
+        self.enabled = False
+
+    def reset(self):
+        """
+        Discards every recorded span and counter.
+        """
+        with self.lock:
+            self.origin = time.perf_counter()
+            self.spans = []
+            self.counters = {}
+            self.counter_events = []
+
+    def span(self, name: str, **details):
+        """
+        Times a block of code.
+
+        Usage:
+            with instrumentation.span('excel.save', rows=10):
+                ...
+
+        Parameters:
+        name (str): Name of the stage, dotted by component (e.g. 'portal.login').
+        **details: Values shown with the span in the trace.
+
+        Returns:
+        Context manager timing the block.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, details)
+
+    def count(self, name: str, amount: int = 1):
+        """
+        Increments a counter.
+
+        Parameters:
+        name (str): Name of the counter (e.g. 'workbook_saves').
+        amount (int): Amount to add (default is 1).
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            value = self.counters.get(name, 0) + amount
+            self.counters[name] = value
+            self.counter_events.append((name, time.perf_counter() - self.origin, value))
+
+    def record(self, name: str, start: float, end: float, details: dict):
+        """
+        Stores a finished span.
+
+        Parameters:
+        name (str): Name of the stage.
+        start (float): perf_counter value at the start of the span.
+        end (float): perf_counter value at the end of the span.
+        details (dict): Values shown with the span in the trace.
+        """
+        with self.lock:
+            self.spans.append((name, start - self.origin, end - start, threading.get_ident(), details))
+
+    def summary(self) -> dict:
+        """
+        Summarizes the recorded spans per stage.
+
+        Returns:
+        dict: Count, total, mean and maximum seconds per stage name, in order of first appearance.
+        """
+        summary = {}
+        with self.lock:
+            spans = list(self.spans)
+        for name, start, seconds, thread_id, details in sorted(spans, key=lambda span: span[1]):
+            stats = summary.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+        for stats in summary.values():
+            stats['mean'] = stats['total'] / stats['count']
+        return summary
+
+    def report(self):
+        """
+        Prints the time spent per stage and the counters.
+        """
+        summary = self.summary()
+        if not summary and not self.counters:
+            return
+        print(f"{'Stage':<32}{'Count':>7}{'Total s':>10}{'Mean s':>9}{'Max s':>8}")
+        for name, stats in summary.items():
+            print(f"{name:<32}{stats['count']:>7}{stats['total']:>10.2f}{stats['mean']:>9.3f}{stats['max']:>8.2f}")
+        for name, value in sorted(self.counters.items()):
+            print(f"{name:<32}{value:>7}")
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Converts the recording to the Chrome trace event format.
+
+        Returns:
+        dict: Trace with complete ('X') events for spans and counter ('C') events for counters.
+        """
+        process_id = os.getpid()
+        with self.lock:
+            events = [{'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'ts': start * 1e6,
+                       'dur': seconds * 1e6, 'pid': process_id, 'tid': thread_id,
+                       'args': {key: str(value) for key, value in details.items()}}
+                      for name, start, seconds, thread_id, details in self.spans]
+            events += [{'name': name, 'ph': 'C', 'ts': at * 1e6, 'pid': process_id, 'args': {name: value}}
+                       for name, at, value in self.counter_events]
+        return {'traceEvents': sorted(events, key=lambda event: event['ts']), 'displayTimeUnit': 'ms'}
+
+    def export(self, path: str):
+        """
+        Writes the recording to a file: a Chrome trace, with the summary and counters alongside.
+
+        Parameters:
+        path (str): Path of the JSON file.
+        """
+        trace = self.to_chrome_trace()
+        trace['summary'] = self.summary()
+        trace['counters'] = dict(self.counters)
+        with open(path, 'w', encoding='utf-8') as trace_file:
+            json.dump(trace, trace_file)
+
+
+class Span:
+    """
+    This class times one block of code for an Instrumentation instance.
+    """
+
+    __slots__ = ('instrumentation', 'name', 'details', 'start')
+
+    def __init__(self, instrumentation: Instrumentation, name: str, details: dict):
+        """
+        Initializes the Span instance.
+
+        Parameters:
+        instrumentation (Instrumentation): Instance recording the span.
+        name (str): Name of the stage.
+        details (dict): Values shown with the span in the trace.
+        """
+        self.instrumentation = instrumentation
+        self.name = name
+        self.details = details
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.details['error'] = exc_type.__name__
+        self.instrumentation.record(self.name, self.start, time.perf_counter(), self.details)
+        return False
+
+
+class NullSpan:
+    """
+    This class is the no-op span handed out while instrumentation is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+# Shared instance used across the application
+instrumentation = Instrumentation()
@@ -0,0 +1,96 @@
+"""
+Module to batch transactions and write them to the Excel ledger in one pass.
+"""
+
+import pandas as pd
+from openpyxl import load_workbook
+from instrumentation import instrumentation
+from dataframe_to_excel import DataFrameToExcel
+from ledger_store import LedgerStore
+
+
+class LedgerBatchWriter:
+    """
+    This class collects transactions during a session and writes them to the Excel ledger
+    with a single workbook load, a single row shift and a single save.
+    """
+
+    def __init__(self, workbook_path: str, journal=None):
+        """
+        Initializes the LedgerBatchWriter instance.
+
+        Parameters:
+        workbook_path (str): Path to the Excel workbook.
+        journal (ReceiptJournal): Journal recording the receipts once they are saved (default is None).
+        """
+        self.workbook_path = workbook_path
+        self.journal = journal
+        self.workbook = None
+        self.pending = []
+        self.written_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Receipts entered before a failure have already been renamed on disk, so they are
+        # written to the ledger even when the session ends with an exception.
+        self.commit()
+        return False
+
+    def add_transaction(self, transaction: dict):
+        """
+        Adds a single transaction to the pending batch.
+
+        Parameters:
+        transaction (dict): Transaction details as returned by UserInput.get_user_inputs.
+        """
+        self.pending.append(dict(transaction))
+
+    def add_dataframe(self, df: pd.DataFrame):
+        """
+        Adds every row of a DataFrame to the pending batch.
+
+        Parameters:
+        df (pd.DataFrame): DataFrame containing the transactions.
+        """
+        self.pending.extend(df.to_dict('records'))
+
+    def _load_workbook(self):
+        """
+        Loads the workbook the first time it is needed.
+        """
+        if self.workbook is None:
+            with instrumentation.span('excel.load_workbook'):
+                self.workbook = load_workbook(self.workbook_path)
+            instrumentation.count('workbook_loads')
+
+    def flush(self):
+        """
+        Writes the pending transactions to the workbook and saves it.
+
+        Call this explicitly to make the work entered so far durable before a risky step.
+        """
+        if not self.pending:
+            return
+        self._load_workbook()
+        store = LedgerStore.for_workbook(self.workbook_path)
+        store_current = store.is_current()
+        df = pd.DataFrame(self.pending)
+        processor = DataFrameToExcel(df, self.workbook_path, self.workbook)
+        processor.process()
+        if store_current:
+            # The rows just saved, in the order they were inserted
+            store.record_added(processor.df)
+        if self.journal is not None:
+            for transaction in self.pending:
+                self.journal.record(transaction['Receipt Number'], 'ledger')
+        self.written_count += len(self.pending)
+        self.pending = []
+
+    def commit(self):
+        """
+        Writes any remaining transactions and releases the workbook.
+        """
+        self.flush()
+        self.workbook = None
@@ -0,0 +1,119 @@
+"""
+Module to index the Excel ledger by receipt number and update many rows in one load and save.
+"""
+
+import openpyxl
+from instrumentation import instrumentation
+from ledger_styles import LedgerStyles
+from ledger_store import LedgerStore
+
+
+class LedgerIndex:
+    """
+    This class maps receipt numbers to ledger rows in one pass over the sheet and applies
+    attachment updates to many rows before saving the workbook once.
+    """
+
+    prefixes = ('F', 'R')
+
+    def __init__(self, excel_file_loc: str, sheet_name: str = "TransactionHistory (2)",
+                 search_column: str = "Receipt no", update_column: str = "Attachments"):
+        """
+        Initializes the LedgerIndex instance.
+
+        Parameters:
+        excel_file_loc (str): Location of the Excel file.
+        sheet_name (str): Name of the ledger sheet (default is "TransactionHistory (2)").
+        search_column (str): Header of the receipt number column (default is "Receipt no").
+        update_column (str): Header of the column to update (default is "Attachments").
+        """
+        self.excel_file_loc = excel_file_loc
+        self.sheet_name = sheet_name
+        self.search_column = search_column
+        self.update_column = update_column
+        self.workbook = None
+        self.sheet = None
+        self.search_col_idx = None
+        self.update_col_idx = None
+        self.headers = []
+        self.rows = {}
+        self.marked = []
+
+    def load(self):
+        """
+        Loads the workbook, resolves the header columns and indexes every receipt number.
+
+        Raises:
+        KeyError: If the search or update column is not in the header row.
+        """
+        with instrumentation.span('excel.load_workbook'):
+            self.workbook = openpyxl.load_workbook(self.excel_file_loc)
+        instrumentation.count('workbook_loads')
+        self.sheet = self.workbook[self.sheet_name]
+        self.headers = [cell.value for cell in self.sheet[1]]
+        headers = {cell.value: cell.column for cell in self.sheet[1]}
+        if self.search_column not in headers or self.update_column not in headers:
+            raise KeyError(f"Column '{self.search_column}' or '{self.update_column}' not found.")
+        self.search_col_idx = headers[self.search_column]
+        self.update_col_idx = headers[self.update_column]
+        rows = {}
+        for row_number, (value,) in enumerate(
+                self.sheet.iter_rows(min_row=2, min_col=self.search_col_idx, max_col=self.search_col_idx,
+                                     values_only=True), start=2):
+            if value is not None and value not in rows:
+                rows[value] = row_number
+        self.rows = rows
+
+    def find_row(self, receipt_number: str) -> int | None:
+        """
+        Gets the row number of a receipt.
+
+        Parameters:
+        receipt_number (str): Receipt number to look up.
+
+        Returns:
+        int | None: Row number, or None if the receipt is not in the ledger.
+        """
+        return self.rows.get(receipt_number)
+
+    def mark_uploaded(self, receipt_numbers: list[str], new_value: str = "Y") -> list[str]:
+        """
+        Sets the update column of each receipt's row and colors the row by receipt prefix.
+
+        Only the fill changes: the rows belong to the user, so their fonts and number formats are kept.
+
+        Parameters:
+        receipt_numbers (list[str]): Receipt numbers to update.
+        new_value (str): Value to write to the update column (default is "Y").
+
+        Returns:
+        list[str]: Receipt numbers that could not be updated.
+        """
+        not_updated = []
+        for receipt_number in receipt_numbers:
+            row_number = self.find_row(receipt_number)
+            if row_number is None or not isinstance(receipt_number, str) or receipt_number[:1] not in self.prefixes:
+                not_updated.append(receipt_number)
+                continue
+            self.sheet.cell(row=row_number, column=self.update_col_idx).value = new_value
+            # Bounded by the header width, so openpyxl does not work out the sheet's width for every row
+            cells = next(self.sheet.iter_rows(min_row=row_number, max_row=row_number, max_col=len(self.headers)))
+            fill = LedgerStyles.row_fill(receipt_number)
+            for cell in cells:
+                cell.fill = fill
+            self.marked.append(receipt_number)
+        return not_updated
+
+    def save(self):
+        """
+        Saves the workbook if any row was updated, and marks the rows as uploaded in the ledger store.
+        """
+        if self.marked:
+            store = LedgerStore.for_workbook(self.excel_file_loc)
+            store_current = store.is_current()
+            with instrumentation.span('excel.save'):
+                self.workbook.save(self.excel_file_loc)
+            instrumentation.count('workbook_saves')
+            if store_current and self.update_column == 'Attachments':
+                store.record_uploaded(self.marked)
+            self.marked = []
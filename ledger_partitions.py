@@ -0,0 +1,278 @@
+"""
+Module to split the Excel ledger into a current tax year workbook and archived workbooks of closed years.
+"""
+
+import glob
+import os
+import re
+from copy import copy
+from datetime import datetime
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from instrumentation import instrumentation
+from ledger_reader import LedgerReader
+from ledger_styles import LedgerStyles
+from ledger_store import LedgerStore
+
+
+class LedgerPartitions:
+    """
+    This class keeps the ledger as partitions: the configured workbook holds the current tax year, the one
+    every new transaction is inserted into, and each closed tax year is rolled over into its own archive
+    workbook next to it ('HSA.xlsx' keeps 2024, 'HSA.2023.xlsx' holds 2023). Inserting a row and saving
+    then only costs as much as the current year's rows.
+
+    Numbering, duplicate checks and the missing receipt flow read the merged view of every partition,
+    each served by its own LedgerStore, and updates to a receipt go to the workbook that holds it.
+    Without archives the merged view is the workbook alone.
+    """
+
+    ledger_style_names = frozenset(LedgerStyles.style_names())
+
+    def __init__(self, excel_file_loc: str, sheet_name: str = None):
+        """
+        Initializes the LedgerPartitions instance.
+
+        Parameters:
+        excel_file_loc (str): Location of the Excel file with the current tax year.
+        sheet_name (str): Name of the ledger sheet (default is None, which uses the active sheet).
+        """
+        self.excel_file_loc = excel_file_loc
+        self.sheet_name = sheet_name
+        root, extension = os.path.splitext(excel_file_loc)
+        self.archive_pattern = re.compile(re.escape(root) + r'\.(\d{4})' + re.escape(extension) + '$')
+
+    def archive_path(self, year: int) -> str:
+        """
+        Gets the path of a tax year's archive workbook.
+
+        Parameters:
+        year (int): Tax year.
+
+        Returns:
+        str: Path next to the Excel file, with the year before the extension.
+        """
+        root, extension = os.path.splitext(self.excel_file_loc)
+        return f"{root}.{year}{extension}"
+
+    def archives(self) -> dict:
+        """
+        Finds the archive workbooks of closed tax years.
+
+        Returns:
+        dict: Archive path by tax year, most recent year first.
+        """
+        root, extension = os.path.splitext(self.excel_file_loc)
+        found = {}
+        for path in glob.glob(f"{glob.escape(root)}.[0-9][0-9][0-9][0-9]{extension}"):
+            match = self.archive_pattern.match(path)
+            if match:
+                found[int(match.group(1))] = path
+        return dict(sorted(found.items(), reverse=True))
+
+    def workbooks(self) -> list[str]:
+        """
+        Gets every partition, the current tax year first.
+
+        Returns:
+        list[str]: Paths of the Excel file and its archives.
+        """
+        return [self.excel_file_loc, *self.archives().values()]
+
+    def stores(self) -> list[LedgerStore]:
+        """
+        Gets the ledger store of every partition, the current tax year first.
+
+        Returns:
+        list[LedgerStore]: Shared store of each workbook.
+        """
+        return [LedgerStore.for_workbook(path) for path in self.workbooks()]
+
+    def read(self, columns: list[str] = None) -> pd.DataFrame:
+        """
+        Reads the rows of every partition, newest partition first.
+
+        Parameters:
+        columns (list[str]): Ledger headers to read (default is None, which reads every ledger column).
+
+        Returns:
+        pd.DataFrame: Rows of all partitions, indexed by position.
+        """
+        return pd.concat([store.read(columns) for store in self.stores()], ignore_index=True)
+
+    def not_uploaded(self) -> pd.DataFrame:
+        """
+        Gets the rows of every partition whose receipt has not been uploaded.
+
+        Returns:
+        pd.DataFrame: Rows whose 'Attachments' is not 'Y', indexed by position.
+        """
+        return pd.concat([store.not_uploaded() for store in self.stores()], ignore_index=True)
+
+    def max_numbers(self) -> dict:
+        """
+        Gets the highest counter of each receipt number prefix over every partition.
+
+        Returns:
+        dict: Highest counter for each prefix.
+        """
+        counters = {prefix: 0 for prefix in LedgerStore.prefixes}
+        for store in self.stores():
+            for prefix, number in store.max_numbers().items():
+                counters[prefix] = max(counters[prefix], number)
+        return counters
+
+    def find(self, receipt_number: str) -> dict | None:
+        """
+        Looks up a receipt in every partition.
+
+        Parameters:
+        receipt_number (str): Receipt number to look up.
+
+        Returns:
+        dict | None: Values of the row by ledger header, with its sheet row under 'Row' and its workbook
+                     under 'Workbook', or None if no partition has the receipt.
+        """
+        for store in self.stores():
+            found = store.find(receipt_number)
+            if found is not None:
+                found['Workbook'] = store.excel_file_loc
+                return found
+        return None
+
+    @staticmethod
+    def tax_year(value) -> int | None:
+        """
+        Gets the tax year of a 'Date' cell.
+
+        Parameters:
+        value: Cell value.
+
+        Returns:
+        int | None: Calendar year of the date, or None if the cell holds no date.
+        """
+        value = LedgerReader.convert('Date', value)
+        return value.year if isinstance(value, datetime) else None
+
+    @classmethod
+    def copy_cell(cls, source, target):
+        """
+        Copies a cell's value and style into a cell of another workbook, which has the ledger styles.
+
+        Parameters:
+        source (Cell): Cell to copy.
+        target (Cell): Cell to write.
+        """
+        target.value = source.value
+        if source.style in cls.ledger_style_names:
+            target.style = source.style
+        # A cell keeps its named style when the fill of its row is changed or the user formats it
+        if source.has_style:
+            target.font = copy(source.font)
+            target.fill = copy(source.fill)
+            target.border = copy(source.border)
+            target.alignment = copy(source.alignment)
+            target.number_format = source.number_format
+            target.protection = copy(source.protection)
+
+    def _open_archive(self, year: int, sheet) -> tuple:
+        """
+        Opens a tax year's archive, creating it with the ledger's header row if it does not exist.
+
+        Parameters:
+        year (int): Tax year.
+        sheet (Worksheet): Ledger sheet of the current workbook.
+
+        Returns:
+        tuple: Archive workbook, its ledger sheet and the receipt numbers it already holds.
+        """
+        path = self.archive_path(year)
+        if os.path.exists(path):
+            with instrumentation.span('excel.load_workbook'):
+                workbook = load_workbook(path)
+            instrumentation.count('workbook_loads')
+            archive_sheet = workbook[sheet.title] if sheet.title in workbook.sheetnames else workbook.active
+            LedgerStyles.register(workbook)
+        else:
+            workbook = Workbook()
+            LedgerStyles.register(workbook)
+            archive_sheet = workbook.active
+            archive_sheet.title = sheet.title
+            for cell in sheet[1]:
+                self.copy_cell(cell, archive_sheet.cell(row=1, column=cell.column))
+            for letter, dimension in sheet.column_dimensions.items():
+                archive_sheet.column_dimensions[letter].width = dimension.width
+        headers = LedgerReader.read_headers(archive_sheet)
+        archived = set()
+        if 'Receipt no' in headers:
+            column = headers.index('Receipt no') + 1
+            archived = {value for (value,) in archive_sheet.iter_rows(min_row=2, min_col=column, max_col=column,
+                                                                       values_only=True) if value is not None}
+        return workbook, archive_sheet, archived
+
+    def rollover(self, current_year: int = None) -> dict:
+        """
+        Moves the rows of every tax year before the current one into the archive of their year.
+
+        Each archive is saved before the rows are removed from the current workbook, and rows whose receipt
+        number an archive already holds are not copied again, so a rollover interrupted in between is
+        completed by running it again.
+
+        Parameters:
+        current_year (int): First tax year that stays in the current workbook (default is None, which
+                            uses this calendar year).
+
+        Returns:
+        dict: Number of rows moved into each tax year's archive.
+        """
+        current_year = current_year or datetime.now().year
+        with instrumentation.span('excel.load_workbook'):
+            workbook = load_workbook(self.excel_file_loc)
+        instrumentation.count('workbook_loads')
+        sheet = workbook[self.sheet_name] if self.sheet_name else workbook.active
+        headers = LedgerReader.read_headers(sheet)
+        if 'Date' not in headers:
+            raise KeyError("Column 'Date' not found.")
+        date_column = headers.index('Date') + 1
+        receipt_column = headers.index('Receipt no') + 1 if 'Receipt no' in headers else None
+
+        # One pass over the rows, bounded by the header width: indexing the sheet by row number would make
+        # openpyxl work out the sheet's width again for every row
+        closed = {}
+        for row_number, cells in enumerate(sheet.iter_rows(min_row=2, max_col=len(headers)), start=2):
+            year = self.tax_year(cells[date_column - 1].value)
+            if year is not None and year < current_year:
+                closed.setdefault(year, []).append((row_number, cells))
+        if not closed:
+            return {}
+
+        moved = {}
+        for year, closed_rows in closed.items():
+            with instrumentation.span('ledger.rollover_year', year=year, rows=len(closed_rows)):
+                archive, archive_sheet, archived = self._open_archive(year, sheet)
+                rows = [cells for _, cells in closed_rows if receipt_column is None
+                        or cells[receipt_column - 1].value not in archived]
+                if rows:
+                    # Like DataFrameToExcel, the block goes below the header in the order of the ledger
+                    archive_sheet.insert_rows(2, amount=len(rows))
+                    for offset, cells in enumerate(rows):
+                        for cell in cells:
+                            self.copy_cell(cell, archive_sheet.cell(row=2 + offset, column=cell.column))
+                    with instrumentation.span('excel.save'):
+                        archive.save(self.archive_path(year))
+                    instrumentation.count('workbook_saves')
+                moved[year] = len(rows)
+
+        # Delete from the bottom up, one call per run of consecutive rows
+        runs = []
+        for row_number in sorted((row_number for rows in closed.values() for row_number, _ in rows), reverse=True):
+            if runs and runs[-1][0] == row_number + 1:
+                runs[-1] = [row_number, runs[-1][1] + 1]
+            else:
+                runs.append([row_number, 1])
+        for first_row, amount in runs:
+            sheet.delete_rows(first_row, amount)
+        with instrumentation.span('excel.save'):
+            workbook.save(self.excel_file_loc)
+        instrumentation.count('workbook_saves')
+        return moved
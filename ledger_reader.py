@@ -0,0 +1,228 @@
+"""
+Module to stream the rows of the Excel ledger without loading the whole workbook.
+"""
+
+from datetime import date, datetime
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+from instrumentation import instrumentation
+
+
+class LedgerReader:
+    """
+    This class reads a ledger sheet through openpyxl's read-only mode, which parses the sheet XML as it
+    is iterated instead of building every cell and style in memory. Headers come from row 1 only, rows
+    are yielded one at a time with their dates and amounts typed, and a loop that stops early stops the
+    parsing too, so memory stays flat however long the ledger grows.
+
+    Use it as a context manager so the workbook file is closed afterwards.
+    """
+
+    def __init__(self, excel_file_loc: str, sheet_name: str = None):
+        """
+        Initializes the LedgerReader instance, without opening the workbook yet.
+
+        Parameters:
+        excel_file_loc (str): Location of the Excel file.
+        sheet_name (str): Name of the ledger sheet, such as "TransactionHistory (2)" (default is None, which
+                          reads the active sheet, the one DataFrameToExcel writes to).
+        """
+        self.excel_file_loc = excel_file_loc
+        self.sheet_name = sheet_name
+        self.workbook = None
+        self.sheet = None
+        self._headers = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def open(self):
+        """
+        Opens the workbook read-only.
+
+        Raises:
+        KeyError: If the workbook has no sheet of that name.
+        """
+        if self.workbook is not None:
+            return
+        with instrumentation.span('excel.open_read_only'):
+            self.workbook = load_workbook(self.excel_file_loc, read_only=True)
+        try:
+            self.sheet = self.workbook[self.sheet_name] if self.sheet_name else self.workbook.active
+        except KeyError:
+            self.close()
+            raise
+        # Files written by other tools may declare a wrong sheet size, which would cut the rows short
+        self.sheet.reset_dimensions()
+
+    def close(self):
+        """
+        Closes the workbook file.
+        """
+        if self.workbook is not None:
+            self.workbook.close()
+        self.workbook = None
+        self.sheet = None
+        self._headers = None
+
+    @staticmethod
+    def read_headers(sheet) -> list[str]:
+        """
+        Reads the header row of a worksheet, loaded or read-only, without touching the other rows.
+
+        Parameters:
+        sheet (Worksheet): Excel worksheet.
+
+        Returns:
+        list[str]: Header of each column, empty for a column without one.
+        """
+        values = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        return [str(value).strip() if value is not None else '' for value in values]
+
+    def headers(self) -> list[str]:
+        """
+        Gets the headers of the ledger sheet.
+
+        Returns:
+        list[str]: Header of each column, empty for a column without one.
+        """
+        self.open()
+        if self._headers is None:
+            self._headers = self.read_headers(self.sheet)
+        return self._headers
+
+    def column_index(self, header: str) -> int:
+        """
+        Gets the column number of a header.
+
+        Parameters:
+        header (str): Column header.
+
+        Returns:
+        int: Column number, starting at 1.
+
+        Raises:
+        KeyError: If the header is not in row 1.
+        """
+        headers = self.headers()
+        if header not in headers:
+            raise KeyError(f"Column '{header}' not found.")
+        return headers.index(header) + 1
+
+    def column_letters(self, *headers: str) -> tuple:
+        """
+        Gets the column letters of headers.
+
+        Parameters:
+        headers (str): Column headers.
+
+        Returns:
+        tuple: Column letter of each header, None for a header that is not in row 1.
+        """
+        letters = []
+        for header in headers:
+            try:
+                letters.append(get_column_letter(self.column_index(header)))
+            except KeyError:
+                letters.append(None)
+        return tuple(letters)
+
+    @staticmethod
+    def convert(header: str, value):
+        """
+        Types a cell value the way the ledger uses it: dates as datetimes and amounts as floats.
+
+        Parameters:
+        header (str): Header of the cell's column.
+        value: Cell value.
+
+        Returns:
+        Typed value, or the value unchanged if it cannot be converted.
+        """
+        if value is None:
+            return None
+        if header == 'Date':
+            if isinstance(value, datetime):
+                return value
+            if isinstance(value, date):
+                return datetime(value.year, value.month, value.day)
+            try:
+                return datetime.strptime(str(value).strip(), '%m/%d/%Y')
+            except ValueError:
+                return value
+        if header == 'Amount' and isinstance(value, str):
+            try:
+                return float(value.replace('$', '').replace(',', ''))
+            except ValueError:
+                return value
+        return value
+
+    def rows(self, columns: list[str] = None):
+        """
+        Yields the rows below the header one at a time, skipping empty rows.
+
+        Parameters:
+        columns (list[str]): Headers to read (default is None, which reads every column with a header).
+
+        Yields:
+        tuple[int, dict]: Row number and typed values by header.
+
+        Raises:
+        KeyError: If a column is not in row 1.
+        """
+        headers = self.headers()
+        indexes = [self.column_index(header) for header in columns] if columns else \
+            [index for index, header in enumerate(headers, start=1) if header]
+        if not indexes:
+            return
+        first, last = min(indexes), max(indexes)
+        wanted = [(headers[index - 1], index - first) for index in indexes]
+        for row_number, values in enumerate(
+                self.sheet.iter_rows(min_row=2, min_col=first, max_col=last, values_only=True), start=2):
+            if all(value is None for value in values):
+                continue
+            yield row_number, {header: self.convert(header, values[offset] if offset < len(values) else None)
+                               for header, offset in wanted}
+
+    def find_rows(self, column: str, values) -> dict:
+        """
+        Finds the rows holding values in a column, stopping as soon as all of them are found.
+
+        Parameters:
+        column (str): Header of the column to search, such as 'Receipt no'.
+        values: Values to look up.
+
+        Returns:
+        dict: First row number of each value found.
+
+        Raises:
+        KeyError: If the column is not in row 1.
+        """
+        remaining = set(values)
+        found = {}
+        for row_number, row in self.rows([column]):
+            value = row[column]
+            if value in remaining:
+                found[value] = row_number
+                remaining.discard(value)
+                if not remaining:
+                    break
+        return found
+
+    def find_row(self, column: str, value) -> int | None:
+        """
+        Finds the first row holding a value in a column.
+
+        Parameters:
+        column (str): Header of the column to search.
+        value: Value to look up.
+
+        Returns:
+        int | None: Row number, or None if the value is not in the column.
+        """
+        return self.find_rows(column, [value]).get(value)
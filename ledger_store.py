@@ -0,0 +1,444 @@
+"""
+Module to mirror the Excel ledger in an indexed SQLite store for fast queries.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+import pandas as pd
+from openpyxl import Workbook
+from instrumentation import instrumentation
+from ledger_reader import LedgerReader
+
+
+class LedgerStore:
+    """
+    This class keeps a copy of the ledger rows in a SQLite database next to the workbook, indexed by
+    receipt number, date, attachment status and receipt counter, so the lookups of a run take
+    milliseconds instead of a parse of the whole xlsx.
+
+    The workbook stays the file the user edits. The store remembers the workbook's modification time
+    and size and copies the whole sheet again only when they changed behind its back; the ledger
+    writers of this application report the rows they add and the receipts they mark as uploaded, so
+    their own saves do not cost a resync. export_workbook writes the stored rows back out as an xlsx.
+    """
+
+    # Workbook header and column of the store, in ledger order
+    COLUMNS = {
+        'Date': 'date', 'Provider': 'provider', 'Amount': 'amount', 'HSA Cash Balance': 'hsa_cash_balance',
+        'Attachments': 'attachments', 'Receipt no': 'receipt_no', 'In HSA?': 'in_hsa', 'Notes': 'notes',
+        'New Filename': 'new_filename', 'Type': 'type', 'Category': 'category', 'Payment Method': 'payment_method',
+    }
+    prefixes = ('F', 'R')
+    uploaded_value = "Y"
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, excel_file_loc: str, store_path: str = None, sheet_name: str = None):
+        """
+        Initializes the LedgerStore instance, opening or creating the database.
+
+        Parameters:
+        excel_file_loc (str): Location of the Excel file.
+        store_path (str): Path to the SQLite database (default is the Excel path with a '.ledger.sqlite' suffix).
+        sheet_name (str): Name of the ledger sheet (default is None, which uses the active sheet that
+                          DataFrameToExcel writes to).
+        """
+        self.excel_file_loc = excel_file_loc
+        self.store_path = store_path or excel_file_loc + '.ledger.sqlite'
+        self.sheet_name = sheet_name
+        self.sync_count = 0
+        self._lock = threading.RLock()
+        self.connection = sqlite3.connect(self.store_path, check_same_thread=False)
+        self._create_tables()
+        self.signature = self._get_meta('signature')
+        self.headers = self._get_meta('headers') or list(self.COLUMNS)
+
+    @classmethod
+    def for_workbook(cls, excel_file_loc: str) -> 'LedgerStore':
+        """
+        Gets the store shared by everything in this process that reads or writes the workbook.
+
+        Parameters:
+        excel_file_loc (str): Location of the Excel file.
+
+        Returns:
+        LedgerStore: Shared store, kept in a '.ledger.sqlite' file next to the workbook.
+        """
+        key = os.path.abspath(excel_file_loc)
+        with cls._stores_lock:
+            if key not in cls._stores:
+                cls._stores[key] = cls(excel_file_loc)
+            return cls._stores[key]
+
+    def _create_tables(self):
+        """
+        Creates the tables and indexes if they do not exist yet.
+        """
+        columns = ', '.join(self.COLUMNS.values())
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS transactions (sheet_row INTEGER, {columns}, "
+                f"prefix TEXT, number INTEGER, uploaded INTEGER)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS transactions_receipt_no ON transactions (receipt_no)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS transactions_uploaded ON transactions (uploaded, sheet_row)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS transactions_number ON transactions (prefix, number)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _get_meta(self, key: str):
+        """
+        Reads a value of the meta table.
+
+        Parameters:
+        key (str): Name of the value.
+
+        Returns:
+        Decoded value, or None if it is not set.
+        """
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key: str, value):
+        """
+        Writes a value of the meta table, inside the caller's transaction.
+
+        Parameters:
+        key (str): Name of the value.
+        value: JSON serializable value.
+        """
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    @classmethod
+    def parse_receipt_number(cls, receipt_number) -> tuple[str, int] | None:
+        """
+        Splits a receipt number such as 'R42' into its prefix and counter.
+
+        Parameters:
+        receipt_number: Value of a 'Receipt no' cell.
+
+        Returns:
+        tuple[str, int] | None: Prefix and counter, or None if the value is not a receipt number.
+        """
+        if not isinstance(receipt_number, str):
+            return None
+        digits = re.findall(r'\d+', receipt_number)
+        if not digits:
+            return None
+        for prefix in cls.prefixes:
+            if prefix in receipt_number:
+                return prefix, int(digits[0])
+        return None
+
+    @staticmethod
+    def _to_store(value):
+        """
+        Converts a cell or DataFrame value to a value SQLite can hold.
+
+        Parameters:
+        value: Value to convert.
+
+        Returns:
+        None for empty values, ISO text for dates, Python numbers and strings otherwise.
+        """
+        # openpyxl does not keep empty strings, so they are stored as empty cells
+        if value is None or value == '' or (not isinstance(value, str) and pd.isna(value)):
+            return None
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if hasattr(value, 'item'):
+            value = value.item()
+        if isinstance(value, (int, float, str)):
+            return value
+        return str(value)
+
+    def _record(self, sheet_row: int, values: dict) -> tuple:
+        """
+        Builds the stored record of a ledger row.
+
+        Parameters:
+        sheet_row (int): Row number in the sheet.
+        values (dict): Cell values by header.
+
+        Returns:
+        tuple: Values of the transactions table, in column order.
+        """
+        record = [self._to_store(values.get(header)) for header in self.COLUMNS]
+        parsed = self.parse_receipt_number(values.get('Receipt no'))
+        prefix, number = parsed if parsed else (None, None)
+        return (sheet_row, *record, prefix, number, int(values.get('Attachments') == self.uploaded_value))
+
+    def _insert(self, records):
+        """
+        Inserts records, inside the caller's transaction.
+
+        Parameters:
+        records: Records built by _record, as a list or an iterator.
+        """
+        placeholders = ', '.join('?' * (len(self.COLUMNS) + 4))
+        self.connection.executemany(f"INSERT INTO transactions VALUES ({placeholders})", records)
+
+    def _get_workbook_signature(self) -> list[int]:
+        """
+        Gets the modification time and size of the workbook.
+
+        Returns:
+        list[int]: Modification time in nanoseconds and size in bytes.
+        """
+        stat = os.stat(self.excel_file_loc)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def is_current(self) -> bool:
+        """
+        Checks if the store holds the workbook as it is on disk.
+
+        Returns:
+        bool: True if the workbook has not changed since the store last saw it.
+        """
+        with self._lock:
+            return self.signature == self._get_workbook_signature()
+
+    def refresh(self):
+        """
+        Copies the ledger sheet into the store if the workbook changed since the store last saw it.
+        """
+        with self._lock:
+            signature = self._get_workbook_signature()
+            if signature != self.signature:
+                self.sync(signature)
+
+    def sync(self, signature: list[int] = None):
+        """
+        Replaces the stored rows with the rows of the ledger sheet, streaming the sheet read-only.
+
+        Parameters:
+        signature (list[int]): Workbook signature taken before reading (default is None, which takes it now).
+        """
+        with self._lock, instrumentation.span('ledger_store.sync'):
+            signature = signature or self._get_workbook_signature()
+            with LedgerReader(self.excel_file_loc, self.sheet_name) as reader, self.connection:
+                headers = reader.headers()
+                self.connection.execute("DELETE FROM transactions")
+                # The rows go from the sheet XML to SQLite one at a time
+                self._insert(self._record(sheet_row, row) for sheet_row, row in reader.rows())
+                self._set_meta('signature', signature)
+                self._set_meta('headers', headers)
+            self.signature = signature
+            self.headers = headers
+            self.sync_count += 1
+        instrumentation.count('ledger_store_syncs')
+
+    def record_added(self, df: pd.DataFrame):
+        """
+        Applies rows just inserted below the header of the workbook, the way DataFrameToExcel writes them,
+        and takes the saved workbook as the store's state.
+
+        Call this only if the store was current before the workbook was changed (see is_current).
+
+        Parameters:
+        df (pd.DataFrame): Rows in sheet order, with the ledger columns in sheet column order.
+        """
+        records = [self._record(sheet_row, dict(zip(self.headers, values)))
+                   for sheet_row, values in enumerate(df.itertuples(index=False, name=None), start=2)]
+
+        def insert_rows():
+            self.connection.execute("UPDATE transactions SET sheet_row = sheet_row + ?", (len(records),))
+            self._insert(records)
+        self._apply_change(insert_rows)
+
+    def record_uploaded(self, receipt_numbers: list[str]):
+        """
+        Applies receipts just marked as uploaded in the workbook and takes the saved workbook as the
+        store's state.
+
+        Call this only if the store was current before the workbook was changed (see is_current).
+
+        Parameters:
+        receipt_numbers (list[str]): Receipt numbers whose attachment column was set.
+        """
+        self._apply_change(lambda: self.connection.executemany(
+            "UPDATE transactions SET attachments = ?, uploaded = 1 WHERE receipt_no = ?",
+            [(self.uploaded_value, receipt_number) for receipt_number in receipt_numbers]))
+
+    def _apply_change(self, change):
+        """
+        Runs a change of the stored rows together with the new workbook signature in one transaction.
+        If it fails, the store is marked stale so the next query copies the workbook again.
+
+        Parameters:
+        change (callable): Statements to run.
+        """
+        with self._lock:
+            try:
+                signature = self._get_workbook_signature()
+                with self.connection:
+                    change()
+                    self._set_meta('signature', signature)
+                self.signature = signature
+            except (OSError, sqlite3.Error):
+                self.signature = None
+
+    def _to_dataframe(self, rows: list[tuple], headers: list[str]) -> pd.DataFrame:
+        """
+        Builds a DataFrame in the form pd.read_excel gives the ledger, indexed by sheet row minus two.
+
+        Parameters:
+        rows (list[tuple]): Sheet row followed by the values of the headers.
+        headers (list[str]): Ledger headers of the values.
+
+        Returns:
+        pd.DataFrame: Rows with the ledger headers as columns.
+        """
+        df = pd.DataFrame([row[1:] for row in rows], columns=headers,
+                          index=[row[0] - 2 for row in rows])
+        if 'Date' in df.columns:
+            df['Date'] = pd.to_datetime(df['Date'], errors='coerce', format='ISO8601')
+        return df
+
+    def _select(self, columns: list[str] = None) -> tuple[list[str], str]:
+        """
+        Resolves the ledger headers to read and the store columns to select.
+
+        Parameters:
+        columns (list[str]): Ledger headers (default is None, which takes every header of the sheet that
+                             the store keeps).
+
+        Returns:
+        tuple[list[str], str]: Headers, and the selected columns starting with the sheet row.
+
+        Raises:
+        ValueError: If a column is not a ledger column.
+        """
+        headers = columns or [header for header in self.headers if header in self.COLUMNS]
+        unknown = [header for header in headers if header not in self.COLUMNS]
+        if unknown:
+            raise ValueError(f"Columns {unknown} are not ledger columns.")
+        return headers, ', '.join(['sheet_row'] + [self.COLUMNS[header] for header in headers])
+
+    def read(self, columns: list[str] = None, where: str = "", parameters: tuple = ()) -> pd.DataFrame:
+        """
+        Reads ledger rows in sheet order, like pd.read_excel with usecols.
+
+        Parameters:
+        columns (list[str]): Ledger headers to read (default is None, which reads every header of the sheet
+                             that the store keeps).
+        where (str): SQL condition on the store columns (default is empty, which reads every row).
+        parameters (tuple): Parameters of the condition (default is empty).
+
+        Returns:
+        pd.DataFrame: Requested columns, indexed by sheet row minus two.
+
+        Raises:
+        ValueError: If a column is not a ledger column.
+        """
+        headers, selected = self._select(columns)
+        with self._lock:
+            self.refresh()
+            rows = self.connection.execute(
+                f"SELECT {selected} FROM transactions {'WHERE ' + where if where else ''} ORDER BY sheet_row",
+                parameters).fetchall()
+        return self._to_dataframe(rows, headers)
+
+    def not_uploaded(self) -> pd.DataFrame:
+        """
+        Gets the ledger rows whose receipt has not been uploaded.
+
+        Returns:
+        pd.DataFrame: Rows whose 'Attachments' is not 'Y', indexed by sheet row minus two.
+        """
+        return self.read(where="uploaded = 0")
+
+    def between(self, start: datetime, end: datetime) -> pd.DataFrame:
+        """
+        Gets the ledger rows dated within a range.
+
+        Parameters:
+        start (datetime): First date, included.
+        end (datetime): Last date, included.
+
+        Returns:
+        pd.DataFrame: Rows in the range, indexed by sheet row minus two.
+        """
+        return self.read(where="date BETWEEN ? AND ?",
+                         parameters=(start.isoformat(), datetime.combine(end, datetime.max.time()).isoformat()))
+
+    def find(self, receipt_number: str) -> dict | None:
+        """
+        Looks up a receipt's ledger row.
+
+        Parameters:
+        receipt_number (str): Receipt number to look up.
+
+        Returns:
+        dict | None: Values of the row by ledger header, with its sheet row under 'Row', or None if the
+                     receipt is not in the ledger.
+        """
+        headers, selected = self._select()
+        with self._lock:
+            self.refresh()
+            row = self.connection.execute(
+                f"SELECT {selected} FROM transactions WHERE receipt_no = ? ORDER BY sheet_row LIMIT 1",
+                (receipt_number,)).fetchone()
+        if row is None:
+            return None
+        found = dict(zip(headers, row[1:]))
+        if found.get('Date') is not None:
+            found['Date'] = pd.to_datetime(found['Date'], errors='coerce')
+        found['Row'] = row[0]
+        return found
+
+    def max_numbers(self) -> dict:
+        """
+        Gets the highest counter of each receipt number prefix.
+
+        Returns:
+        dict: Highest counter for each prefix, 0 for a prefix without receipts.
+        """
+        with self._lock:
+            self.refresh()
+            counters = {prefix: 0 for prefix in self.prefixes}
+            for prefix in self.prefixes:
+                (number,) = self.connection.execute(
+                    "SELECT MAX(number) FROM transactions WHERE prefix = ?", (prefix,)).fetchone()
+                counters[prefix] = number or 0
+        return counters
+
+    def next_numbers(self) -> tuple[int, int]:
+        """
+        Gets the number after the highest F and R receipt numbers of the ledger.
+
+        Returns:
+        tuple[int, int]: Next numbers for F and R receipts.
+        """
+        counters = self.max_numbers()
+        return counters['F'] + 1, counters['R'] + 1
+
+    def export_workbook(self, path: str, sheet_name: str = "TransactionHistory (2)"):
+        """
+        Writes the stored ledger to a new workbook, e.g. to rebuild a damaged or lost Excel file.
+
+        Parameters:
+        path (str): Path of the xlsx file to write.
+        sheet_name (str): Name of the ledger sheet (default is "TransactionHistory (2)").
+        """
+        df = self.read()
+        with instrumentation.span('ledger_store.export', rows=len(df)):
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet(sheet_name)
+            sheet.append(list(df.columns))
+            for values in df.itertuples(index=False, name=None):
+                sheet.append([None if pd.isna(value) else value.to_pydatetime() if isinstance(value, pd.Timestamp)
+                              else value for value in values])
+            workbook.save(path)
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
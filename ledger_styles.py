@@ -0,0 +1,110 @@
+"""
+Module to define the ledger's row styles once per workbook as named styles.
+"""
+
+from openpyxl.styles import Alignment, Border, NamedStyle, PatternFill, Side
+
+
+class LedgerStyles:
+    """
+    This class registers a small set of workbook-level named styles for the ledger rows and picks the one
+    for each cell, so a row is styled by assigning style names instead of building alignment, border,
+    number format and fill objects cell by cell.
+
+    Each kind of row has a base style and a date and an amount variant with their number formats:
+    'R-row' (green) for receipts paid from the HSA, 'F-row' (blue) for receipts paid otherwise and
+    'pending-row' (yellow) for rows without a valid receipt number.
+    """
+
+    kinds = {'R': ('R-row', "92D050"), 'F': ('F-row', "00B0F0"), None: ('pending-row', "FFFF00")}
+    variants = {'': 'General', 'date': 'MM/DD/YYYY', 'amount': '0.00'}
+
+    @classmethod
+    def style_names(cls) -> list[str]:
+        """
+        Gets the names of every ledger style.
+
+        Returns:
+        list[str]: Base, date and amount style name of each kind of row.
+        """
+        return [cls.variant_name(name, variant) for name, _ in cls.kinds.values() for variant in cls.variants]
+
+    @staticmethod
+    def variant_name(name: str, variant: str) -> str:
+        """
+        Builds the name of a style variant.
+
+        Parameters:
+        name (str): Name of the row style.
+        variant (str): '', 'date' or 'amount'.
+
+        Returns:
+        str: Style name, such as 'R-row date'.
+        """
+        return f"{name} {variant}" if variant else name
+
+    @classmethod
+    def register(cls, workbook):
+        """
+        Adds the ledger styles the workbook does not have yet.
+
+        Parameters:
+        workbook (Workbook): Workbook to add the styles to.
+        """
+        existing = set(workbook.named_styles)
+        side = Side(style='thin')
+        for name, color in cls.kinds.values():
+            for variant, number_format in cls.variants.items():
+                if cls.variant_name(name, variant) in existing:
+                    continue
+                workbook.add_named_style(NamedStyle(
+                    name=cls.variant_name(name, variant),
+                    fill=PatternFill(start_color=color, end_color=color, fill_type="solid"),
+                    border=Border(left=side, right=side, top=side, bottom=side),
+                    alignment=Alignment(horizontal='center', vertical='center'),
+                    number_format=number_format))
+
+    @classmethod
+    def row_style_names(cls, receipt_number, headers: list[str]) -> list[str]:
+        """
+        Picks the style of each cell of a row.
+
+        Parameters:
+        receipt_number: Receipt number of the row, whose prefix selects the kind of row.
+        headers (list[str]): Header of each column of the row.
+
+        Returns:
+        list[str]: Style name of each column.
+        """
+        prefix = receipt_number[:1] if isinstance(receipt_number, str) else None
+        name = cls.kinds.get(prefix, cls.kinds[None])[0]
+        return [cls.variant_name(name, str(header).lower() if str(header).lower() in cls.variants else '')
+                for header in headers]
+
+    @classmethod
+    def row_fill(cls, receipt_number) -> PatternFill:
+        """
+        Builds the fill of a row's kind alone, for rows the user owns, whose fonts, borders and number formats
+        must be kept.
+
+        Parameters:
+        receipt_number: Receipt number of the row, whose prefix selects the kind of row.
+
+        Returns:
+        PatternFill: Solid fill in the color of the kind of row.
+        """
+        prefix = receipt_number[:1] if isinstance(receipt_number, str) else None
+        color = cls.kinds.get(prefix, cls.kinds[None])[1]
+        return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+    @staticmethod
+    def apply_row(cells, style_names: list[str]):
+        """
+        Assigns the styles to the cells of a row.
+
+        Parameters:
+        cells: Cells of the row, in column order.
+        style_names (list[str]): Style name of each cell, as returned by row_style_names.
+        """
+        for cell, style_name in zip(cells, style_names):
+            cell.style = style_name
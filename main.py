@@ -2,24 +2,70 @@
 Main script to run the HSA receipt processing application.
 """
 
+import argparse
 import os
+from datetime import datetime
 import pandas as pd
 from dotenv import load_dotenv
 from pdf_checker import PDFChecker
 from user_transaction_input import UserTransactionInput
 from pdf_receipt_processor import PDFReceiptProcessor
 from user_input import UserInput
-from dataframe_to_excel import DataFrameToExcel
-from browser_setup import BrowserSetup
-from form_automation import FormAutomation
-from receipt_uploader import ReceiptUploader
+from ledger_batch_writer import LedgerBatchWriter
 from missing_receipt_processor import MissingReceiptProcessor
+from batch_runner import BatchRunner
+from browser_session_pool import BrowserSessionPool
+from submission_backend import create_backend
+from receipt_watcher import ReceiptWatcher
+from receipt_journal import ReceiptJournal
+from ledger_partitions import LedgerPartitions
+from instrumentation import instrumentation
 
 
 def main():
     """
     Main function to drive the entire process of handling HSA receipts.
     """
+    parser = argparse.ArgumentParser(description="Process HSA receipts.")
+    parser.add_argument('--manifest', help="CSV or JSON manifest to process without prompts.")
+    parser.add_argument('--results', default="batch_results.json",
+                        help="JSON file to write the outcome of a manifest run to.")
+    parser.add_argument('--bulk-missing', action='store_true',
+                        help="Match all receipts that have not been uploaded with the inbox PDFs at once.")
+    parser.add_argument('--sessions', type=int, default=1,
+                        help="Number of headless browser sessions to submit transactions with in parallel.")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium',
+                        help="Submit through the browser or by posting the portal's forms directly.")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Write and submit each receipt in the background while the next one is entered.")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and file new receipts as they arrive in the receipt folder.")
+    parser.add_argument('--watch-upload', action='store_true',
+                        help="Also submit the receipts filed by --watch to the portal.")
+    parser.add_argument('--rollover', type=int, nargs='?', const=datetime.now().year, metavar='YEAR',
+                        help="Move the rows of every tax year before YEAR (default this year) into archive workbooks.")
+    parser.add_argument('--trace', help="Time every stage, print a summary and write a Chrome trace to this file.")
+    args = parser.parse_args()
+
+    if args.trace:
+        instrumentation.enable()
+    try:
+        with instrumentation.span('main.run'):
+            process_receipts(args)
+    finally:
+        if args.trace:
+            instrumentation.report()
+            instrumentation.export(args.trace)
+            print(f"Trace written to {args.trace}.")
+
+
+def process_receipts(args: argparse.Namespace):
+    """
+    Runs the manifest, new transaction or missing receipt workflow.
+
+    Parameters:
+    args (argparse.Namespace): Parsed command line arguments.
+    """
     # df = pd.DataFrame()
     df_receipts = pd.DataFrame()
     df_non_receipt = pd.DataFrame()
@@ -41,60 +87,124 @@ def main():
     email = os.getenv('EMAIL_ADDRESS')
     password = os.getenv('EMAIL_PASSWORD')
 
+    # Finish the receipts an interrupted run left behind before starting new work
+    journal = ReceiptJournal.for_workbook(excel_file_loc)
+    if journal.pending():
+        print(f"Resuming {len(journal.pending())} receipt(s) of an interrupted run:\n{journal.summary()}")
+        with instrumentation.span('main.resume'), create_backend(args.backend, url, email, password) as backend:
+            for receipt_number, outcome in journal.resume(directory_path, excel_file_loc, backend).items():
+                print(f"{receipt_number}: {outcome}")
+
+    if args.rollover:
+        # Closed tax years leave the workbook new transactions are inserted into
+        with instrumentation.span('main.rollover'):
+            moved = LedgerPartitions(excel_file_loc).rollover(args.rollover)
+        for year, rows in moved.items():
+            print(f"Archived {rows} row(s) of {year} to {LedgerPartitions(excel_file_loc).archive_path(year)}.")
+        if not moved:
+            print(f"No rows before {args.rollover} to archive.")
+        return
+
+    if args.watch:
+        # Unattended mode: receipts are filed as they arrive, low-confidence ones are left for the prompts
+        backend = create_backend(args.backend, url, email, password) if args.watch_upload else None
+        try:
+            ReceiptWatcher(directory_path, excel_file_loc, backend).run()
+        finally:
+            if backend is not None:
+                backend.close()
+        return
+
+    if args.manifest:
+        # Headless batch mode: every transaction comes from the manifest instead of prompts
+        runner = BatchRunner(directory_path, excel_file_loc, url, email, password, args.sessions,
+                             args.backend)
+        with instrumentation.span('main.manifest'):
+            runner.run(args.manifest, args.results)
+        return
+
     is_new_trans = int(input("Are you entering new transactions? (1 for yes, 0 for no): "))
     if is_new_trans == 1:
         non_receipt_data = []
 
-        # Check if PDFs exist in the directory
-        pdf_checker = PDFChecker(directory_path)
-        has_receipts = pdf_checker.check_pdfs_exist()
-
-        if has_receipts:
-            # Instantiate the PDFReceiptProcessor class with the directory path
-            pdf_renamer = PDFReceiptProcessor(directory_path, excel_file_loc)
-            pdf_renamer.rename_pdfs()  # Rename the PDFs based on extracted information
-            # Convert the processed data to a DataFrame
-            df_receipts = pdf_renamer.to_dataframe()
-
-        # Ask the user if they have transactions without receipts
-        user_input_handler = UserTransactionInput()
-        if user_input_handler.ask_user_for_transactions_without_receipt():
-            number_non_receipt_transactions = user_input_handler.get_number_of_transactions()
-            for transaction_number in range(1, number_non_receipt_transactions + 1):
-                user_input = UserInput('', excel_file_loc, transaction_number, False)
-                user_in = user_input.get_user_inputs()
-                non_receipt_data.append(user_in)
-                current_non_receipt_data = user_in
-                df_current_non = pd.DataFrame(current_non_receipt_data, index=[0])
-                processor = DataFrameToExcel(df_current_non, excel_file_loc)
-                processor.process()  # Save the updated DataFrame to the Excel file
-            df_non_receipt = pd.DataFrame(non_receipt_data)
+        # Collects every ledger row of this session and writes them to the Excel file in one save,
+        # also when the session is interrupted after some receipts were already renamed
+        with instrumentation.span('main.new_transactions'), LedgerBatchWriter(excel_file_loc, journal) as ledger_writer:
+            # Check if PDFs exist in the directory
+            pdf_checker = PDFChecker(directory_path)
+            has_receipts = pdf_checker.check_pdfs_exist()
+
+            if has_receipts:
+                # Instantiate the PDFReceiptProcessor class with the directory path
+                pdf_renamer = PDFReceiptProcessor(directory_path, excel_file_loc, ledger_writer)
+                if args.pipeline:
+                    # Receipts are written and submitted as they are entered, so only the transactions
+                    # without receipts are left for the submission below
+                    with instrumentation.span('main.receipt_pipeline'), \
+                            create_backend(args.backend, url, email, password) as backend:
+                        for result in pdf_renamer.rename_and_submit_pdfs(backend):
+                            if result['error']:
+                                print(f"{result['new_filename']}: {result['error']}")
+                    has_receipts = False
+                else:
+                    with instrumentation.span('main.rename_pdfs'):
+                        pdf_renamer.rename_pdfs()  # Rename the PDFs based on extracted information
+                    # Convert the processed data to a DataFrame
+                    df_receipts = pdf_renamer.to_dataframe()
+
+            # Ask the user if they have transactions without receipts
+            user_input_handler = UserTransactionInput()
+            if user_input_handler.ask_user_for_transactions_without_receipt():
+                number_non_receipt_transactions = user_input_handler.get_number_of_transactions()
+                for transaction_number in range(1, number_non_receipt_transactions + 1):
+                    user_input = UserInput('', excel_file_loc, transaction_number, False)
+                    with instrumentation.span('main.non_receipt_input'):
+                        user_in = user_input.get_user_inputs()
+                    non_receipt_data.append(user_in)
+                    journal.begin(user_in)
+                    ledger_writer.add_transaction(user_in)
+                df_non_receipt = pd.DataFrame(non_receipt_data)
 
         df = pd.concat([df_receipts, df_non_receipt], axis=0)
-        df['Date'] = pd.to_datetime(df['Date'])
-        df['Date'] = df['Date'].dt.strftime('%m/%d/%Y')
 
         # If the DataFrame is not empty, proceed with the automation tasks
         if not df.empty:
-            # Initialize the browser and login using the provided url, email, and password
-            browser = BrowserSetup(url, email, password)
-
-            # Perform form automation tasks using the processed data
-            form_automation = FormAutomation(browser, df)
-            form_automation.run()  # Fill out the form with the data from the DataFrame
-
-            if has_receipts:
-                # Search for and upload the processed receipts
-                uploader = ReceiptUploader(browser, df, directory_path, directory_path + "\Receipts")
-                uploader.search_and_upload_receipt()
-        else:
+            df['Date'] = pd.to_datetime(df['Date'])
+            df['Date'] = df['Date'].dt.strftime('%m/%d/%Y')
+            df = df.reset_index(drop=True)
+            receipts_directory = directory_path if has_receipts else None
+            destination_directory = os.path.join(directory_path, "Receipts")
+            if args.sessions > 1 and args.backend == 'selenium':
+                # Shard the transactions over several headless sessions
+                with instrumentation.span('main.portal_submission', rows=len(df)), \
+                        BrowserSessionPool(url, email, password, size=args.sessions) as pool:
+                    results = pool.submit(df, receipts_directory, destination_directory, journal=journal)
+                    pool.report()
+            else:
+                # Create the purchases and upload the processed receipts through the chosen backend
+                with instrumentation.span('main.portal_submission', rows=len(df)), \
+                        create_backend(args.backend, url, email, password) as backend:
+                    results = backend.submit(df, receipts_directory, destination_directory, journal=journal)
+                    # Show where the time on the portal went
+                    backend.report()
+            for result in results:
+                if result['error']:
+                    print(f"{df.loc[result['index'], 'New Filename']}: {result['error']}")
+            # Receipts that are done are dropped from the journal; failed ones are retried on the next run
+            journal.compact()
+        elif not args.pipeline:
             # If no receipts were found or processed, notify the user
             print("NO TRANSACTIONS!")
     else:
-        # Load the transactions from the Excel file
-        df_transactions = pd.read_excel(excel_file_loc)
+        # Load the transactions without a receipt from the ledger stores of the Excel file and its archived years
+        with instrumentation.span('main.load_ledger'):
+            df_transactions = LedgerPartitions(excel_file_loc).not_uploaded()
         mr = MissingReceiptProcessor(df_transactions, excel_file_loc, directory_path, url, email, password)
-        mr.process_receipt_selection()
+        with instrumentation.span('main.missing_receipts'):
+            if args.bulk_missing:
+                mr.process_bulk_reconciliation()
+            else:
+                mr.process_receipt_selection()
 
 
 if __name__ == "__main__":
@@ -4,10 +4,14 @@ Module to process missing receipts and update the Excel file.
 
 import os
 import pandas as pd
-import openpyxl
-from openpyxl.styles import PatternFill
 from browser_setup import BrowserSetup
 from pdf_receipt_processor import PDFReceiptProcessor
+from pdf_extraction_pool import PDFExtractionPool
+from pdf_cache import PDFCache
+from ledger_index import LedgerIndex
+from ledger_partitions import LedgerPartitions
+from receipt_field_extractor import ReceiptFieldExtractor
+from receipt_matcher import ReceiptMatcher
 from receipt_uploader import ReceiptUploader
 
 
@@ -39,6 +43,9 @@ class MissingReceiptProcessor:
         self.URL = url
         self.EMAIL = email
         self.PASSWORD = password
+        self.pdf_cache = PDFCache()
+        self.inbox_extractions = {}
+        # Chrome only starts, and logs in, once a receipt is actually uploaded
         self.browser = BrowserSetup(url, email, password)
 
     def filter_not_uploaded(self):
@@ -76,82 +83,69 @@ class MissingReceiptProcessor:
             except ValueError:
                 print("Please enter a valid integer index.")
 
-    def find_column_letters(self, sheet) -> tuple[str, str]:
+    def insert_into_cell(self, search_value: str):
         """
-        Finds the column letters for the search and update columns in the Excel sheet.
+        Inserts a value into the appropriate cell in the Excel sheet.
 
         Parameters:
-        sheet (Worksheet): Excel worksheet.
-
-        Returns:
-        tuple[str, str]: Column letters for the search and update columns.
+        search_value (str): Value to insert.
         """
-        search_col_letter = None
-        update_col_letter = None
-        for col in sheet.iter_cols(1, sheet.max_column):
-            if col[0].value == self.search_column:
-                search_col_letter = col[0].column_letter
-            if col[0].value == self.update_column:
-                update_col_letter = col[0].column_letter
-        return search_col_letter, update_col_letter
+        self.insert_into_cells([search_value])
 
-    def update_row(self, row, search_value: str, update_col_letter: str, sheet):
+    def insert_into_cells(self, search_values: list[str]):
         """
-        Updates a row in the Excel sheet.
-
-        Parameters:
-        row (Row): Row to update.
-        search_value (str): Value to search for.
-        update_col_letter (str): Column letter of the update column.
-        sheet (Worksheet): Excel worksheet.
-        """
-        row[sheet[update_col_letter + '1'].col_idx - 1].value = self.new_value
-        print(f"Updated {self.update_column} in row {row[0].row} to {self.new_value}.")
-        if search_value.startswith('F'):
-            fill = PatternFill(start_color="00B0F0", end_color="00B0F0", fill_type="solid")
-        elif search_value.startswith('R'):
-            fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")
-        else:
-            print("Error: search_value must begin with 'F' or 'R'.")
-            return
-        for cell in row:
-            cell.fill = fill
+        Marks many receipts as uploaded with a single load and save of each Excel file holding them.
 
-    def insert_into_cell(self, search_value: str):
-        """
-        Inserts a value into the appropriate cell in the Excel sheet.
+        openpyxl can only write a fully loaded workbook, so the receipts are first looked up in the ledger
+        stores of the current and archived tax years, and only the workbooks holding one of them are loaded.
 
         Parameters:
-        search_value (str): Value to insert.
+        search_values (list[str]): Receipt numbers to mark.
         """
-        wb = openpyxl.load_workbook(self.excel_file_loc)
-        sheet = wb[self.sheet_name]
-        search_col_letter, update_col_letter = self.find_column_letters(sheet)
-        if not search_col_letter or not update_col_letter:
-            print(f"Error: Column '{self.search_column}' or '{self.update_column}' not found.")
-            return
-        for row in sheet.iter_rows(min_row=2, max_row=sheet.max_row):
-            if row[sheet[search_col_letter + '1'].col_idx - 1].value == search_value:
-                self.update_row(row, search_value, update_col_letter, sheet)
-                break
-        else:
-            print(f"Value '{search_value}' not found in column '{self.search_column}'.")
-        wb.save(self.excel_file_loc)
-        print(f"Saved changes to {self.excel_file_loc}.")
+        ledger_partitions = LedgerPartitions(self.excel_file_loc)
+        by_workbook = {}
+        for search_value in search_values:
+            found = ledger_partitions.find(search_value)
+            if found is None:
+                print(f"Value '{search_value}' not found in column '{self.search_column}'.")
+            else:
+                by_workbook.setdefault(found['Workbook'], []).append(search_value)
+        for workbook_path, workbook_values in by_workbook.items():
+            ledger_index = LedgerIndex(workbook_path, self.sheet_name, self.search_column, self.update_column)
+            try:
+                ledger_index.load()
+            except KeyError:
+                print(f"Error: Column '{self.search_column}' or '{self.update_column}' not found.")
+                continue
+            not_updated = ledger_index.mark_uploaded(workbook_values, self.new_value)
+            for search_value in workbook_values:
+                if search_value not in not_updated:
+                    print(f"Updated {self.update_column} in row {ledger_index.find_row(search_value)} "
+                          f"to {self.new_value}.")
+                else:
+                    print("Error: search_value must begin with 'F' or 'R'.")
+            if ledger_index.marked:
+                ledger_index.save()
+                print(f"Saved changes to {workbook_path}.")
 
     def process_receipt_selection(self):
         """
         Processes the selection and uploading of missing receipts.
+
+        The inbox PDFs are shown best match first, scored against the selected receipt. The ledger row is
+        only marked once the receipt was uploaded to its purchase on the portal.
         """
         self.filter_not_uploaded()
         self.display_not_uploaded()
         selected_receipt = self.select_receipt().copy()
         name_to_rename = selected_receipt['Receipt no']
-        pdf_files = [f for f in os.listdir(self.directory_path) if f.lower().endswith('.pdf')]
-        for pdf_receipt in pdf_files:
-            pdf_renamer = PDFReceiptProcessor(self.directory_path, self.excel_file_loc)
+        inbox = self.extract_inbox()
+        matcher = ReceiptMatcher(self.df_not_uploaded.loc[[selected_receipt.name]], inbox)
+        pdf_renamer = PDFReceiptProcessor(self.directory_path, self.excel_file_loc, pdf_cache=self.pdf_cache)
+        for pdf_receipt, score in matcher.rank(0):
             file_path = os.path.join(self.directory_path, pdf_receipt)
-            pdf_renamer.display_pdf_info(file_path, pdf_receipt)
+            print(f"Match score: {score:.0%}")
+            pdf_renamer.display_pdf_info(file_path, pdf_receipt, self.inbox_extractions[pdf_receipt])
             is_correct_receipt = input("Is this the receipt you want to match? Y or N ")
             if is_correct_receipt == "Y":
                 print("YOU FOUND IT")
@@ -161,6 +155,112 @@ class MissingReceiptProcessor:
                 selected_receipt['New Filename'] = f"{name_to_rename}_{selected_receipt['Amount']}"
                 uploader = ReceiptUploader(self.browser, selected_receipt.to_frame().T, self.directory_path,
                                            os.path.join(self.directory_path, "Receipts"))
-                uploader.search_and_upload_receipt()
-                self.insert_into_cell(name_to_rename)
+                outcomes = uploader.search_and_upload_receipt()
+                if outcomes.get(f"{selected_receipt['New Filename']}.pdf") == 'uploaded':
+                    self.insert_into_cell(name_to_rename)
+                else:
+                    print(f"'{selected_receipt['New Filename']}.pdf' was renamed but not uploaded; "
+                          f"{name_to_rename} stays marked as missing its receipt.")
                 break
+
+    def extract_inbox(self) -> list[tuple[str, str, dict]]:
+        """
+        Extracts every PDF in the directory and proposes its date, amount and provider.
+
+        Returns:
+        list[tuple[str, str, dict]]: Filename, extracted text and field proposals of each PDF, in folder order.
+        """
+        field_extractor = ReceiptFieldExtractor.from_ledger(self.excel_file_loc)
+        with PDFExtractionPool(cache=self.pdf_cache) as extraction_pool:
+            extractions = extraction_pool.extract_folder(self.directory_path)
+        self.inbox_extractions = {os.path.basename(extraction.file_path): extraction for extraction in extractions}
+        return [(os.path.basename(extraction.file_path), extraction.text, proposals)
+                for extraction, proposals in zip(extractions, field_extractor.extract_batch(extractions))]
+
+    def pair_receipts(self, inbox: list[tuple[str, str, dict]]) -> dict:
+        """
+        Assigns the inbox PDFs to the receipts that have not been uploaded, with the highest
+        total score across all rows and PDFs.
+
+        Parameters:
+        inbox (list[tuple[str, str, dict]]): Filename, extracted text and field proposals of each inbox PDF.
+
+        Returns:
+        dict: 'matched' as (index, filename, score) triples, 'unmatched' as indexes and 'ambiguous' as
+              (index, candidate filenames) pairs.
+        """
+        return ReceiptMatcher(self.df_not_uploaded, inbox).assign()
+
+    def display_reconciliation_summary(self, summary: dict):
+        """
+        Displays the matched, unmatched and ambiguous receipts of a bulk reconciliation.
+
+        Parameters:
+        summary (dict): Summary returned by pair_receipts.
+        """
+        print(f"Matched: {len(summary['matched'])}")
+        for index, filename, score in summary['matched']:
+            print(f"  {self.df_not_uploaded.loc[index, 'Receipt no']} <- {filename} ({score:.0%})")
+        print(f"Ambiguous: {len(summary['ambiguous'])}")
+        for index, filenames in summary['ambiguous']:
+            print(f"  {self.df_not_uploaded.loc[index, 'Receipt no']}: {', '.join(filenames)}")
+        print(f"Unmatched: {len(summary['unmatched'])}")
+        for index in summary['unmatched']:
+            print(f"  {self.df_not_uploaded.loc[index, 'Receipt no']}")
+
+    def upload_matches(self, matches: list[tuple]) -> list[str]:
+        """
+        Renames the matched PDFs, uploads them in the logged-in browser session and marks the
+        ledger rows of the uploaded ones with a single save.
+
+        A receipt whose purchase is not found on the portal keeps its new name and its ledger row stays
+        unmarked, so it is offered again next time.
+
+        Parameters:
+        matches (list[tuple]): (index, filename, score) triples of ledger rows and inbox PDFs.
+
+        Returns:
+        list[str]: Receipt numbers that were uploaded.
+        """
+        selected_receipts = []
+        for index, filename, score in matches:
+            selected_receipt = self.df_not_uploaded.loc[index].copy()
+            name_to_rename = selected_receipt['Receipt no']
+            new_filename = f"{name_to_rename}_{selected_receipt['Amount']}"
+            os.rename(os.path.join(self.directory_path, filename),
+                      os.path.join(self.directory_path, new_filename + ".pdf"))
+            selected_receipt['In HSA?'] = "Y"
+            selected_receipt['New Filename'] = new_filename
+            selected_receipts.append(selected_receipt)
+        if not selected_receipts:
+            return []
+        uploader = ReceiptUploader(self.browser, pd.DataFrame(selected_receipts), self.directory_path,
+                                   os.path.join(self.directory_path, "Receipts"))
+        outcomes = uploader.search_and_upload_receipt()
+        receipt_numbers = []
+        for selected_receipt in selected_receipts:
+            if outcomes.get(f"{selected_receipt['New Filename']}.pdf") == 'uploaded':
+                receipt_numbers.append(selected_receipt['Receipt no'])
+            else:
+                print(f"'{selected_receipt['New Filename']}.pdf' was renamed but not uploaded; "
+                      f"{selected_receipt['Receipt no']} stays marked as missing its receipt.")
+        if receipt_numbers:
+            self.insert_into_cells(receipt_numbers)
+        return receipt_numbers
+
+    def process_bulk_reconciliation(self) -> dict:
+        """
+        Pairs every receipt that has not been uploaded with the inbox PDFs and uploads all matches
+        in one browser session and one ledger save.
+
+        Returns:
+        dict: Summary of the matched, unmatched and ambiguous receipts.
+        """
+        self.filter_not_uploaded()
+        summary = self.pair_receipts(self.extract_inbox())
+        self.display_reconciliation_summary(summary)
+        if summary['matched']:
+            confirmation = input(f"Upload the {len(summary['matched'])} matched receipts? Y or N ")
+            if confirmation == "Y":
+                self.upload_matches(summary['matched'])
+        return summary
@@ -0,0 +1,462 @@
+"""
+Module providing a local stand-in for the HSA portal, for exercising the browser automation offline.
+
+Usage:
+    python mock_portal.py --port 8765 --latency 0.2 --jitter 0.1 --failure-rate 0.05
+"""
+
+import argparse
+import html
+import random
+import secrets
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MockPortal:
+    """
+    This class serves the pages the automation relies on: the login page, the purchase listing with
+    its new purchase form and camera icons, the purchase edit page and the image upload.
+
+    Purchases are kept in memory and can be inspected through the purchases attribute. Every response
+    can be delayed by a configurable latency, and form submissions can be made to fail at random with
+    a 500 error, to mimic a slow or flaky portal.
+    """
+
+    failing_actions = ('create', 'upload', 'update')
+
+    def __init__(self, email: str = "user@example.com", password: str = "secret", host: str = "127.0.0.1",
+                 port: int = 0, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0,
+                 seed: int = None):
+        """
+        Initializes the MockPortal instance.
+
+        Parameters:
+        email (str): Email address accepted by the login form (default is "user@example.com").
+        password (str): Password accepted by the login form (default is "secret").
+        host (str): Host to listen on (default is "127.0.0.1").
+        port (int): Port to listen on (default is 0, which picks a free port).
+        latency (float): Seconds every response is delayed by (default is 0.0).
+        jitter (float): Most seconds added at random to the latency (default is 0.0).
+        failure_rate (float): Share of purchase, upload and update submissions answered with a 500 error
+                              (default is 0.0).
+        seed (int): Seed of the random jitter and failures (default is None).
+        """
+        self.email = email
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.request_counts = {}
+        self.failure_counts = {}
+        self.purchases = []
+        self.sessions = set()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        Gets the base URL of the portal.
+
+        Returns:
+        str: Base URL, without a trailing slash.
+        """
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def login_url(self) -> str:
+        """
+        Gets the URL of the login page.
+
+        Returns:
+        str: Login page URL.
+        """
+        return self.url + "/login"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops serving.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def find_purchase(self, purchase_id: int) -> dict | None:
+        """
+        Gets a purchase by its id.
+
+        Parameters:
+        purchase_id (int): Id of the purchase.
+
+        Returns:
+        dict | None: The purchase, or None if there is none with this id.
+        """
+        with self.lock:
+            return next((purchase for purchase in self.purchases if purchase['id'] == purchase_id), None)
+
+    def delay(self, action: str) -> bool:
+        """
+        Counts a request, waits for the injected latency and decides whether the request fails.
+
+        Parameters:
+        action (str): Kind of request, e.g. 'create' or 'listing'.
+
+        Returns:
+        bool: True if the request is to be answered with an injected failure, False otherwise.
+        """
+        with self.lock:
+            self.request_counts[action] = self.request_counts.get(action, 0) + 1
+            wait = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = action in self.failing_actions and self.random.random() < self.failure_rate
+            if fail:
+                self.failure_counts[action] = self.failure_counts.get(action, 0) + 1
+        if wait > 0:
+            time.sleep(wait)
+        return fail
+
+    def _make_handler(self):
+        """
+        Builds the request handler class bound to this portal.
+
+        Returns:
+        type: BaseHTTPRequestHandler subclass.
+        """
+        portal = self
+
+        class Handler(PortalRequestHandler):
+            pass
+
+        Handler.portal = portal
+        return Handler
+
+
+class PortalRequestHandler(BaseHTTPRequestHandler):
+    """
+    This class handles the requests of one MockPortal.
+    """
+
+    portal = None
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _session(self) -> str | None:
+        """
+        Gets the session token of the request if it is logged in.
+
+        Returns:
+        str | None: Session token, or None if the request is not logged in.
+        """
+        for part in self.headers.get('Cookie', '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == 'session' and value in self.portal.sessions:
+                return value
+        return None
+
+    def _send(self, status: int, body: str = "", headers: dict = None):
+        """
+        Sends a response.
+
+        Parameters:
+        status (int): HTTP status code.
+        body (str): HTML body.
+        headers (dict): Extra headers (default is None).
+        """
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _redirect(self, location: str, headers: dict = None):
+        """
+        Redirects the browser with a 303 See Other.
+
+        Parameters:
+        location (str): Path to redirect to.
+        headers (dict): Extra headers (default is None).
+        """
+        self._send(303, "", {'Location': location, **(headers or {})})
+
+    def _read_form(self) -> tuple[dict, dict]:
+        """
+        Reads an urlencoded or multipart form body.
+
+        Returns:
+        tuple[dict, dict]: Field values, and uploaded files as (filename, content) by field name.
+        """
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body)
+            fields, files = {}, {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                filename = part.get_filename()
+                if filename is not None:
+                    files[name] = (filename, part.get_payload(decode=True) or b'')
+                else:
+                    fields[name] = (part.get_payload(decode=True) or b'').decode('utf-8')
+            return fields, files
+        return {name: values[0] for name, values in parse_qs(body.decode('utf-8'), keep_blank_values=True).items()}, {}
+
+    @staticmethod
+    def _action(method: str, path: str) -> str:
+        """
+        Names the kind of a request, for latency and failure injection.
+
+        Parameters:
+        method (str): HTTP method.
+        path (str): Request path.
+
+        Returns:
+        str: 'login', 'listing', 'create', 'edit', 'upload', 'update' or 'other'.
+        """
+        if path in ('/', '/login'):
+            return 'login'
+        if path == '/purchases':
+            return 'listing' if method == 'GET' else 'create'
+        if path.startswith('/purchases/'):
+            if method == 'GET':
+                return 'edit'
+            return 'upload' if path.endswith('/image') else 'update'
+        return 'other'
+
+    def _inject(self, method: str, path: str) -> bool:
+        """
+        Applies the portal's injected latency and answers with a 500 error if the request is to fail.
+
+        Parameters:
+        method (str): HTTP method.
+        path (str): Request path.
+
+        Returns:
+        bool: True if an error was sent and the request must not be handled, False otherwise.
+        """
+        if not self.portal.delay(self._action(method, path)):
+            return False
+        self._send(500, "<html><body><h1>Internal Server Error</h1></body></html>")
+        return True
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if self._inject('GET', path):
+            return
+        if path in ('/', '/login'):
+            self._send(200, LOGIN_PAGE)
+        elif not self._session():
+            self._redirect('/login')
+        elif path == '/purchases':
+            self._send(200, self._listing_page())
+        elif path.startswith('/purchases/') and path.endswith('/edit'):
+            purchase = self._purchase_from_path(path)
+            if purchase is None:
+                self._send(404, "Not found")
+            else:
+                self._send(200, self._edit_page(purchase))
+        else:
+            self._send(404, "Not found")
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        fields, files = self._read_form()
+        if self._inject('POST', path):
+            return
+        if path == '/login':
+            if fields.get('login_email') == self.portal.email and fields.get('login_pass') == self.portal.password:
+                token = secrets.token_hex(16)
+                with self.portal.lock:
+                    self.portal.sessions.add(token)
+                self._redirect('/purchases', {'Set-Cookie': f"session={token}; Path=/; HttpOnly"})
+            else:
+                self._send(200, LOGIN_PAGE.replace('<!-- error -->', '<p class="error">Invalid login.</p>'))
+        elif not self._session():
+            self._redirect('/login')
+        elif path == '/purchases':
+            # Like the real portal, a select only accepts the values of its options, not their labels
+            if any(fields.get(name) not in values for name, values in SELECT_VALUES.items()):
+                self._send(400, "Bad request")
+                return
+            with self.portal.lock:
+                purchase = {'id': len(self.portal.purchases) + 1, 'fields': fields, 'images': [], 'updates': 0}
+                self.portal.purchases.append(purchase)
+            self._redirect('/purchases')
+        elif path.startswith('/purchases/') and path.endswith('/image'):
+            purchase = self._purchase_from_path(path)
+            if purchase is None or 'image' not in files:
+                self._send(400, "Bad request")
+                return
+            filename, content = files['image']
+            with self.portal.lock:
+                purchase['images'].append({'filename': filename, 'size': len(content),
+                                           'description': fields.get('img_description', '')})
+            self._redirect(f"/purchases/{purchase['id']}/edit")
+        elif path.startswith('/purchases/'):
+            purchase = self._purchase_from_path(path)
+            if purchase is None:
+                self._send(404, "Not found")
+                return
+            with self.portal.lock:
+                purchase['updates'] += 1
+                if 'notes' in fields:
+                    purchase['fields']['notes'] = fields['notes']
+            self._redirect(f"/purchases/{purchase['id']}/edit")
+        else:
+            self._send(404, "Not found")
+
+    def _purchase_from_path(self, path: str) -> dict | None:
+        """
+        Gets the purchase addressed by a /purchases/<id>/... path.
+
+        Parameters:
+        path (str): Request path.
+
+        Returns:
+        dict | None: The purchase, or None if the path does not address one.
+        """
+        parts = path.strip('/').split('/')
+        if len(parts) < 2 or not parts[1].isdigit():
+            return None
+        return self.portal.find_purchase(int(parts[1]))
+
+    def _listing_page(self) -> str:
+        """
+        Renders the new purchase form and the purchase listing.
+
+        Returns:
+        str: HTML page.
+        """
+        with self.portal.lock:
+            purchases = list(self.portal.purchases)
+        rows = "".join(
+            f"<tr><td>{html.escape(purchase['fields'].get('datepicker', ''))}</td>"
+            f"<td>{html.escape(purchase['fields'].get('provider', ''))}</td>"
+            f"<td>{html.escape(purchase['fields'].get('amount', ''))}</td>"
+            f"<td><a href=\"/purchases/{purchase['id']}/edit\"><img src=\"/static/camera.png\" alt=\"receipt\"></a>"
+            f"</td></tr>"
+            for purchase in reversed(purchases))
+        return LISTING_PAGE.replace('<!-- rows -->', rows)
+
+    @staticmethod
+    def _edit_page(purchase: dict) -> str:
+        """
+        Renders the edit page of a purchase.
+
+        Parameters:
+        purchase (dict): Purchase to render.
+
+        Returns:
+        str: HTML page.
+        """
+        images = "".join(f"<li>{html.escape(image['filename'])}</li>" for image in purchase['images'])
+        return (EDIT_PAGE.replace('{id}', str(purchase['id']))
+                .replace('{notes}', html.escape(purchase['fields'].get('notes', '')))
+                .replace('<!-- images -->', images))
+
+
+SELECT_VALUES = {
+    'pmt_method': {'hsa', 'credit'},
+    'category': {'rx', 'therapy', 'doctor', 'dental', 'lab', 'vision'},
+}
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>Login</title></head><body>
+<!-- error -->
+<form method="post" action="/login">
+<input id="login_email" name="login_email" type="email">
+<input id="login_pass" name="login_pass" type="password">
+<button id="login" name="login" type="submit">Sign in</button>
+</form>
+</body></html>"""
+
+LISTING_PAGE = """<!DOCTYPE html>
+<html><head><title>Purchases</title></head><body>
+<form method="post" action="/purchases">
+<input id="datepicker" name="datepicker">
+<input id="provider" name="provider">
+<input id="description" name="description">
+<input id="amount" name="amount">
+<select id="pmt_method" name="pmt_method"><option value="hsa">HSA Account</option><option value="credit">Credit</option>
+</select>
+<input id="reimbursed_amount" name="reimbursed_amount">
+<select id="category" name="category"><option value="rx">Prescriptions</option>
+<option value="therapy">Therapy / counseling</option><option value="doctor">Doctor</option>
+<option value="dental">Dental</option><option value="lab">Lab / Tests</option><option value="vision">Vision</option>
+</select>
+<textarea id="notes" name="notes"></textarea>
+<button name="create_purchase" type="submit">Save</button>
+</form>
+<table id="purchases"><!-- rows --></table>
+</body></html>"""
+
+EDIT_PAGE = """<!DOCTYPE html>
+<html><head><title>Edit purchase</title></head><body>
+<form method="post" action="/purchases/{id}/image" enctype="multipart/form-data">
+<input id="image" name="image" type="file">
+<input id="img_description" name="img_description">
+<button name="upload_image" type="submit">Upload</button>
+</form>
+<ul id="images"><!-- images --></ul>
+<form method="post" action="/purchases/{id}">
+<textarea id="notes" name="notes">{notes}</textarea>
+<button name="update_purchase" type="submit">Save</button>
+</form>
+<form method="get" action="/purchases">
+<button name="exit_edit" type="submit">Exit</button>
+</form>
+</body></html>"""
+
+
+def main():
+    """
+    Parses the command line and serves the mock portal until interrupted.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on.")
+    parser.add_argument('--email', default="user@example.com", help="Email address accepted by the login form.")
+    parser.add_argument('--password', default="secret", help="Password accepted by the login form.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds every response is delayed by.")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Most seconds added at random to the latency.")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Share of purchase, upload and update submissions that fail with a 500 error.")
+    parser.add_argument('--seed', type=int, help="Seed of the random jitter and failures.")
+    args = parser.parse_args()
+    portal = MockPortal(args.email, args.password, port=args.port, latency=args.latency, jitter=args.jitter,
+                        failure_rate=args.failure_rate, seed=args.seed)
+    print(f"Mock portal at {portal.login_url}")
+    try:
+        portal.server.serve_forever()
+    except KeyboardInterrupt:
+        portal.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Benchmark suite for the offline (non-browser) hot paths on synthetic ledgers and receipt PDFs.
+
+Usage:
+    python offline_benchmark.py --sizes 1000,10000,100000 --pdfs 50 --output baseline.json
+    python offline_benchmark.py --sizes 1000,10000 --baseline baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Alignment, Border, PatternFill, Side
+from dataframe_to_excel import DataFrameToExcel
+from field_extraction_benchmark import PROVIDERS, generate_fixtures
+from ledger_index import LedgerIndex
+from ledger_reader import LedgerReader
+from ledger_store import LedgerStore
+from ledger_styles import LedgerStyles
+from missing_receipt_processor import MissingReceiptProcessor
+from pdf_checker import PDFChecker
+from pdf_reader import PDFReader
+from receipt_number_allocator import ReceiptNumberAllocator
+from user_input import UserInput
+
+SHEET_NAME = "TransactionHistory (2)"
+
+LEDGER_COLUMNS = ['Date', 'Provider', 'Amount', 'HSA Cash Balance', 'Attachments', 'Receipt no', 'In HSA?', 'Notes',
+                  'New Filename', 'Type', 'Category', 'Payment Method']
+
+CATEGORIES = ['Prescriptions', 'Therapy / counseling', 'Doctor', 'Dental', 'Lab / Tests', 'Vision']
+
+NEW_TRANSACTIONS = 10
+
+
+def generate_ledger(path: str, rows: int, seed: int = 7):
+    """
+    Writes a synthetic ledger with the real column set, newest transactions first.
+
+    Parameters:
+    path (str): Path of the xlsx file to write.
+    rows (int): Number of transactions.
+    seed (int): Random seed (default is 7).
+    """
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(SHEET_NAME)
+    sheet.append(LEDGER_COLUMNS)
+    start = datetime(2015, 1, 1)
+    for number in range(rows, 0, -1):
+        prefix = 'R' if rng.random() < 0.7 else 'F'
+        amount = rng.randrange(500, 150000) / 100
+        receipt_number = f"{prefix}{number}"
+        sheet.append([start + timedelta(hours=number * 2), rng.choice(PROVIDERS), amount, '-',
+                      'Y' if rng.random() < 0.9 else 'N', receipt_number, 'Y' if prefix == 'R' else 'N', '',
+                      f"{receipt_number}_{amount}", 'Medical', rng.choice(CATEGORIES),
+                      "HSA Account" if prefix == 'R' else "Credit"])
+    workbook.save(path)
+
+
+def new_transactions(count: int) -> pd.DataFrame:
+    """
+    Builds transactions in the form DataFrameToExcel receives them.
+
+    Parameters:
+    count (int): Number of transactions.
+
+    Returns:
+    pd.DataFrame: Transactions with the keys of UserInput.build_transaction.
+    """
+    return pd.DataFrame([{
+        'Date': f"01/{number % 28 + 1:02d}/2030", 'Provider': "CVS Pharmacy", 'Amount': f"{number + 10}.99",
+        'HSA Cash Balance': '-', 'Attachments': 'Y', 'Receipt Number': f"R{10 ** 7 + number}", 'In HSA?': 'Y',
+        'Notes': '', 'New Filename': f"R{10 ** 7 + number}_{number + 10}.99", 'Type': 'Medical',
+        'Category': 'Prescriptions', 'Payment Method': "HSA Account"
+    } for number in range(count)])
+
+
+def measure(function, setup=None, memory: bool = True) -> dict:
+    """
+    Times a function and, separately, measures its peak traced memory.
+
+    Tracing slows Python down, so the timing run is untraced and the memory run is a second call.
+
+    Parameters:
+    function (callable): Function to measure, taking the result of setup if there is one.
+    setup (callable): Untimed preparation run before each call (default is None).
+    memory (bool): Whether to measure peak memory (default is True).
+
+    Returns:
+    dict: 'seconds' and 'peak_mb' (None when memory is not measured).
+    """
+    arguments = (setup(),) if setup else ()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        function(*arguments)
+        seconds = time.perf_counter() - start
+    peak_mb = None
+    if memory:
+        arguments = (setup(),) if setup else ()
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracemalloc.start()
+            try:
+                function(*arguments)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+    return {'seconds': seconds, 'peak_mb': peak_mb}
+
+
+def style_ledger(workbook: Workbook, named: bool):
+    """
+    Styles every ledger row, with the named ledger styles or cell by cell the way DataFrameToExcel did
+    before named styles.
+
+    Parameters:
+    workbook (Workbook): Loaded synthetic ledger.
+    named (bool): Whether to assign the named styles.
+    """
+    sheet = workbook[SHEET_NAME]
+    headers = LedgerReader.read_headers(sheet)
+    receipt_column = headers.index('Receipt no')
+    if named:
+        LedgerStyles.register(workbook)
+        for row in sheet.iter_rows(min_row=2):
+            LedgerStyles.apply_row(row, LedgerStyles.row_style_names(row[receipt_column].value, headers))
+        return
+    fills = {prefix: PatternFill(start_color=color, end_color=color, fill_type="solid")
+             for prefix, (_, color) in LedgerStyles.kinds.items()}
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'),
+                         bottom=Side(style='thin'))
+    for row in sheet.iter_rows(min_row=2):
+        fill = fills.get(str(row[receipt_column].value)[:1], fills[None])
+        for cell, header in zip(row, headers):
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            cell.border = thin_border
+            if header.lower() == 'date':
+                cell.number_format = 'MM/DD/YYYY'
+            elif header.lower() == 'amount':
+                cell.number_format = '0.00'
+            cell.fill = fill
+
+
+def benchmark_ledger(ledger_path: str, work_dir: str, memory: bool = True) -> dict:
+    """
+    Runs the ledger benchmarks on one synthetic ledger, each on a fresh copy.
+
+    Parameters:
+    ledger_path (str): Path of the synthetic ledger.
+    work_dir (str): Directory for the copies.
+    memory (bool): Whether to measure peak memory (default is True).
+
+    Returns:
+    dict: Measurement of each benchmark.
+    """
+    copy_number = [0]
+
+    def fresh_copy() -> str:
+        copy_number[0] += 1
+        copy_path = os.path.join(work_dir, f"ledger_{copy_number[0]}.xlsx")
+        shutil.copyfile(ledger_path, copy_path)
+        return copy_path
+
+    def warm_copy() -> str:
+        copy_path = fresh_copy()
+        ReceiptNumberAllocator(copy_path).next_numbers()
+        return copy_path
+
+    def stream_rows(copy_path: str) -> int:
+        with LedgerReader(copy_path) as reader:
+            return sum(1 for _ in reader.rows())
+
+    def find_newest(copy_path: str) -> int | None:
+        with LedgerReader(copy_path) as reader:
+            return reader.find_row('Receipt no', next(reader.rows(['Receipt no']))[1]['Receipt no'])
+
+    def loaded_copy() -> tuple:
+        copy_path = fresh_copy()
+        return load_workbook(copy_path), copy_path
+
+    def styled_copy(named: bool) -> tuple:
+        workbook, copy_path = loaded_copy()
+        style_ledger(workbook, named)
+        return workbook, copy_path
+
+    def save_styled(named: bool) -> dict:
+        saved_paths = []
+
+        def save(prepared: tuple):
+            prepared[0].save(prepared[1])
+            saved_paths.append(prepared[1])
+        result = measure(save, lambda: styled_copy(named), memory=False)
+        result['bytes'] = os.path.getsize(saved_paths[-1])
+        return result
+
+    def synced_store() -> LedgerStore:
+        store = LedgerStore(fresh_copy())
+        store.refresh()
+        return store
+
+    def processor_for(copy_path: str) -> MissingReceiptProcessor:
+        df = pd.read_excel(copy_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return MissingReceiptProcessor(df, copy_path, work_dir, "http://127.0.0.1/login", "", "")
+
+    def column_letters(copy_path: str) -> tuple:
+        with LedgerReader(copy_path, SHEET_NAME) as reader:
+            return reader.column_letters('Receipt no', 'Attachments')
+
+    def loaded_index() -> tuple:
+        ledger_index = LedgerIndex(fresh_copy(), SHEET_NAME)
+        ledger_index.load()
+        return ledger_index, list(ledger_index.rows)[-NEW_TRANSACTIONS:]
+
+    def mark_uploaded(prepared: tuple):
+        prepared[0].mark_uploaded(prepared[1])
+        prepared[0].save()
+
+    def missing_receipt():
+        copy_path = fresh_copy()
+        return processor_for(copy_path), pd.read_excel(copy_path)['Receipt no'].iloc[-1]
+
+    return {
+        'dataframe_to_excel_process': measure(
+            lambda copy_path: DataFrameToExcel(new_transactions(NEW_TRANSACTIONS), copy_path).process(),
+            fresh_copy, memory),
+        'next_receipt_number_cold': measure(
+            lambda copy_path: UserInput('', copy_path, 1, False, ReceiptNumberAllocator(copy_path))
+            .get_next_receipt_number(), fresh_copy, memory),
+        'next_receipt_number_warm': measure(
+            lambda copy_path: UserInput('', copy_path, 1, False, ReceiptNumberAllocator(copy_path))
+            .get_next_receipt_number(), warm_copy, memory),
+        'ledger_reader_column_letters': measure(column_letters, fresh_copy, memory),
+        'ledger_index_mark_uploaded': measure(mark_uploaded, loaded_index, memory),
+        'insert_into_cell': measure(
+            lambda prepared: prepared[0].insert_into_cell(prepared[1]), missing_receipt, memory),
+        'ledger_reader_scan': measure(stream_rows, fresh_copy, memory),
+        'ledger_reader_find_newest': measure(find_newest, fresh_copy, memory),
+        'style_rows_per_cell': measure(lambda prepared: style_ledger(prepared[0], False), loaded_copy, False),
+        'style_rows_named': measure(lambda prepared: style_ledger(prepared[0], True), loaded_copy, False),
+        'save_styled_per_cell': save_styled(False),
+        'save_styled_named': save_styled(True),
+        'ledger_store_sync': measure(lambda copy_path: LedgerStore(copy_path).refresh(), fresh_copy, memory),
+        'ledger_store_next_numbers': measure(lambda store: store.next_numbers(), synced_store, memory),
+        'ledger_store_find': measure(lambda store: store.find("R1"), synced_store, memory),
+        'ledger_store_not_uploaded': measure(lambda store: store.not_uploaded(), synced_store, memory),
+    }
+
+
+def benchmark_pdfs(pdf_dir: str, memory: bool = True) -> dict:
+    """
+    Runs the PDF benchmarks on a directory of synthetic receipts.
+
+    Parameters:
+    pdf_dir (str): Directory with the synthetic receipt PDFs.
+    memory (bool): Whether to measure peak memory (default is True).
+
+    Returns:
+    dict: Measurement of each benchmark.
+    """
+    pdf_paths = sorted(os.path.join(pdf_dir, filename) for filename in os.listdir(pdf_dir)
+                       if filename.endswith('.pdf'))
+    results = {
+        'pdf_reader': measure(lambda: [PDFReader(pdf_path).text for pdf_path in pdf_paths], memory=memory),
+        'pdf_checker': measure(lambda: PDFChecker(pdf_dir).check_pdfs_exist(), memory=memory),
+    }
+    results['pdf_reader']['per_pdf_ms'] = results['pdf_reader']['seconds'] / max(len(pdf_paths), 1) * 1000
+    return results
+
+
+def scaling_exponent(points: list[dict]) -> float | None:
+    """
+    Estimates how a benchmark's time grows with the ledger size, as the slope on a log-log scale.
+
+    Parameters:
+    points (list[dict]): Measurements with 'rows' and 'seconds', for at least two sizes.
+
+    Returns:
+    float | None: About 0 for constant time, 1 for linear growth; None with fewer than two sizes.
+    """
+    points = [point for point in points if point['seconds'] > 0]
+    if len(points) < 2:
+        return None
+    first, last = min(points, key=lambda point: point['rows']), max(points, key=lambda point: point['rows'])
+    if first['rows'] == last['rows']:
+        return None
+    return math.log(last['seconds'] / first['seconds']) / math.log(last['rows'] / first['rows'])
+
+
+def run_suite(sizes: list[int], pdf_count: int, memory: bool = True, seed: int = 7) -> dict:
+    """
+    Runs every benchmark for every ledger size and on the synthetic PDFs.
+
+    Parameters:
+    sizes (list[int]): Ledger sizes in rows.
+    pdf_count (int): Number of synthetic receipt PDFs.
+    memory (bool): Whether to measure peak memory (default is True).
+    seed (int): Random seed (default is 7).
+
+    Returns:
+    dict: Environment, per-size results, scaling exponents and PDF results.
+    """
+    work_dir = tempfile.mkdtemp(prefix="offline_benchmark_")
+    try:
+        ledger_results = {}
+        for rows in sizes:
+            ledger_path = os.path.join(work_dir, f"synthetic_{rows}.xlsx")
+            generate_ledger(ledger_path, rows, seed)
+            size_dir = os.path.join(work_dir, str(rows))
+            os.makedirs(size_dir)
+            for name, result in benchmark_ledger(ledger_path, size_dir, memory).items():
+                ledger_results.setdefault(name, []).append({'rows': rows, **result})
+            shutil.rmtree(size_dir, ignore_errors=True)
+            print(f"Measured the {rows}-row ledger.")
+        pdf_dir = os.path.join(work_dir, "pdfs")
+        generate_fixtures(pdf_dir, pdf_count, seed)
+        pdf_results = benchmark_pdfs(pdf_dir, memory)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'created': datetime.now().isoformat(timespec='seconds')},
+        'ledger': ledger_results,
+        'scaling': {name: scaling_exponent(points) for name, points in ledger_results.items()},
+        'pdfs': {'count': pdf_count, **pdf_results},
+    }
+
+
+def print_report(results: dict, baseline: dict = None):
+    """
+    Prints the scaling curves and PDF timings, with the change from a baseline if one is given.
+
+    Parameters:
+    results (dict): Results of run_suite.
+    baseline (dict): Earlier results of run_suite to compare with (default is None).
+    """
+    def versus(seconds: float, old: dict | None) -> str:
+        return f" ({seconds / old['seconds']:.2f}x)" if old and old.get('seconds') else ""
+
+    print(f"{'Benchmark':<30}{'Rows':>9}{'Seconds':>11}{'Peak MB':>10}")
+    for name, points in results['ledger'].items():
+        old_points = {point['rows']: point for point in (baseline or {}).get('ledger', {}).get(name, [])}
+        for point in points:
+            peak = f"{point['peak_mb']:.1f}" if point['peak_mb'] is not None else "-"
+            size = f"{point['bytes'] / 2 ** 20:>9.2f} MB file" if 'bytes' in point else ""
+            print(f"{name:<30}{point['rows']:>9}{point['seconds']:>11.4f}{peak:>10}{size}"
+                  f"{versus(point['seconds'], old_points.get(point['rows']))}")
+        exponent = results['scaling'][name]
+        if exponent is not None:
+            print(f"{'':<30}{'scaling':>9}{f'n^{exponent:.2f}':>11}")
+    for name in ('pdf_reader', 'pdf_checker'):
+        point = results['pdfs'][name]
+        old_pdfs = (baseline or {}).get('pdfs', {})
+        old = old_pdfs.get(name) if old_pdfs.get('count') == results['pdfs']['count'] else None
+        peak = f"{point['peak_mb']:.1f}" if point['peak_mb'] is not None else "-"
+        print(f"{name:<30}{results['pdfs']['count']:>9}{point['seconds']:>11.4f}{peak:>10}"
+              f"{versus(point['seconds'], old)}")
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark suite.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default="1000,10000,100000", help="Comma-separated ledger sizes in rows.")
+    parser.add_argument('--pdfs', type=int, default=50, help="Number of synthetic receipt PDFs.")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the peak memory measurements.")
+    parser.add_argument('--seed', type=int, default=7, help="Random seed of the synthetic data.")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare with.")
+    parser.add_argument('--output', help="JSON file to write the results to, e.g. as a new baseline.")
+    args = parser.parse_args()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    results = run_suite([int(size) for size in args.sizes.split(',')], args.pdfs, not args.no_memory, args.seed)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Module to cache extracted PDF text and previews on disk, keyed by file content.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pdf_extraction_pool import PDFExtraction, extract_pdf
+
+
+class PDFCache:
+    """
+    This class stores PDF extraction results in a SQLite database keyed by the SHA-256 of the file content.
+
+    The cache is bounded by the total size of the stored text and previews; the least recently used
+    entries are evicted first. A second table remembers the hash of each path for its modification time
+    and size, so unchanged files are not even re-hashed; prune drops the paths that no longer exist.
+    """
+
+    default_path = os.path.join(os.path.expanduser('~'), '.hsa_automator', 'pdf_cache.sqlite')
+
+    def __init__(self, cache_path: str = None, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Initializes the PDFCache instance.
+
+        Parameters:
+        cache_path (str): Path to the SQLite database (default is ~/.hsa_automator/pdf_cache.sqlite).
+        max_bytes (int): Maximum total size of the cached entries (default is 256 MB).
+        """
+        self.cache_path = cache_path or self.default_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        """
+        Creates the cache tables if they do not exist yet.
+        """
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                "content_hash TEXT PRIMARY KEY, text TEXT, page_count INTEGER, preview BLOB, "
+                "size INTEGER, last_used REAL)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions (last_used)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, content_hash TEXT)")
+
+    @staticmethod
+    def hash_bytes(file_path: str) -> str:
+        """
+        Computes the SHA-256 of a file's content.
+
+        Parameters:
+        file_path (str): Path to the file.
+
+        Returns:
+        str: Hex digest of the file content.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def hash_file(self, file_path: str) -> str:
+        """
+        Gets the content hash of a file, reusing the stored hash if the file has not changed.
+
+        Parameters:
+        file_path (str): Path to the file.
+
+        Returns:
+        str: Hex digest of the file content.
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT content_hash FROM file_hashes WHERE path = ? AND mtime_ns = ? AND size = ?",
+                (path, stat.st_mtime_ns, stat.st_size)).fetchone()
+        if row:
+            return row[0]
+        content_hash = self.hash_bytes(path)
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO file_hashes (path, mtime_ns, size, content_hash) VALUES (?, ?, ?, ?)",
+                (path, stat.st_mtime_ns, stat.st_size, content_hash))
+        return content_hash
+
+    def get(self, file_path: str) -> PDFExtraction | None:
+        """
+        Looks up the cached extraction of a PDF file.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+
+        Returns:
+        PDFExtraction | None: Cached extraction, or None if the content has not been extracted before.
+        """
+        content_hash = self.hash_file(file_path)
+        with self._lock, self.connection:
+            row = self.connection.execute(
+                "SELECT text, page_count, preview FROM extractions WHERE content_hash = ?",
+                (content_hash,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute(
+                "UPDATE extractions SET last_used = ? WHERE content_hash = ?", (time.time(), content_hash))
+        text, page_count, preview = row
+        return PDFExtraction(file_path, text, page_count, preview)
+
+    def put(self, extraction: PDFExtraction):
+        """
+        Stores an extraction and evicts the least recently used entries beyond the size bound.
+
+        Parameters:
+        extraction (PDFExtraction): Extraction to store. Failed extractions are not cached.
+        """
+        if extraction.error is not None:
+            return
+        content_hash = self.hash_file(extraction.file_path)
+        preview = extraction.preview_png or b''
+        size = len(extraction.text.encode('utf-8')) + len(preview)
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO extractions (content_hash, text, page_count, preview, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, extraction.text, extraction.page_count, extraction.preview_png, size, time.time()))
+            self._evict()
+
+    def get_or_extract(self, file_path: str) -> PDFExtraction:
+        """
+        Gets the cached extraction of a PDF file, extracting and storing it on a miss.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+
+        Returns:
+        PDFExtraction: Extraction of the PDF file.
+        """
+        extraction = self.get(file_path)
+        if extraction is None:
+            extraction = extract_pdf(file_path)
+            self.put(extraction)
+        return extraction
+
+    def prune(self) -> int:
+        """
+        Forgets the stored hashes of files that were deleted or moved, so the path table does not grow
+        without bound. The extractions themselves stay until they are evicted, as the content may come back
+        under another path.
+
+        Returns:
+        int: Number of paths forgotten.
+        """
+        with self._lock:
+            paths = [row[0] for row in self.connection.execute("SELECT path FROM file_hashes").fetchall()]
+        missing = [(path,) for path in paths if not os.path.exists(path)]
+        if missing:
+            with self._lock, self.connection:
+                self.connection.executemany("DELETE FROM file_hashes WHERE path = ?", missing)
+        return len(missing)
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes.
+        """
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for content_hash, size in self.connection.execute(
+                "SELECT content_hash, size FROM extractions ORDER BY last_used").fetchall():
+            self.connection.execute("DELETE FROM extractions WHERE content_hash = ?", (content_hash,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
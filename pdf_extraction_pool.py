@@ -0,0 +1,205 @@
+"""
+Module to extract text and previews from PDF files in parallel.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pdf_reader import PDFReader
+
+
+class PDFExtraction:
+    """
+    This class holds the text, page count and first-page preview extracted from a PDF file.
+    """
+
+    def __init__(self, file_path: str, text: str = "", page_count: int = 0, preview_png: bytes = None,
+                 error: str = None):
+        """
+        Initializes the PDFExtraction instance.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+        text (str): Extracted text.
+        page_count (int): Number of pages in the PDF file.
+        preview_png (bytes): PNG render of the first page.
+        error (str): Error message if the PDF file could not be read.
+        """
+        self.file_path = file_path
+        self.text = text
+        self.page_count = page_count
+        self.preview_png = preview_png
+        self.error = error
+
+
+def extract_pdf(file_path: str) -> PDFExtraction:
+    """
+    Extracts the text and renders the first page of a PDF file.
+
+    Parameters:
+    file_path (str): Path to the PDF file.
+
+    Returns:
+    PDFExtraction: Extraction result, with the error set if the file could not be read.
+    """
+    try:
+        pdf_reader = PDFReader(file_path, preview=True)
+        return PDFExtraction(file_path, pdf_reader.text, pdf_reader.page_count, pdf_reader.preview_png)
+    except Exception as error:
+        return PDFExtraction(file_path, error=str(error))
+
+
+class PDFExtractionPool:
+    """
+    This class fans PDF extraction out over a process pool and prefetches documents ahead of the user.
+    """
+
+    def __init__(self, max_workers: int = None, lookahead: int = 2, cache=None):
+        """
+        Initializes the PDFExtractionPool instance.
+
+        Parameters:
+        max_workers (int): Number of worker processes (default is the number of CPUs).
+        lookahead (int): Number of documents to extract ahead of the one being consumed (default is 2).
+        cache (PDFCache): Cache consulted before extracting and filled with new results (default is None).
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.lookahead = lookahead
+        self.cache = cache
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """
+        Starts the worker processes the first time they are needed.
+
+        Returns:
+        ProcessPoolExecutor: Executor running the extraction.
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def _get_cached(self, file_path: str) -> PDFExtraction | None:
+        """
+        Looks up a PDF file in the cache, if there is one.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+
+        Returns:
+        PDFExtraction | None: Cached extraction, or None on a miss.
+        """
+        return self.cache.get(file_path) if self.cache is not None else None
+
+    def _store(self, extraction: PDFExtraction) -> PDFExtraction:
+        """
+        Stores a fresh extraction in the cache, if there is one.
+
+        Parameters:
+        extraction (PDFExtraction): Extraction to store.
+
+        Returns:
+        PDFExtraction: The same extraction.
+        """
+        if self.cache is not None:
+            self.cache.put(extraction)
+        return extraction
+
+    def _submit(self, file_path: str) -> tuple[Future, bool]:
+        """
+        Starts the extraction of a PDF file unless it is already cached.
+
+        Parameters:
+        file_path (str): Path to the PDF file.
+
+        Returns:
+        tuple[Future, bool]: Future resolving to the extraction result, and whether it is a fresh extraction.
+        """
+        cached = self._get_cached(file_path)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future, False
+        return self._get_executor().submit(extract_pdf, file_path), True
+
+    @staticmethod
+    def list_pdf_files(directory_path: str) -> list[str]:
+        """
+        Lists the PDF files of a directory in folder order.
+
+        Parameters:
+        directory_path (str): Directory containing the PDF files.
+
+        Returns:
+        list[str]: Paths of the PDF files.
+        """
+        return [os.path.join(directory_path, f) for f in os.listdir(directory_path) if f.lower().endswith('.pdf')]
+
+    def extract_all(self, file_paths: list[str]) -> list[PDFExtraction]:
+        """
+        Extracts all PDF files in parallel.
+
+        Parameters:
+        file_paths (list[str]): Paths of the PDF files.
+
+        Returns:
+        list[PDFExtraction]: Extraction results in the order of the given paths.
+        """
+        results = [self._get_cached(file_path) for file_path in file_paths]
+        missing = [file_path for file_path, result in zip(file_paths, results) if result is None]
+        if missing:
+            chunksize = max(1, len(missing) // (self.max_workers * 4))
+            extracted = iter(self._get_executor().map(extract_pdf, missing, chunksize=chunksize))
+            results = [result if result is not None else self._store(next(extracted)) for result in results]
+        return results
+
+    def extract_folder(self, directory_path: str) -> list[PDFExtraction]:
+        """
+        Extracts every PDF file of a directory in parallel.
+
+        Parameters:
+        directory_path (str): Directory containing the PDF files.
+
+        Returns:
+        list[PDFExtraction]: Extraction results in folder order.
+        """
+        return self.extract_all(self.list_pdf_files(directory_path))
+
+    def prefetch(self, file_paths: list[str]):
+        """
+        Yields extraction results in order while the next documents are extracted in the background.
+
+        Parameters:
+        file_paths (list[str]): Paths of the PDF files.
+
+        Yields:
+        PDFExtraction: Extraction result for each path, in order.
+        """
+        paths = iter(file_paths)
+        in_flight = deque()
+        for file_path in paths:
+            in_flight.append(self._submit(file_path))
+            if len(in_flight) > self.lookahead:
+                break
+        while in_flight:
+            future, is_fresh = in_flight.popleft()
+            result = self._store(future.result()) if is_fresh else future.result()
+            next_path = next(paths, None)
+            if next_path is not None:
+                in_flight.append(self._submit(next_path))
+            yield result
+
+    def shutdown(self):
+        """
+        Stops the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
@@ -10,26 +10,49 @@ class PDFReader:
     This class reads the text from a PDF file.
     """
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, preview: bool = False):
         """
         Initializes the PDFReader instance.
 
         Parameters:
         file_path (str): Path to the PDF file.
+        preview (bool): Whether to also render the first page, while the file is open (default is False).
         """
         self.file_path = file_path
-        self.text = self._read_pdf()
+        self.page_count = 0
+        self.preview_png = None
+        self.text = self._read_pdf(preview)
 
-    def _read_pdf(self) -> str:
+    def _read_pdf(self, preview: bool = False) -> str:
         """
-        Reads and extracts text from the PDF file.
+        Reads and extracts text from the PDF file, rendering the first page as well if asked.
+
+        Parameters:
+        preview (bool): Whether to render the first page into preview_png (default is False).
 
         Returns:
         str: Extracted text from the PDF file.
         """
-        pdf_document = fitz.open(self.file_path)
-        text = ""
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document.load_page(page_num)
-            text += page.get_text("text")
+        with fitz.open(self.file_path) as pdf_document:
+            self.page_count = pdf_document.page_count
+            text = ""
+            for page_num in range(pdf_document.page_count):
+                page = pdf_document.load_page(page_num)
+                text += page.get_text("text")
+            if preview and pdf_document.page_count:
+                self.preview_png = pdf_document.load_page(0).get_pixmap().tobytes("png")
         return text
+
+    def render_page_png(self, page_number: int = 0) -> bytes:
+        """
+        Renders a page of the PDF file as a PNG image.
+
+        Parameters:
+        page_number (int): Page number to render (default is 0).
+
+        Returns:
+        bytes: PNG image data.
+        """
+        with fitz.open(self.file_path) as pdf_document:
+            page = pdf_document.load_page(page_number)
+            return page.get_pixmap().tobytes("png")
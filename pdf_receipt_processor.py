@@ -2,13 +2,21 @@
 Module to process PDF receipts.
 """
 
+import io
 import os
 import pandas as pd
 from PIL import Image
 import matplotlib.pyplot as plt
 from pdf_reader import PDFReader
 from user_input import UserInput
-from dataframe_to_excel import DataFrameToExcel
+from ledger_batch_writer import LedgerBatchWriter
+from pdf_extraction_pool import PDFExtraction, PDFExtractionPool
+from pdf_cache import PDFCache
+from receipt_field_extractor import ReceiptFieldExtractor
+from receipt_pipeline import ReceiptPipeline
+from duplicate_index import DuplicateIndex
+from receipt_journal import ReceiptJournal
+from instrumentation import instrumentation
 import fitz
 
 
@@ -17,18 +25,36 @@ class PDFReceiptProcessor:
     This class processes PDF receipts, extracts relevant data, and renames the PDFs.
     """
 
-    def __init__(self, directory_path: str, transaction_directory: str):
+    def __init__(self, directory_path: str, transaction_directory: str, ledger_writer: LedgerBatchWriter = None,
+                 extraction_pool: PDFExtractionPool = None, pdf_cache: PDFCache = None,
+                 duplicate_index: DuplicateIndex = None, journal: ReceiptJournal = None):
         """
         Initializes the PDFReceiptProcessor instance.
 
         Parameters:
         directory_path (str): Directory containing the PDF receipts.
         transaction_directory (str): Directory containing the transaction Excel file.
+        ledger_writer (LedgerBatchWriter): Session writer collecting the ledger rows (default is None,
+                                           which commits the processed receipts when renaming is done).
+        extraction_pool (PDFExtractionPool): Pool prefetching the PDFs while the user enters receipts
+                                             (default is None, which uses a pool for the duration of renaming).
+        pdf_cache (PDFCache): Cache of extracted text and previews (default is None, which opens the default cache).
+        duplicate_index (DuplicateIndex): Index of the known receipts and ledger rows (default is None, which
+                                          builds one for the directory when renaming starts).
+        journal (ReceiptJournal): Journal of each receipt's stages (default is None, which uses the one shared
+                                  for the transaction Excel file).
         """
         self.directory_path = directory_path
         self.data = []
         self.transaction_directory = transaction_directory
         self.receipt_count = 0
+        self.ledger_writer = ledger_writer
+        self.extraction_pool = extraction_pool
+        self.pdf_cache = pdf_cache or PDFCache()
+        self.field_extractor = None
+        self.duplicate_index = duplicate_index
+        self.journal = journal or ReceiptJournal.for_workbook(transaction_directory)
+        self.pending_paths = set()
 
     @staticmethod
     def display_pdf_page(file_to_open: str, page_number: int = 0):
@@ -48,21 +74,104 @@ class PDFReceiptProcessor:
         ax.axis('off')
         plt.show(block=False)
 
-    def display_pdf_info(self, file_path: str, filename: str):
+    @staticmethod
+    def display_pdf_image(preview_png: bytes):
+        """
+        Displays an already rendered PDF page.
+
+        Parameters:
+        preview_png (bytes): PNG image data of the page.
+        """
+        image = Image.open(io.BytesIO(preview_png)).convert("RGB")
+        fig, ax = plt.subplots(figsize=(image.width / 100, image.height / 100), dpi=250)
+        ax.imshow(image)
+        ax.axis('off')
+        plt.show(block=False)
+
+    def get_field_extractor(self) -> ReceiptFieldExtractor:
+        """
+        Gets the field extractor, learning the providers from the transaction Excel file the first time.
+
+        Returns:
+        ReceiptFieldExtractor: Extractor proposing the receipt fields.
+        """
+        if self.field_extractor is None:
+            self.field_extractor = ReceiptFieldExtractor.from_ledger(self.transaction_directory)
+        return self.field_extractor
+
+    def display_pdf_info(self, file_path: str, filename: str, extraction: PDFExtraction = None) -> dict:
         """
         Displays information extracted from a PDF file.
 
         Parameters:
         file_path (str): Path to the PDF file.
         filename (str): Name of the PDF file.
+        extraction (PDFExtraction): Prefetched text and preview of the PDF file (default is None,
+                                    which looks the file up in the cache).
+
+        Returns:
+        dict: Proposed 'Date', 'Provider' and 'Amount' values for the receipt.
         """
-        pdf_reader = PDFReader(file_path)
-        self.display_pdf_page(file_path)
+        if extraction is None:
+            extraction = self.pdf_cache.get_or_extract(file_path)
+        if extraction.error is None:
+            text = extraction.text
+            if extraction.preview_png:
+                self.display_pdf_image(extraction.preview_png)
+        else:
+            text = PDFReader(file_path).text
+            self.display_pdf_page(file_path)
         print(f"Filename: {filename}")
         print("\nExtracted Text:\n")
-        print(pdf_reader.text)
+        print(text)
         print("\nExtracted Information:\n")
+        proposals = self.get_field_extractor().extract(text)
+        for field, proposal in proposals.items():
+            if proposal is not None:
+                print(f"{field}: {proposal.value} ({proposal.confidence:.0%})")
         print("\n" + "-" * 80 + "\n")
+        return proposals
+
+    def get_duplicate_index(self) -> DuplicateIndex:
+        """
+        Gets the duplicate index, building it from the directory, its Receipts archive and the ledger the first time.
+
+        Returns:
+        DuplicateIndex: Index of the known receipts and ledger rows.
+        """
+        if self.duplicate_index is None:
+            self.duplicate_index = DuplicateIndex.for_inbox(self.directory_path, self.transaction_directory,
+                                                            self.pdf_cache, self.get_field_extractor())
+        return self.duplicate_index
+
+    def confirm_duplicate(self, filename: str, file_path: str, extraction: PDFExtraction) -> bool:
+        """
+        Warns about a receipt that duplicates a known receipt or ledger row and asks whether to process it anyway.
+
+        Parameters:
+        filename (str): Name of the PDF file.
+        file_path (str): Path to the PDF file.
+        extraction (PDFExtraction): Extracted text and preview of the PDF file.
+
+        Returns:
+        bool: True if the receipt is processed, False if it is skipped.
+        """
+        # Copies still waiting in the inbox are not reported, so only the later one of two copies is flagged
+        duplicates = self.get_duplicate_index().check(file_path, extraction, ignore=self.pending_paths)
+        if not duplicates:
+            return True
+        if DuplicateIndex.awaited(duplicates):
+            print(f"'{filename}' looks like the receipt of a ledger row still waiting for one:\n"
+                  f"{DuplicateIndex.describe(duplicates)}\nAttach it through the missing receipts flow instead.")
+        else:
+            print(f"'{filename}' looks like a duplicate of:\n{DuplicateIndex.describe(duplicates)}")
+        while True:
+            choice = input("Process it anyway? Enter 1 for Yes, 0 to skip it: ").strip()
+            if choice in ('0', '1'):
+                if choice == '0':
+                    print(f"Skipped '{filename}'\n")
+                return choice == '1'
+            print("Invalid input. Please enter 1 for Yes or 0 for No.")
 
     def rename_pdfs(self):
         """
@@ -73,30 +182,106 @@ class PDFReceiptProcessor:
             print("No PDF files found in the directory.")
             return
 
-        for filename in pdf_files:
-            self.receipt_count += 1
-            file_path = os.path.join(self.directory_path, filename)
-            self.display_pdf_info(file_path, filename)
-            user_input = UserInput(filename, self.transaction_directory, self.receipt_count, True)
-            user_in = user_input.get_user_inputs()
-            self.data = user_in
+        extraction_pool = self.extraction_pool or PDFExtractionPool(cache=self.pdf_cache)
+        self.get_duplicate_index()
+        try:
+            if self.ledger_writer is None:
+                with LedgerBatchWriter(self.transaction_directory, self.journal) as ledger_writer:
+                    self._rename_pdf_files(pdf_files, ledger_writer, extraction_pool)
+            else:
+                self._rename_pdf_files(pdf_files, self.ledger_writer, extraction_pool)
+        finally:
+            if self.extraction_pool is None:
+                extraction_pool.shutdown()
+
+    def _rename_pdf_files(self, pdf_files: list[str], ledger_writer: LedgerBatchWriter,
+                          extraction_pool: PDFExtractionPool):
+        """
+        Prompts for, renames and queues the ledger rows of the given PDF files.
+
+        Parameters:
+        pdf_files (list[str]): Names of the PDF files to process.
+        ledger_writer (LedgerBatchWriter): Session writer collecting the ledger rows.
+        extraction_pool (PDFExtractionPool): Pool prefetching the next PDFs while the user types.
+        """
+        file_paths = [os.path.join(self.directory_path, filename) for filename in pdf_files]
+        self.pending_paths = set(file_paths)
+        extractions = extraction_pool.prefetch(file_paths)
+        for filename, file_path in zip(pdf_files, file_paths):
+            with instrumentation.span('pdf.extract', file=filename):
+                extraction = next(extractions)
+            user_in = self.prompt_receipt(filename, file_path, extraction)
+            if user_in is None:
+                continue
             receipt_number = user_in['Receipt Number']
             new_name = f"{receipt_number}_{user_in['Amount']}"
             if new_name:
                 new_file_path = os.path.join(self.directory_path, new_name + '.pdf')
-                os.rename(file_path, new_file_path)
+                self.journal.begin(user_in, filename)
+                with instrumentation.span('pdf.rename', file=filename):
+                    os.rename(file_path, new_file_path)
+                self.journal.record(receipt_number, 'renamed')
+                self.duplicate_index.move_file(file_path, new_file_path)
                 print(f"Renamed '{filename}' to '{new_name}.pdf'\n")
             else:
                 print(f"Skipped renaming '{filename}'\n")
-            df = self.to_dataframe()
-            processor = DataFrameToExcel(df, self.transaction_directory)
-            processor.process()
+            ledger_writer.add_transaction(user_in)
+            self.data.append(user_in)
+
+    def prompt_receipt(self, filename: str, file_path: str, extraction: PDFExtraction) -> dict:
+        """
+        Shows a receipt and prompts for its details, proposing the fields extracted from it.
+
+        Parameters:
+        filename (str): Name of the PDF file.
+        file_path (str): Path to the PDF file.
+        extraction (PDFExtraction): Extracted text and preview of the PDF file.
+
+        Returns:
+        dict | None: Transaction details entered by the user, or None if the user skipped a duplicate.
+        """
+        self.pending_paths.discard(file_path)
+        if not self.confirm_duplicate(filename, file_path, extraction):
+            return None
+        self.receipt_count += 1
+        with instrumentation.span('pdf.display', file=filename):
+            proposals = self.display_pdf_info(file_path, filename, extraction)
+        user_input = UserInput(filename, self.transaction_directory, self.receipt_count, True)
+        with instrumentation.span('pdf.user_input', file=filename):
+            user_in = user_input.get_user_inputs(proposals)
+        if extraction.error is None:
+            self.get_field_extractor().learn_alias(extraction.text, user_in['Provider'])
+        self.get_duplicate_index().add_transaction(user_in['Date'], user_in['Amount'], user_in['Provider'],
+                                                   user_in['Receipt Number'])
+        return user_in
+
+    def rename_and_submit_pdfs(self, backend) -> list[dict]:
+        """
+        Prompts for and renames the receipts while the ones already entered are written to the ledger
+        and submitted in the background.
+
+        Parameters:
+        backend (SubmissionBackend): Backend submitting the purchases and receipts.
+
+        Returns:
+        list[dict]: Outcome of each receipt, see ReceiptPipeline.run.
+        """
+        pdf_files = [f for f in os.listdir(self.directory_path) if f.lower().endswith('.pdf')]
+        if not pdf_files:
+            print("No PDF files found in the directory.")
+            return []
+        self.get_duplicate_index()
+        self.pending_paths = {os.path.join(self.directory_path, filename) for filename in pdf_files}
+        pipeline = ReceiptPipeline(self.directory_path, self.transaction_directory, self.prompt_receipt, backend,
+                                   pdf_cache=self.pdf_cache, extraction_pool=self.extraction_pool,
+                                   on_rename=self.duplicate_index.move_file, journal=self.journal)
+        return pipeline.run(pdf_files)
 
     def to_dataframe(self) -> pd.DataFrame:
         """
         Converts the extracted data to a DataFrame.
 
         Returns:
-        pd.DataFrame: DataFrame containing the extracted data.
+        pd.DataFrame: DataFrame containing the extracted data, one row per renamed receipt.
         """
-        return pd.DataFrame(self.data, index=[0])
+        return pd.DataFrame(self.data)
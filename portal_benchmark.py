@@ -0,0 +1,203 @@
+"""
+Benchmark for submitting purchases and uploading receipts against the local mock portal.
+
+Usage:
+    python portal_benchmark.py --backend http --sizes 10,50,200
+    python portal_benchmark.py --backend selenium --sizes 5,20 --latency 0.2 --failure-rate 0.05
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from browser_setup import BrowserSetup
+from mock_portal import MockPortal
+from portal_session_store import PortalSessionStore
+from submission_backend import HTTPSubmissionBackend, SeleniumSubmissionBackend
+
+CATEGORIES = ['Prescriptions', 'Doctor', 'Dental', 'Lab / Tests', 'Vision']
+
+
+def make_batch(directory: str, size: int) -> pd.DataFrame:
+    """
+    Writes placeholder receipt PDFs and builds the transactions for them.
+
+    Parameters:
+    directory (str): Directory to write the receipts to.
+    size (int): Number of transactions.
+
+    Returns:
+    pd.DataFrame: Transactions, in the form of the ledger rows.
+    """
+    rows = []
+    for number in range(1, size + 1):
+        amount = f"{10 + number % 90}.{number % 100:02d}"
+        new_filename = f"R{number}_{amount}"
+        with open(os.path.join(directory, new_filename + '.pdf'), 'wb') as receipt_file:
+            receipt_file.write(b"%PDF-1.4\n% benchmark receipt\n" + bytes(2048))
+        rows.append({
+            'Date': f"03/{number % 28 + 1:02d}/2024",
+            'Provider': "CVS Pharmacy",
+            'Amount': amount,
+            'Type': "Medical",
+            'Category': CATEGORIES[number % len(CATEGORIES)],
+            'Payment Method': "HSA Account" if number % 2 else "Credit",
+            'New Filename': new_filename,
+            'In HSA?': "Y"
+        })
+    return pd.DataFrame(rows)
+
+
+def step_stats(seconds: list[float], failures: int) -> dict:
+    """
+    Summarizes the latencies of one step.
+
+    Parameters:
+    seconds (list[float]): Duration of every attempt of the step.
+    failures (int): Number of failed attempts.
+
+    Returns:
+    dict: Count, failure rate and p50/p95/max latency in seconds.
+    """
+    if not seconds:
+        return {'count': 0, 'failure_rate': None, 'p50': None, 'p95': None, 'max': None}
+    return {
+        'count': len(seconds),
+        'failure_rate': failures / len(seconds),
+        'p50': float(np.percentile(seconds, 50)),
+        'p95': float(np.percentile(seconds, 95)),
+        'max': max(seconds),
+    }
+
+
+def run_batch(backend_name: str, size: int, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0,
+              seed: int = 7, headless: bool = True) -> dict:
+    """
+    Submits one batch of transactions to a fresh mock portal and times every step.
+
+    Parameters:
+    backend_name (str): 'selenium' or 'http'.
+    size (int): Number of transactions.
+    latency (float): Seconds every portal response is delayed by (default is 0.0).
+    jitter (float): Most seconds added at random to the latency (default is 0.0).
+    failure_rate (float): Share of portal submissions that fail (default is 0.0).
+    seed (int): Seed of the portal's random jitter and failures (default is 7).
+    headless (bool): Whether to run Chrome without a window for the Selenium backend (default is True).
+
+    Returns:
+    dict: Throughput, per-step latencies and failure rates of the batch.
+    """
+    work_dir = tempfile.mkdtemp(prefix="portal_benchmark_")
+    try:
+        destination_directory = os.path.join(work_dir, "Receipts")
+        os.makedirs(destination_directory)
+        df = make_batch(work_dir, size)
+        # A store of its own, so every batch pays for its login
+        session_store = PortalSessionStore(os.path.join(work_dir, "session.json"))
+        with MockPortal(latency=latency, jitter=jitter, failure_rate=failure_rate, seed=seed) as portal:
+            if backend_name == 'http':
+                backend = HTTPSubmissionBackend(portal.login_url, portal.email, portal.password,
+                                                session_store=session_store)
+            else:
+                browser = BrowserSetup(portal.login_url, portal.email, portal.password, headless=headless,
+                                       session_store=session_store)
+                backend = SeleniumSubmissionBackend(portal.login_url, portal.email, portal.password,
+                                                    headless=headless, browser=browser)
+            timings = {'login': [], 'create_purchase': [], 'upload_receipt': []}
+            failures = {step: 0 for step in timings}
+            with backend:
+                start = time.perf_counter()
+                step_start = time.perf_counter()
+                try:
+                    backend.login()
+                except Exception:
+                    failures['login'] += 1
+                timings['login'].append(time.perf_counter() - step_start)
+
+                created = []
+                for index, row in df.iterrows():
+                    step_start = time.perf_counter()
+                    try:
+                        backend.create_purchase(row)
+                        created.append(row)
+                    except Exception:
+                        failures['create_purchase'] += 1
+                    timings['create_purchase'].append(time.perf_counter() - step_start)
+
+                uploaded = 0
+                for row in created:
+                    step_start = time.perf_counter()
+                    try:
+                        if backend.upload_receipt(row, work_dir, destination_directory):
+                            uploaded += 1
+                        else:
+                            failures['upload_receipt'] += 1
+                    except Exception:
+                        failures['upload_receipt'] += 1
+                    timings['upload_receipt'].append(time.perf_counter() - step_start)
+                total_seconds = time.perf_counter() - start
+            request_counts = dict(portal.request_counts)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'backend': backend_name,
+        'batch_size': size,
+        'seconds': total_seconds,
+        'receipts_uploaded': uploaded,
+        'receipts_per_minute': uploaded / total_seconds * 60 if total_seconds else None,
+        'end_to_end_failure_rate': 1 - uploaded / size if size else None,
+        'steps': {step: step_stats(timings[step], failures[step]) for step in timings},
+        'portal_requests': request_counts,
+    }
+
+
+def print_report(results: list[dict]):
+    """
+    Prints the throughput and step latencies of every batch.
+
+    Parameters:
+    results (list[dict]): Results of run_batch.
+    """
+    print(f"{'Backend':<10}{'Batch':>7}{'Receipts/min':>14}{'Failed':>8}  "
+          f"{'Step':<16}{'p50 ms':>9}{'p95 ms':>9}{'Fail %':>8}")
+    for result in results:
+        first = True
+        for step, stats in result['steps'].items():
+            if stats['count'] == 0:
+                continue
+            prefix = (f"{result['backend']:<10}{result['batch_size']:>7}{result['receipts_per_minute']:>14.1f}"
+                      f"{result['end_to_end_failure_rate']:>8.1%}  " if first else " " * 41)
+            print(f"{prefix}{step:<16}{stats['p50'] * 1000:>9.1f}{stats['p95'] * 1000:>9.1f}"
+                  f"{stats['failure_rate']:>8.1%}")
+            first = False
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark for every batch size.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='http', help="Submission backend.")
+    parser.add_argument('--sizes', default="10,50,200", help="Comma-separated batch sizes.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds every portal response is delayed by.")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Most seconds added at random to the latency.")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of portal submissions that fail.")
+    parser.add_argument('--seed', type=int, default=7, help="Seed of the random jitter and failures.")
+    parser.add_argument('--show-browser', action='store_true', help="Run Chrome with a window.")
+    parser.add_argument('--output', help="JSON file to write the results to.")
+    args = parser.parse_args()
+    results = [run_batch(args.backend, int(size), args.latency, args.jitter, args.failure_rate, args.seed,
+                         not args.show_browser) for size in args.sizes.split(',')]
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
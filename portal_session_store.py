@@ -0,0 +1,118 @@
+"""
+Module to persist authenticated portal sessions between runs.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class PortalSessionStore:
+    """
+    This class saves the portal's session cookies and post-login landing page after a login, so a later
+    run can restore them and skip the login while the portal still accepts them.
+
+    Sessions are kept per login URL and email address in one JSON file, readable only by the user.
+    """
+
+    default_path = os.path.join(os.path.expanduser("~"), ".hsa_automator", "portal_session.json")
+
+    def __init__(self, session_path: str = None, max_age: float = 12 * 60 * 60):
+        """
+        Initializes the PortalSessionStore instance.
+
+        Parameters:
+        session_path (str): Path to the session file (default is None, which uses default_path).
+        max_age (float): Seconds after which a saved session is not tried anymore (default is 12 hours).
+        """
+        self.session_path = session_path or self.default_path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(url: str, email: str) -> str:
+        """
+        Builds the key of a session in the session file.
+
+        Parameters:
+        url (str): URL of the login page.
+        email (str): User's email address.
+
+        Returns:
+        str: Session key.
+        """
+        return f"{email} {url}"
+
+    def _read(self) -> dict:
+        """
+        Reads every saved session.
+
+        Returns:
+        dict: Sessions by key, empty if the file is missing or unreadable.
+        """
+        try:
+            with open(self.session_path, 'r', encoding='utf-8') as session_file:
+                return json.load(session_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, sessions: dict):
+        """
+        Replaces the session file atomically.
+
+        Parameters:
+        sessions (dict): Sessions by key.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.session_path)), exist_ok=True)
+        temporary_path = f"{self.session_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w',
+                  encoding='utf-8') as session_file:
+            json.dump(sessions, session_file)
+        os.replace(temporary_path, self.session_path)
+
+    def load(self, url: str, email: str) -> dict | None:
+        """
+        Gets the saved session of a user.
+
+        Parameters:
+        url (str): URL of the login page.
+        email (str): User's email address.
+
+        Returns:
+        dict | None: 'cookies' and 'landing_url' of the session, or None if there is none recent enough.
+        """
+        with self.lock:
+            session = self._read().get(self._key(url, email))
+        if session is None or time.time() - session.get('saved_at', 0) > self.max_age:
+            return None
+        return session
+
+    def save(self, url: str, email: str, cookies: list[dict], landing_url: str):
+        """
+        Saves the session of a user after a login.
+
+        Parameters:
+        url (str): URL of the login page.
+        email (str): User's email address.
+        cookies (list[dict]): Cookies with 'name', 'value', 'domain', 'path', 'secure' and optionally 'expiry'.
+        landing_url (str): Page the portal showed after the login, used to probe the session.
+        """
+        with self.lock:
+            sessions = self._read()
+            sessions[self._key(url, email)] = {'cookies': cookies, 'landing_url': landing_url,
+                                               'saved_at': time.time()}
+            self._write(sessions)
+
+    def clear(self, url: str, email: str):
+        """
+        Forgets the session of a user, e.g. once the portal has rejected it.
+
+        Parameters:
+        url (str): URL of the login page.
+        email (str): User's email address.
+        """
+        with self.lock:
+            sessions = self._read()
+            if sessions.pop(self._key(url, email), None) is not None:
+                self._write(sessions)
@@ -0,0 +1,124 @@
+"""
+Module to wait for portal page states with explicit conditions and record how long each wait took.
+"""
+
+import time
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from instrumentation import instrumentation
+
+
+class PortalWaits:
+    """
+    This class waits for each portal page state (login form, purchase form, listing, edit page) with an
+    explicit condition and a per-state timeout, instead of fixed sleeps, and records every wait's duration.
+    """
+
+    # States reached by loading a new page, counted as page navigations
+    page_states = ('login_form', 'listing', 'edit_page', 'navigation')
+
+    default_timeouts = {
+        'login_form': 20,
+        'purchase_form': 15,
+        'listing': 15,
+        'edit_page': 15,
+        'navigation': 15
+    }
+
+    def __init__(self, browser, timeouts: dict = None):
+        """
+        Initializes the PortalWaits instance.
+
+        Parameters:
+        browser (BrowserSetup): Instance of the BrowserSetup class whose driver is waited on.
+        timeouts (dict): Timeouts in seconds per state, overriding default_timeouts (default is None).
+        """
+        self.browser = browser
+        self.timeouts = {**self.default_timeouts, **(timeouts or {})}
+        self.durations = []
+
+    def wait_for(self, state: str, condition):
+        """
+        Waits until a condition holds, recording how long it took.
+
+        Parameters:
+        state (str): Name of the page state, used for the timeout and the recorded duration.
+        condition (callable): Condition taking the driver, as used by WebDriverWait.
+
+        Returns:
+        The condition's first truthy result.
+
+        Raises:
+        TimeoutException: If the condition does not hold within the state's timeout.
+        """
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            result = WebDriverWait(self.browser.driver, self.timeouts[state]).until(condition)
+            succeeded = True
+            return result
+        finally:
+            self.durations.append((state, time.perf_counter() - start, succeeded))
+            if succeeded and state in self.page_states:
+                instrumentation.count('page_navigations')
+
+    def login_form(self):
+        """
+        Waits for the login form to accept input.
+        """
+        return self.wait_for('login_form', EC.element_to_be_clickable((By.ID, "login_email")))
+
+    def purchase_form(self):
+        """
+        Waits for the new purchase form to accept input.
+        """
+        return self.wait_for('purchase_form', EC.element_to_be_clickable((By.ID, "datepicker")))
+
+    def listing(self):
+        """
+        Waits for the purchase listing, i.e. a fully loaded page that is not an edit page.
+        """
+        return self.wait_for('listing', lambda driver: driver.execute_script(
+            "return document.readyState") == "complete" and not driver.find_elements(By.NAME, "update_purchase"))
+
+    def edit_page(self):
+        """
+        Waits for a purchase's edit page with its notes and image upload field.
+        """
+        return self.wait_for('edit_page', lambda driver: driver.find_elements(By.ID, "notes")
+                             and driver.find_elements(By.ID, "image"))
+
+    def navigation_from(self, element):
+        """
+        Waits for the page holding an element to be replaced, e.g. after submitting a form.
+
+        Parameters:
+        element (WebElement): Element of the page being left.
+        """
+        return self.wait_for('navigation', EC.staleness_of(element))
+
+    def summary(self) -> dict:
+        """
+        Summarizes the recorded waits per state.
+
+        Returns:
+        dict: Count, failures, total and maximum seconds for each state.
+        """
+        summary = {}
+        for state, seconds, succeeded in self.durations:
+            stats = summary.setdefault(state, {'count': 0, 'failures': 0, 'total': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['failures'] += not succeeded
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+        return summary
+
+    def report(self):
+        """
+        Prints the time spent waiting for each state.
+        """
+        print(f"{'State':<15}{'Waits':>7}{'Failed':>8}{'Total s':>10}{'Mean s':>9}{'Max s':>8}")
+        for state, stats in self.summary().items():
+            print(f"{state:<15}{stats['count']:>7}{stats['failures']:>8}{stats['total']:>10.2f}"
+                  f"{stats['total'] / stats['count']:>9.2f}{stats['max']:>8.2f}")
@@ -0,0 +1,167 @@
+"""
+Module to index the purchases on the portal listing by their note.
+"""
+
+import re
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+
+class PurchaseIndex:
+    """
+    This class scrapes the purchase listing once and maps each purchase's note (the receipt filename)
+    to a way of opening its edit page, so uploads can navigate straight to their purchase.
+
+    A purchase is reached through the link around its camera icon when there is one, otherwise by the
+    icon's position on the listing. Notes shown on the listing row are indexed without opening the
+    purchase; the others are read from the edit page the first time a lookup needs them.
+    """
+
+    note_pattern = re.compile(r'\S+\.pdf\b', re.IGNORECASE)
+
+    def __init__(self, browser):
+        """
+        Initializes the PurchaseIndex instance.
+
+        Parameters:
+        browser (BrowserSetup): Instance of the BrowserSetup class, showing the purchase listing.
+        """
+        self.browser = browser
+        self.listing_url = None
+        self.notes = {}
+        self.unread = []
+        self.seen = set()
+        self.page_loads = 0
+
+    @staticmethod
+    def is_camera_image(image_element) -> bool:
+        """
+        Checks if the image element is a camera image.
+
+        Parameters:
+        image_element (WebElement): Image element to check.
+
+        Returns:
+        bool: True if the image is a camera image, False otherwise.
+        """
+        name_value = image_element.get_attribute('src') or ''
+        return name_value.split("/")[-1] == "camera.png"
+
+    def scan_listing(self):
+        """
+        Reads every camera icon of the listing in one pass, without clicking any of them.
+        """
+        if self.listing_url is None:
+            self.listing_url = self.browser.driver.current_url
+        elif self.browser.driver.current_url != self.listing_url:
+            self.browser.driver.get(self.listing_url)
+            self.page_loads += 1
+        self.browser.waits.listing()
+        camera_images = [image for image in self.browser.driver.find_elements(By.TAG_NAME, "img")
+                         if self.is_camera_image(image)]
+        for position, image in enumerate(camera_images):
+            try:
+                target = ('url', image.find_element(By.XPATH, './ancestor::a[1]').get_attribute('href'))
+            except NoSuchElementException:
+                target = ('position', position)
+            if target[1] is None:
+                target = ('position', position)
+            if target in self.seen:
+                continue
+            self.seen.add(target)
+            try:
+                row_text = image.find_element(By.XPATH, './ancestor::tr[1]').text
+            except NoSuchElementException:
+                row_text = ''
+            row_notes = self.note_pattern.findall(row_text)
+            if len(row_notes) == 1:
+                self.notes.setdefault(row_notes[0], target)
+            else:
+                self.unread.append(target)
+
+    def open(self, target: tuple):
+        """
+        Opens the edit page of a purchase.
+
+        Parameters:
+        target (tuple): ('url', edit page URL) or ('position', index of the camera icon on the listing).
+        """
+        kind, value = target
+        if kind == 'url':
+            self.browser.driver.get(value)
+        else:
+            if self.browser.driver.current_url != self.listing_url:
+                self.browser.driver.get(self.listing_url)
+                self.page_loads += 1
+                self.browser.waits.listing()
+            camera_images = [image for image in self.browser.driver.find_elements(By.TAG_NAME, "img")
+                             if self.is_camera_image(image)]
+            camera_images[value].click()
+        self.page_loads += 1
+        self.browser.waits.edit_page()
+
+    def read_note(self) -> str:
+        """
+        Retrieves the note text from the open edit page.
+
+        Returns:
+        str: Note text.
+        """
+        note_box = self.browser.driver.find_elements(By.ID, "notes")
+        return note_box[0].text if note_box else ""
+
+    def open_purchase(self, note: str) -> bool:
+        """
+        Opens the edit page of the purchase with the given note.
+
+        Unread purchases are opened once each until the note is found; if it is not, the listing is
+        scanned once more for purchases created since the last scan.
+
+        Parameters:
+        note (str): Note of the purchase, i.e. the receipt filename.
+
+        Returns:
+        bool: True if the purchase's edit page is open, False if no purchase has this note.
+        """
+        if self.listing_url is None:
+            self.scan_listing()
+        for attempt in range(2):
+            if note in self.notes:
+                self.open(self.notes[note])
+                return True
+            while self.unread:
+                target = self.unread.pop(0)
+                self.open(target)
+                read_note = self.read_note()
+                self.notes.setdefault(read_note, target)
+                if read_note == note:
+                    return True
+            if attempt == 0:
+                self.scan_listing()
+        return False
+
+    def return_to_listing(self):
+        """
+        Goes back to the listing, which also holds the new purchase form, e.g. after a lookup left an edit
+        page open.
+        """
+        if self.listing_url is not None and self.browser.driver.current_url != self.listing_url:
+            self.browser.driver.get(self.listing_url)
+            self.page_loads += 1
+
+    def forget(self, note: str):
+        """
+        Removes a purchase from the index, e.g. once its receipt has been uploaded.
+
+        Icon positions may shift once a purchase has a receipt, so removing a purchase that was
+        reached by position drops every position-based entry; they are rescanned when next needed.
+
+        Parameters:
+        note (str): Note of the purchase.
+        """
+        target = self.notes.pop(note, None)
+        if target is None or target[0] != 'position':
+            return
+        self.notes = {key: value for key, value in self.notes.items() if value[0] != 'position'}
+        self.unread = [value for value in self.unread if value[0] != 'position']
+        self.seen = {value for value in self.seen if value[0] != 'position'}
@@ -0,0 +1,369 @@
+"""
+Module to propose the date, amount and provider of a receipt from its extracted text.
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from datetime import datetime
+import pandas as pd
+from ledger_partitions import LedgerPartitions
+
+
+class FieldProposal:
+    """
+    This class holds a proposed value for a receipt field and how confident the extractor is about it.
+    """
+
+    def __init__(self, value: str, confidence: float):
+        """
+        Initializes the FieldProposal instance.
+
+        Parameters:
+        value (str): Proposed value, formatted the way the user would type it.
+        confidence (float): Confidence between 0 and 1.
+        """
+        self.value = value
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"FieldProposal({self.value!r}, {self.confidence:.2f})"
+
+
+class ReceiptFieldExtractor:
+    """
+    This class extracts the date, total amount and provider from receipt text with precompiled patterns.
+
+    Provider names are matched against the providers already present in the ledger and against aliases
+    learned from confirmed receipts.
+    """
+
+    MONTHS = {name: number for number, names in enumerate(
+        [('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'), ('may',),
+         ('jun', 'june'), ('jul', 'july'), ('aug', 'august'), ('sep', 'sept', 'september'),
+         ('oct', 'october'), ('nov', 'november'), ('dec', 'december')], start=1) for name in names}
+
+    NUMERIC_DATE_PATTERN = re.compile(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{4}|\d{2})\b')
+    ISO_DATE_PATTERN = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+    NAMED_DATE_PATTERN = re.compile(
+        r'\b(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\.?\s+(\d{1,2}),?\s+(\d{4})\b',
+        re.IGNORECASE)
+    DATE_KEYWORD_PATTERN = re.compile(
+        r'date of service|service date|dos\b|transaction date|purchase date|date paid|payment date|fill date|'
+        r'visit date|\bdate\b', re.IGNORECASE)
+    STATEMENT_DATE_PATTERN = re.compile(r'statement date|print(?:ed)? date|due date|birth|dob\b', re.IGNORECASE)
+
+    AMOUNT_PATTERN = re.compile(r'(?<![\d.])\$?\s*(\d{1,3}(?:,\d{3})+|\d+)\.(\d{2})(?![\d%])')
+    TOTAL_KEYWORD_PATTERN = re.compile(
+        r'patient responsibility|amount paid|you paid|total paid|amount due|balance due|you owe|'
+        r'grand total|\btotal\b|copay|co-pay', re.IGNORECASE)
+    NON_TOTAL_KEYWORD_PATTERN = re.compile(r'subtotal|sub-total|tax|discount|savings|insurance paid|plan paid',
+                                           re.IGNORECASE)
+
+    WORD_PATTERN = re.compile(r'[a-z0-9]+')
+    GENERIC_WORDS = frozenset(['the', 'and', 'of', 'inc', 'llc', 'pc', 'pa', 'md', 'dds', 'co', 'corp', 'group',
+                               'center', 'centre', 'medical', 'health', 'clinic', 'pharmacy', 'associates',
+                               'services', 'care', 'dr'])
+
+    def __init__(self, aliases_path: str = None):
+        """
+        Initializes the ReceiptFieldExtractor instance.
+
+        Parameters:
+        aliases_path (str): JSON file keeping provider aliases learned from confirmed receipts (default is None,
+                            which keeps learned aliases in memory only).
+        """
+        self.aliases_path = aliases_path
+        self.providers = Counter()
+        self.aliases = {}
+        self.token_index = {}
+        self.provider_pattern = None
+        self.provider_names = {}
+        if aliases_path and os.path.exists(aliases_path):
+            with open(aliases_path, encoding='utf-8') as aliases_file:
+                self.aliases = json.load(aliases_file)
+
+    @classmethod
+    def from_ledger(cls, excel_file_loc: str, aliases_path: str = None) -> 'ReceiptFieldExtractor':
+        """
+        Creates an extractor that knows the providers of the transaction Excel file.
+
+        Parameters:
+        excel_file_loc (str): Location of the Excel file.
+        aliases_path (str): JSON file keeping learned provider aliases (default is a sidecar next to the Excel file).
+
+        Returns:
+        ReceiptFieldExtractor: Extractor primed with the ledger's providers.
+        """
+        extractor = cls(aliases_path or excel_file_loc + '.provider_aliases.json')
+        try:
+            df = LedgerPartitions(excel_file_loc).read(['Provider'])
+        except (OSError, ValueError):
+            return extractor
+        extractor.learn_from_ledger(df)
+        return extractor
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        """
+        Lower-cases text and reduces it to space separated words.
+
+        Parameters:
+        text (str): Text to normalize.
+
+        Returns:
+        str: Normalized text.
+        """
+        return ' '.join(cls.WORD_PATTERN.findall(text.lower()))
+
+    def learn_from_ledger(self, df: pd.DataFrame):
+        """
+        Learns provider names and their distinctive words from past ledger rows.
+
+        Parameters:
+        df (pd.DataFrame): DataFrame with a 'Provider' column.
+        """
+        for provider in df['Provider'].dropna().astype(str):
+            provider = provider.strip()
+            if provider:
+                self.providers[provider] += 1
+        self._build_token_index()
+
+    def _build_token_index(self):
+        """
+        Compiles the provider name pattern and maps each distinctive provider word to the most
+        frequent provider using it.
+        """
+        token_index = {}
+        provider_names = {}
+        for provider, count in self.providers.most_common():
+            name = self.normalize(provider)
+            if name and name not in provider_names:
+                provider_names[name] = provider
+            for token in name.split():
+                if len(token) > 2 and token not in self.GENERIC_WORDS and token not in token_index:
+                    token_index[token] = provider
+        self.token_index = token_index
+        self.provider_names = provider_names
+        if provider_names:
+            alternatives = sorted(provider_names, key=len, reverse=True)
+            self.provider_pattern = re.compile(r'\b(' + '|'.join(map(re.escape, alternatives)) + r')\b')
+        else:
+            self.provider_pattern = None
+
+    def learn_alias(self, text: str, provider: str):
+        """
+        Remembers that a receipt with this text belongs to the confirmed provider.
+
+        The first line of the receipt is used as the alias, which is usually the letterhead.
+
+        Parameters:
+        text (str): Extracted text of the receipt.
+        provider (str): Provider confirmed by the user.
+        """
+        alias = self._header_line(text)
+        if not alias or not provider:
+            return
+        self.providers[provider] += 1
+        if self.aliases.get(alias) == provider:
+            return
+        self.aliases[alias] = provider
+        self._build_token_index()
+        if self.aliases_path:
+            temp_path = self.aliases_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as aliases_file:
+                json.dump(self.aliases, aliases_file, indent=1, sort_keys=True)
+            os.replace(temp_path, self.aliases_path)
+
+    def _header_line(self, text: str) -> str:
+        """
+        Gets the first line of the text that contains letters, normalized.
+
+        Parameters:
+        text (str): Extracted text of the receipt.
+
+        Returns:
+        str: Normalized header line, or an empty string.
+        """
+        for line in text.splitlines():
+            normalized = self.normalize(line)
+            if re.search(r'[a-z]{2}', normalized):
+                return normalized
+        return ''
+
+    @staticmethod
+    def _to_date(year: int, month: int, day: int) -> datetime | None:
+        """
+        Builds a date, rejecting impossible or implausible values.
+
+        Parameters:
+        year (int): Year, with two-digit years taken as 20xx.
+        month (int): Month.
+        day (int): Day.
+
+        Returns:
+        datetime | None: The date, or None if it is not a plausible receipt date.
+        """
+        if year < 100:
+            year += 2000
+        try:
+            date = datetime(year, month, day)
+        except ValueError:
+            return None
+        if not 2000 <= date.year <= datetime.now().year + 1:
+            return None
+        return date
+
+    def _find_dates(self, line: str) -> list[datetime]:
+        """
+        Finds all dates written on a line.
+
+        Parameters:
+        line (str): Line of receipt text.
+
+        Returns:
+        list[datetime]: Dates in the order they were found.
+        """
+        dates = []
+        for month, day, year in self.NUMERIC_DATE_PATTERN.findall(line):
+            dates.append(self._to_date(int(year), int(month), int(day)))
+        for year, month, day in self.ISO_DATE_PATTERN.findall(line):
+            dates.append(self._to_date(int(year), int(month), int(day)))
+        for month_name, day, year in self.NAMED_DATE_PATTERN.findall(line):
+            dates.append(self._to_date(int(year), self.MONTHS[month_name.lower()], int(day)))
+        return [date for date in dates if date is not None]
+
+    def extract_date(self, lines: list[str]) -> FieldProposal | None:
+        """
+        Proposes the service or purchase date of the receipt.
+
+        Parameters:
+        lines (list[str]): Lines of receipt text.
+
+        Returns:
+        FieldProposal | None: Proposed date in MM/DD/YYYY format.
+        """
+        scores = {}
+        for index, line in enumerate(lines):
+            dates = self._find_dates(line)
+            if not dates:
+                continue
+            context = line if self.DATE_KEYWORD_PATTERN.search(line) else (lines[index - 1] if index else '')
+            if self.STATEMENT_DATE_PATTERN.search(line):
+                score = 0.2
+            elif self.DATE_KEYWORD_PATTERN.search(context):
+                score = 0.8
+            else:
+                score = 0.5
+            for date in dates:
+                scores[date] = max(scores.get(date, 0.0), score)
+        if not scores:
+            return None
+        best_date = max(scores, key=lambda date: scores[date])
+        confidence = scores[best_date]
+        if len(scores) == 1:
+            confidence = min(1.0, confidence + 0.15)
+        return FieldProposal(best_date.strftime('%m/%d/%Y'), round(confidence, 2))
+
+    def extract_amount(self, lines: list[str]) -> FieldProposal | None:
+        """
+        Proposes the total amount the user paid.
+
+        Parameters:
+        lines (list[str]): Lines of receipt text.
+
+        Returns:
+        FieldProposal | None: Proposed amount with two decimals and no thousands separators.
+        """
+        candidates = []
+        for index, line in enumerate(lines):
+            amounts = [float(whole.replace(',', '') + '.' + cents) for whole, cents in self.AMOUNT_PATTERN.findall(line)]
+            if not amounts:
+                continue
+            context = line if self.TOTAL_KEYWORD_PATTERN.search(line) else (lines[index - 1] if index else '')
+            if self.NON_TOTAL_KEYWORD_PATTERN.search(line):
+                score = 0.1
+            elif self.TOTAL_KEYWORD_PATTERN.search(context):
+                score = 0.85
+            else:
+                score = 0.3
+            candidates.extend((score, amount, index) for amount in amounts)
+        if not candidates:
+            return None
+        # Strongest keyword first; among equals the last one on the receipt is usually the final total
+        score, amount, index = max(candidates, key=lambda candidate: (candidate[0], candidate[2], candidate[1]))
+        distinct = {candidate[1] for candidate in candidates if candidate[0] == score}
+        confidence = score if len(distinct) == 1 else score - 0.15
+        return FieldProposal(f"{amount:.2f}", round(max(confidence, 0.05), 2))
+
+    def extract_provider(self, text: str) -> FieldProposal | None:
+        """
+        Proposes the provider of the receipt.
+
+        Parameters:
+        text (str): Extracted text of the receipt.
+
+        Returns:
+        FieldProposal | None: Proposed provider name.
+        """
+        header = self._header_line(text)
+        if header in self.aliases:
+            return FieldProposal(self.aliases[header], 0.95)
+        normalized = self.normalize(text)
+        if self.provider_pattern is not None:
+            match = self.provider_pattern.search(normalized)
+            if match:
+                return FieldProposal(self.provider_names[match.group(1)], 0.85)
+        votes = Counter(self.token_index[token] for token in set(normalized.split()) if token in self.token_index)
+        if votes:
+            provider, hits = votes.most_common(1)[0]
+            return FieldProposal(provider, 0.6 if hits > 1 else 0.45)
+        for line in text.splitlines():
+            if re.search(r'[A-Za-z]{2}', line):
+                return FieldProposal(line.strip(), 0.2)
+        return None
+
+    def extract(self, text: str) -> dict:
+        """
+        Proposes all fields for one receipt.
+
+        Parameters:
+        text (str): Extracted text of the receipt.
+
+        Returns:
+        dict: FieldProposal (or None) for 'Date', 'Provider' and 'Amount'.
+        """
+        lines = [line for line in text.splitlines() if line.strip()]
+        return {
+            'Date': self.extract_date(lines),
+            'Provider': self.extract_provider(text),
+            'Amount': self.extract_amount(lines)
+        }
+
+    def extract_batch(self, extractions: list) -> list[dict]:
+        """
+        Proposes the fields for many receipts.
+
+        Parameters:
+        extractions (list[PDFExtraction]): Extraction results, e.g. from PDFExtractionPool.extract_folder.
+
+        Returns:
+        list[dict]: Proposals for each receipt, in the same order.
+        """
+        return [self.extract(extraction.text) for extraction in extractions]
+
+    def extract_folder(self, directory_path: str, extraction_pool) -> list[tuple[str, dict]]:
+        """
+        Proposes the fields for every PDF receipt in a directory.
+
+        Parameters:
+        directory_path (str): Directory containing the PDF receipts.
+        extraction_pool (PDFExtractionPool): Pool used to extract the text.
+
+        Returns:
+        list[tuple[str, dict]]: Path and proposals for each receipt, in folder order.
+        """
+        extractions = extraction_pool.extract_folder(directory_path)
+        return [(extraction.file_path, proposals)
+                for extraction, proposals in zip(extractions, self.extract_batch(extractions))]
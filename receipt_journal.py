@@ -0,0 +1,290 @@
+"""
+Module to journal the processing stages of each receipt and resume an interrupted run.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import pandas as pd
+from instrumentation import instrumentation
+from ledger_batch_writer import LedgerBatchWriter
+from ledger_partitions import LedgerPartitions
+
+
+class ReceiptJournal:
+    """
+    This class keeps a write-ahead journal of every receipt's progress through the stages renamed,
+    ledger, purchase_created, uploaded and archived, as an append-only JSON lines file next to the
+    workbook. Each record is flushed to disk before the run goes on, so after a crash the journal tells
+    exactly which stages of which receipts are done.
+
+    Steps that cannot be checked cheaply afterwards are recorded before they start as well
+    ('purchase_started', 'upload_started'): a purchase started but not recorded as created is looked up on
+    the portal instead of being created a second time. resume drives every unfinished receipt through its
+    remaining stages, and each stage first checks whether its work is already done, so resuming twice is
+    harmless.
+    """
+
+    STAGES = ('renamed', 'ledger', 'purchase_created', 'uploaded', 'archived')
+    _journals = {}
+    _journals_lock = threading.Lock()
+
+    def __init__(self, journal_path: str):
+        """
+        Initializes the ReceiptJournal instance and replays the journal file.
+
+        Parameters:
+        journal_path (str): Path to the JSON lines journal.
+        """
+        self.journal_path = journal_path
+        self.entries = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def for_workbook(cls, workbook_path: str) -> 'ReceiptJournal':
+        """
+        Gets the journal shared by everything in this process that processes receipts for the workbook.
+
+        Parameters:
+        workbook_path (str): Path to the transaction Excel file.
+
+        Returns:
+        ReceiptJournal: Shared journal, kept in a '.journal.jsonl' file next to the workbook.
+        """
+        key = os.path.abspath(workbook_path)
+        with cls._journals_lock:
+            if key not in cls._journals:
+                cls._journals[key] = cls(workbook_path + '.journal.jsonl')
+            return cls._journals[key]
+
+    def load(self):
+        """
+        Replays the journal file. A last line cut short by a crash is ignored.
+        """
+        self.entries = {}
+        try:
+            with open(self.journal_path, encoding='utf-8') as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._apply(record)
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, record: dict):
+        """
+        Applies a journal record to the in-memory entries.
+
+        Parameters:
+        record (dict): Journal record.
+        """
+        receipt_number = record['receipt']
+        if record['event'] == 'begin':
+            self.entries[receipt_number] = {'transaction': record['transaction'], 'source': record.get('source'),
+                                            'submit': record.get('submit', True), 'stages': set()}
+        elif record['event'] == 'discard':
+            self.entries.pop(receipt_number, None)
+        elif receipt_number in self.entries:
+            self.entries[receipt_number]['stages'].add(record['event'])
+
+    def _append(self, record: dict):
+        """
+        Appends a record to the journal file and forces it to disk.
+
+        Parameters:
+        record (dict): Journal record.
+        """
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self._apply(record)
+            with open(self.journal_path, 'a', encoding='utf-8') as journal_file:
+                journal_file.write(line)
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+        instrumentation.count('journal_records')
+
+    def begin(self, transaction: dict, source: str = None, submit: bool = True):
+        """
+        Records a receipt about to be processed, before anything is changed for it.
+
+        Parameters:
+        transaction (dict): Transaction details, with the 'Receipt Number' and 'New Filename'.
+        source (str): Current name of the receipt's PDF file (default is None for a transaction without receipt).
+        submit (bool): Whether the run submits the transaction to the portal (default is True).
+        """
+        self._append({'receipt': transaction['Receipt Number'], 'event': 'begin', 'at': time.time(),
+                      'transaction': transaction, 'source': source, 'submit': submit})
+
+    def record(self, receipt_number: str, stage: str):
+        """
+        Records that a receipt has reached a stage, or is about to start a step.
+
+        Parameters:
+        receipt_number (str): Receipt number.
+        stage (str): One of STAGES, or 'purchase_started' / 'upload_started'.
+        """
+        if receipt_number in self.entries:
+            self._append({'receipt': receipt_number, 'event': stage, 'at': time.time()})
+
+    def discard(self, receipt_number: str):
+        """
+        Drops a receipt whose processing failed before it changed anything.
+
+        Parameters:
+        receipt_number (str): Receipt number.
+        """
+        if receipt_number in self.entries:
+            self._append({'receipt': receipt_number, 'event': 'discard', 'at': time.time()})
+
+    def reached(self, receipt_number: str, stage: str) -> bool:
+        """
+        Checks if a receipt has reached a stage.
+
+        Parameters:
+        receipt_number (str): Receipt number.
+        stage (str): Stage name.
+
+        Returns:
+        bool: True if the stage is recorded for the receipt.
+        """
+        entry = self.entries.get(receipt_number)
+        return entry is not None and stage in entry['stages']
+
+    @staticmethod
+    def final_stage(entry: dict) -> str:
+        """
+        Gets the last stage a receipt has to reach.
+
+        Parameters:
+        entry (dict): Journal entry.
+
+        Returns:
+        str: 'archived' for a submitted receipt uploaded to the HSA, otherwise 'purchase_created' or 'ledger'.
+        """
+        if not entry['submit']:
+            return 'ledger'
+        if entry['source'] and entry['transaction'].get('In HSA?') == "Y":
+            return 'archived'
+        return 'purchase_created'
+
+    def pending(self) -> dict:
+        """
+        Gets the receipts that have not reached their last stage.
+
+        Returns:
+        dict: Journal entries by receipt number.
+        """
+        with self._lock:
+            return {receipt_number: entry for receipt_number, entry in self.entries.items()
+                    if self.final_stage(entry) not in entry['stages']}
+
+    def compact(self):
+        """
+        Rewrites the journal with only the unfinished receipts, replacing it atomically.
+        """
+        with self._lock:
+            pending = {receipt_number: entry for receipt_number, entry in self.entries.items()
+                       if self.final_stage(entry) not in entry['stages']}
+            temporary_path = self.journal_path + '.tmp'
+            with open(temporary_path, 'w', encoding='utf-8') as journal_file:
+                for receipt_number, entry in pending.items():
+                    journal_file.write(json.dumps({'receipt': receipt_number, 'event': 'begin',
+                                                   'transaction': entry['transaction'], 'source': entry['source'],
+                                                   'submit': entry['submit']}, default=str) + '\n')
+                    for stage in sorted(entry['stages']):
+                        journal_file.write(json.dumps({'receipt': receipt_number, 'event': stage}) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            os.replace(temporary_path, self.journal_path)
+            self.entries = pending
+
+    def summary(self) -> str:
+        """
+        Describes the unfinished receipts and the stage each one has reached.
+
+        Returns:
+        str: One line per unfinished receipt.
+        """
+        lines = []
+        for receipt_number, entry in self.pending().items():
+            done = [stage for stage in self.STAGES if stage in entry['stages']]
+            lines.append(f"  {receipt_number}: {done[-1] if done else 'not started'}")
+        return '\n'.join(lines)
+
+    def resume(self, directory_path: str, excel_file_loc: str, backend=None) -> dict:
+        """
+        Brings every unfinished receipt to its last stage, skipping the stages already done.
+
+        Parameters:
+        directory_path (str): Directory containing the PDF receipts.
+        excel_file_loc (str): Location of the Excel file.
+        backend (SubmissionBackend): Backend for the portal stages (default is None, which leaves them
+                                     for a later resume).
+
+        Returns:
+        dict: Stage reached by each resumed receipt, or the error that stopped it.
+        """
+        pending = self.pending()
+        outcomes = {}
+        destination_directory = os.path.join(directory_path, "Receipts")
+        with instrumentation.span('journal.resume', receipts=len(pending)):
+            # Renaming: done if the renamed file is in the folder or already archived
+            for receipt_number, entry in pending.items():
+                if not entry['source'] or self.reached(receipt_number, 'renamed'):
+                    continue
+                note = f"{entry['transaction']['New Filename']}.pdf"
+                source_path = os.path.join(directory_path, entry['source'])
+                if os.path.exists(os.path.join(directory_path, note)) or \
+                        os.path.exists(os.path.join(destination_directory, note)):
+                    self.record(receipt_number, 'renamed')
+                elif os.path.exists(source_path):
+                    os.rename(source_path, os.path.join(directory_path, note))
+                    self.record(receipt_number, 'renamed')
+                else:
+                    outcomes[receipt_number] = f"Neither '{entry['source']}' nor '{note}' exists."
+
+            # Ledger: done if the receipt number is in the workbook or one of its archived tax years
+            unwritten = [receipt_number for receipt_number in pending
+                         if receipt_number not in outcomes and not self.reached(receipt_number, 'ledger')]
+            if unwritten:
+                ledger_partitions = LedgerPartitions(excel_file_loc)
+                with LedgerBatchWriter(excel_file_loc, journal=self) as ledger_writer:
+                    for receipt_number in unwritten:
+                        if ledger_partitions.find(receipt_number) is not None:
+                            self.record(receipt_number, 'ledger')
+                        else:
+                            ledger_writer.add_transaction(pending[receipt_number]['transaction'])
+
+            # Portal: submit skips what the journal, or the portal itself, shows as done
+            to_submit = [receipt_number for receipt_number, entry in pending.items()
+                         if receipt_number not in outcomes and entry['submit']
+                         and self.final_stage(entry) not in entry['stages']]
+            if to_submit and backend is not None:
+                df = pd.DataFrame([pending[receipt_number]['transaction'] for receipt_number in to_submit])
+                df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%m/%d/%Y')
+                upload_indexes = {index for index, receipt_number in enumerate(to_submit)
+                                  if pending[receipt_number]['source']}
+                for receipt_number, result in zip(to_submit, backend.submit(
+                        df, directory_path, destination_directory, upload_indexes, journal=self)):
+                    if result['error']:
+                        outcomes[receipt_number] = result['error']
+
+            # Archiving: an uploaded receipt still in the folder is moved
+            for receipt_number, entry in pending.items():
+                if self.reached(receipt_number, 'uploaded') and not self.reached(receipt_number, 'archived'):
+                    note = f"{entry['transaction']['New Filename']}.pdf"
+                    if os.path.exists(os.path.join(directory_path, note)):
+                        shutil.move(os.path.join(directory_path, note), os.path.join(destination_directory, note))
+                    self.record(receipt_number, 'archived')
+
+        for receipt_number, entry in pending.items():
+            if receipt_number not in outcomes:
+                done = [stage for stage in self.STAGES if stage in entry['stages']]
+                outcomes[receipt_number] = done[-1] if done else 'not started'
+        self.compact()
+        return outcomes
@@ -0,0 +1,221 @@
+"""
+Module to score inbox PDFs against ledger rows and match them.
+"""
+
+import numpy as np
+import pandas as pd
+from receipt_field_extractor import ReceiptFieldExtractor
+
+
+class ReceiptMatcher:
+    """
+    This class scores every inbox PDF against every ledger row by amount, date proximity and provider
+    similarity, and ranks or assigns them using the whole score matrix at once.
+    """
+
+    amount_weight = 0.5
+    date_weight = 0.3
+    provider_weight = 0.2
+    date_window_days = 30
+
+    def __init__(self, ledger_rows: pd.DataFrame, inbox: list[tuple[str, str, dict]]):
+        """
+        Initializes the ReceiptMatcher instance and computes the score matrix.
+
+        Parameters:
+        ledger_rows (pd.DataFrame): Ledger rows with 'Date', 'Amount' and 'Provider' columns.
+        inbox (list[tuple[str, str, dict]]): Filename, extracted text and field proposals of each PDF.
+        """
+        self.ledger_rows = ledger_rows
+        self.filenames = [filename for filename, text, proposals in inbox]
+        self.scores = self._score(ledger_rows, inbox)
+
+    @staticmethod
+    def _proposed_values(inbox: list[tuple[str, str, dict]], field: str) -> list:
+        """
+        Gets the proposed value of a field for every PDF.
+
+        Parameters:
+        inbox (list[tuple[str, str, dict]]): Filename, extracted text and field proposals of each PDF.
+        field (str): Field name.
+
+        Returns:
+        list: Proposed values, None where nothing was found.
+        """
+        return [proposals[field].value if proposals.get(field) is not None else None
+                for filename, text, proposals in inbox]
+
+    def _score(self, ledger_rows: pd.DataFrame, inbox: list[tuple[str, str, dict]]) -> np.ndarray:
+        """
+        Computes the rows x PDFs score matrix.
+
+        Parameters:
+        ledger_rows (pd.DataFrame): Ledger rows.
+        inbox (list[tuple[str, str, dict]]): Filename, extracted text and field proposals of each PDF.
+
+        Returns:
+        np.ndarray: Scores between 0 and 1.
+        """
+        if ledger_rows.empty or not inbox:
+            return np.zeros((len(ledger_rows), len(inbox)))
+
+        # Amounts in cents, so equality does not depend on float rounding
+        row_cents = np.round(pd.to_numeric(ledger_rows['Amount'], errors='coerce').to_numpy(float) * 100)
+        pdf_cents = np.round(pd.to_numeric(pd.Series(self._proposed_values(inbox, 'Amount'), dtype=object),
+                                           errors='coerce').to_numpy(float) * 100)
+        amount_score = (row_cents[:, None] == pdf_cents[None, :]).astype(float)
+        # A matching amount anywhere on the receipt (e.g. a line item or copay) counts partially
+        cents_index = {}
+        for column, (filename, text, proposals) in enumerate(inbox):
+            for whole, cents in ReceiptFieldExtractor.AMOUNT_PATTERN.findall(text):
+                cents_index.setdefault(int(whole.replace(',', '')) * 100 + int(cents), set()).add(column)
+        for row, value in enumerate(row_cents):
+            if not np.isnan(value):
+                for column in cents_index.get(int(value), ()):
+                    amount_score[row, column] = max(amount_score[row, column], 0.6)
+
+        row_dates = pd.to_datetime(ledger_rows['Date'], format='%m/%d/%Y', errors='coerce').to_numpy('datetime64[D]')
+        pdf_dates = pd.to_datetime(pd.Series(self._proposed_values(inbox, 'Date'), dtype=object),
+                                   format='%m/%d/%Y', errors='coerce').to_numpy('datetime64[D]')
+        day_gap = np.abs((row_dates[:, None] - pdf_dates[None, :]).astype('timedelta64[D]').astype(float))
+        day_gap[np.isnat(row_dates)[:, None] | np.isnat(pdf_dates)[None, :]] = np.inf
+        date_score = np.clip(1 - day_gap / self.date_window_days, 0, 1)
+
+        provider_score = self._provider_similarity(ledger_rows['Provider'], [text for filename, text, proposals in inbox])
+
+        return (self.amount_weight * amount_score + self.date_weight * date_score
+                + self.provider_weight * provider_score)
+
+    @staticmethod
+    def _provider_similarity(providers: pd.Series, texts: list[str]) -> np.ndarray:
+        """
+        Computes the share of each ledger provider's words that appear in each PDF's text.
+
+        Parameters:
+        providers (pd.Series): Provider of each ledger row.
+        texts (list[str]): Extracted text of each PDF.
+
+        Returns:
+        np.ndarray: Rows x PDFs similarity between 0 and 1.
+        """
+        row_tokens = [set(ReceiptFieldExtractor.normalize(str(provider)).split()) - ReceiptFieldExtractor.GENERIC_WORDS
+                      if pd.notna(provider) else set() for provider in providers]
+        vocabulary = {token: column for column, token in enumerate(sorted(set().union(*row_tokens)))}
+        if not vocabulary:
+            return np.zeros((len(row_tokens), len(texts)))
+        row_matrix = np.zeros((len(row_tokens), len(vocabulary)))
+        for row, tokens in enumerate(row_tokens):
+            row_matrix[row, [vocabulary[token] for token in tokens]] = 1
+        text_matrix = np.zeros((len(texts), len(vocabulary)))
+        for column, text in enumerate(texts):
+            hits = [vocabulary[token] for token in set(ReceiptFieldExtractor.normalize(text).split())
+                    if token in vocabulary]
+            text_matrix[column, hits] = 1
+        token_counts = row_matrix.sum(axis=1, keepdims=True)
+        return np.divide(row_matrix @ text_matrix.T, token_counts, out=np.zeros((len(row_tokens), len(texts))),
+                         where=token_counts > 0)
+
+    def rank(self, row_position: int) -> list[tuple[str, float]]:
+        """
+        Ranks the PDFs for one ledger row, best first.
+
+        Parameters:
+        row_position (int): Position of the row in ledger_rows.
+
+        Returns:
+        list[tuple[str, float]]: Filename and score of every PDF.
+        """
+        scores = self.scores[row_position]
+        return [(self.filenames[column], float(scores[column])) for column in np.argsort(-scores, kind='stable')]
+
+    @staticmethod
+    def _best_assignment(weights: np.ndarray) -> list[tuple[int, int]]:
+        """
+        Finds the row and column pairs with the highest total weight, each row and column used at most once,
+        with the Hungarian method (shortest augmenting paths, O(rows^2 x columns)).
+
+        Parameters:
+        weights (np.ndarray): Rows x columns weights, 0 where a pair must not be matched.
+
+        Returns:
+        list[tuple[int, int]]: Matched (row, column) pairs with a positive weight.
+        """
+        transposed = weights.shape[0] > weights.shape[1]
+        cost = -(weights.T if transposed else weights)
+        row_count, column_count = cost.shape
+        # Index 0 of the potentials and column owners is a virtual column the augmenting paths start from
+        row_potential = np.zeros(row_count + 1)
+        column_potential = np.zeros(column_count + 1)
+        owner = np.zeros(column_count + 1, dtype=int)
+        previous = np.zeros(column_count + 1, dtype=int)
+        for row in range(1, row_count + 1):
+            owner[0] = row
+            column = 0
+            slack = np.full(column_count + 1, np.inf)
+            visited = np.zeros(column_count + 1, dtype=bool)
+            while owner[column] != 0:
+                visited[column] = True
+                current_row = owner[column]
+                reduced = cost[current_row - 1] - row_potential[current_row] - column_potential[1:]
+                lower = ~visited[1:] & (reduced < slack[1:])
+                slack[1:][lower] = reduced[lower]
+                previous[1:][lower] = column
+                free_slack = np.where(visited[1:], np.inf, slack[1:])
+                next_column = int(np.argmin(free_slack)) + 1
+                delta = free_slack[next_column - 1]
+                row_potential[owner[visited]] += delta
+                column_potential[visited] -= delta
+                slack[~visited] -= delta
+                column = next_column
+            while column:
+                owner[column] = owner[previous[column]]
+                column = previous[column]
+        pairs = [(owner[column] - 1, column - 1) for column in range(1, column_count + 1) if owner[column]]
+        if transposed:
+            pairs = [(row, column) for column, row in pairs]
+        return sorted((row, column) for row, column in pairs if weights[row, column] > 0)
+
+    def assign(self, min_score: float = 0.6, margin: float = 0.05) -> dict:
+        """
+        Assigns PDFs to ledger rows with the highest total score over the whole matrix, so a row never takes
+        a PDF that another row needs more when both can still be matched.
+
+        A matched row is ambiguous when a PDF no other row was given scores within the margin of its match;
+        PDFs matched to other rows do not count. Ambiguous rows are left for the user with their candidates.
+
+        Parameters:
+        min_score (float): Lowest score accepted as a match (default is 0.6).
+        margin (float): A row whose match and a free runner-up are closer than this is ambiguous (default is 0.05).
+
+        Returns:
+        dict: 'matched' as (index, filename, score) triples, 'unmatched' as indexes and 'ambiguous' as
+              (index, candidate filenames) pairs, with indexes from ledger_rows.
+        """
+        index = list(self.ledger_rows.index)
+        summary = {'matched': [], 'unmatched': [], 'ambiguous': []}
+        row_count, pdf_count = self.scores.shape
+        if row_count == 0:
+            return summary
+        if pdf_count == 0:
+            summary['unmatched'] = index
+            return summary
+
+        eligible = self.scores >= min_score
+        assignment = dict(self._best_assignment(np.where(eligible, self.scores, 0)))
+        free = np.ones(pdf_count, dtype=bool)
+        free[list(assignment.values())] = False
+
+        for row in range(row_count):
+            if row not in assignment:
+                # An optimal assignment leaves no eligible PDF free for an unmatched row
+                summary['unmatched'].append(index[row])
+                continue
+            column = assignment[row]
+            score = float(self.scores[row, column])
+            rivals = np.nonzero(free & eligible[row] & (self.scores[row] > score - margin))[0]
+            if len(rivals):
+                candidates = sorted([column, *rivals], key=lambda candidate: -self.scores[row, candidate])
+                summary['ambiguous'].append((index[row], [self.filenames[candidate] for candidate in candidates]))
+            else:
+                summary['matched'].append((index[row], self.filenames[column], score))
+        return summary
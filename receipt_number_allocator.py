@@ -0,0 +1,191 @@
+"""
+Module to allocate receipt numbers without re-reading the Excel file for every receipt.
+"""
+
+import json
+import os
+import threading
+from instrumentation import instrumentation
+from ledger_partitions import LedgerPartitions
+from ledger_store import LedgerStore
+
+
+class ReceiptNumberAllocator:
+    """
+    This class caches the highest F and R receipt numbers of the transaction Excel file and hands out new ones.
+
+    The scanned counters are kept in a small sidecar file next to the workbook together with the workbook's
+    modification time and size, so the workbook is only scanned again when it has changed. The workbook
+    stays the authority: numbers this process handed out are only held above the scan until a scan shows
+    them saved, so a number reserved by mistake or lost with an aborted session is free again once its
+    row is not in the workbook.
+    """
+
+    prefixes = ('F', 'R')
+    _allocators = {}
+    _allocators_lock = threading.Lock()
+
+    def __init__(self, workbook_path: str, sidecar_path: str = None):
+        """
+        Initializes the ReceiptNumberAllocator instance.
+
+        Parameters:
+        workbook_path (str): Path to the transaction Excel file.
+        sidecar_path (str): Path to the counter cache file (default is the workbook path with a
+                            '.receipt_numbers.json' suffix).
+        """
+        self.workbook_path = workbook_path
+        self.sidecar_path = sidecar_path or workbook_path + '.receipt_numbers.json'
+        self.scanned = {prefix: 0 for prefix in self.prefixes}
+        self.pending = {prefix: set() for prefix in self.prefixes}
+        self.workbook_signature = None
+        self.scan_count = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_workbook(cls, workbook_path: str) -> 'ReceiptNumberAllocator':
+        """
+        Gets the allocator shared by everything in this process that numbers receipts for the workbook.
+
+        Parameters:
+        workbook_path (str): Path to the transaction Excel file.
+
+        Returns:
+        ReceiptNumberAllocator: Shared allocator for the workbook.
+        """
+        key = os.path.abspath(workbook_path)
+        with cls._allocators_lock:
+            if key not in cls._allocators:
+                cls._allocators[key] = cls(workbook_path)
+            return cls._allocators[key]
+
+    @staticmethod
+    def parse_receipt_number(receipt_number) -> tuple[str, int] | None:
+        """
+        Splits a receipt number such as 'R42' into its prefix and counter.
+
+        Parameters:
+        receipt_number: Value of a 'Receipt no' cell.
+
+        Returns:
+        tuple[str, int] | None: Prefix and counter, or None if the value is not a receipt number.
+        """
+        return LedgerStore.parse_receipt_number(receipt_number)
+
+    def _get_workbook_signature(self) -> list[int]:
+        """
+        Gets the modification time and size of the workbook.
+
+        Returns:
+        list[int]: Modification time in nanoseconds and size in bytes.
+        """
+        stat = os.stat(self.workbook_path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _scan_workbook(self) -> dict:
+        """
+        Finds the highest counter per prefix over the ledger stores of the workbook and its archived tax years,
+        which copy a workbook first if it changed.
+
+        Returns:
+        dict: Highest counter for each prefix.
+        """
+        self.scan_count += 1
+        instrumentation.count('workbook_scans')
+        with instrumentation.span('excel.scan_receipt_numbers'):
+            return LedgerPartitions(self.workbook_path).max_numbers()
+
+    @property
+    def counters(self) -> dict:
+        """
+        Gets the highest taken counter of each prefix: scanned from the workbook, or handed out by this
+        process and not saved yet.
+
+        Returns:
+        dict: Highest taken counter for each prefix.
+        """
+        return {prefix: max([self.scanned[prefix], *self.pending[prefix]]) for prefix in self.prefixes}
+
+    def _load_sidecar(self) -> dict | None:
+        """
+        Loads the cached counters from the sidecar file.
+
+        Returns:
+        dict | None: Cached signature and counters, or None if there is no usable cache.
+        """
+        try:
+            with open(self.sidecar_path, encoding='utf-8') as sidecar:
+                return json.load(sidecar)
+        except (OSError, ValueError):
+            return None
+
+    def _save_sidecar(self):
+        """
+        Writes the scanned counters to the sidecar file, replacing it atomically.
+        """
+        temp_path = self.sidecar_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as sidecar:
+            json.dump({'signature': self.workbook_signature, 'counters': self.scanned}, sidecar)
+        os.replace(temp_path, self.sidecar_path)
+
+    def _refresh(self):
+        """
+        Brings the counters up to date with the workbook, scanning it only if it changed.
+        """
+        signature = self._get_workbook_signature()
+        if signature == self.workbook_signature:
+            return
+        cached = self._load_sidecar()
+        if cached and cached.get('signature') == signature:
+            scanned = cached['counters']
+        else:
+            scanned = self._scan_workbook()
+        self.scanned = {prefix: scanned.get(prefix, 0) for prefix in self.prefixes}
+        # Numbers up to the scanned counter are in the workbook now, so only the later ones stay pending
+        self.pending = {prefix: {number for number in self.pending[prefix] if number > self.scanned[prefix]}
+                        for prefix in self.prefixes}
+        self.workbook_signature = signature
+        self._save_sidecar()
+
+    def next_numbers(self) -> tuple[int, int]:
+        """
+        Gets the next free numbers without taking them.
+
+        Returns:
+        tuple[int, int]: Next numbers for F and R receipts.
+        """
+        with self._lock:
+            self._refresh()
+            return self.counters['F'] + 1, self.counters['R'] + 1
+
+    def allocate(self, prefix: str) -> str:
+        """
+        Takes the next receipt number for the prefix.
+
+        Parameters:
+        prefix (str): Receipt number prefix, 'F' or 'R'.
+
+        Returns:
+        str: Allocated receipt number.
+        """
+        with self._lock:
+            self._refresh()
+            number = self.counters[prefix] + 1
+            self.pending[prefix].add(number)
+            return f"{prefix}{number}"
+
+    def reserve(self, receipt_number: str):
+        """
+        Marks a receipt number chosen by the user as taken.
+
+        Parameters:
+        receipt_number (str): Receipt number to reserve.
+        """
+        parsed = self.parse_receipt_number(receipt_number)
+        if not parsed:
+            return
+        prefix, number = parsed
+        with self._lock:
+            self._refresh()
+            if number > self.counters[prefix]:
+                self.pending[prefix].add(number)
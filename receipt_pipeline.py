@@ -0,0 +1,267 @@
+"""
+Module to run receipt extraction, ledger writes and portal submission as overlapping stages.
+"""
+
+import os
+import queue
+import threading
+import pandas as pd
+from instrumentation import instrumentation
+from ledger_batch_writer import LedgerBatchWriter
+from pdf_cache import PDFCache
+from pdf_extraction_pool import PDFExtractionPool
+from receipt_journal import ReceiptJournal
+
+# Marks the end of the items on a stage queue
+DONE = object()
+
+
+class ReceiptPipeline:
+    """
+    This class processes receipts in four stages connected by bounded queues, so receipt N+1 is extracted
+    and entered while receipt N is written to the ledger and submitted to the portal:
+
+    1. extraction (worker thread): reads the PDFs in folder order, prefetching through a PDFExtractionPool;
+    2. preparation (calling thread, as it may prompt and show previews): turns each extraction into a
+       transaction with the prepare function and renames the receipt;
+    3. ledger (worker thread): adds the transactions in receipt order and saves the workbook whenever its
+       queue runs empty, so rows are saved promptly while a burst of receipts still shares one save;
+    4. submission (worker thread): creates the purchase and uploads the receipt through a SubmissionBackend,
+       once the save holding its ledger row has finished. A receipt that fails to submit keeps its error
+       and the next receipts are still submitted.
+
+    A full queue blocks its producer, which bounds the work in flight. When a stage fails, the stages
+    upstream of it stop taking new receipts, while every receipt already renamed is still written to the
+    ledger before run returns or raises.
+    """
+
+    def __init__(self, directory_path: str, excel_file_loc: str, prepare, backend=None, queue_size: int = 4,
+                 pdf_cache: PDFCache = None, extraction_pool: PDFExtractionPool = None, on_rename=None,
+                 journal: ReceiptJournal = None):
+        """
+        Initializes the ReceiptPipeline instance.
+
+        Parameters:
+        directory_path (str): Directory containing the PDF receipts.
+        excel_file_loc (str): Location of the Excel file.
+        prepare (callable): Called with the filename, file path and PDFExtraction of each receipt; returns
+                            the transaction details, or None to leave the receipt alone.
+        backend (SubmissionBackend): Backend submitting the purchases and receipts (default is None, which
+                                     stops after the ledger).
+        queue_size (int): Most receipts waiting between two stages (default is 4).
+        pdf_cache (PDFCache): Cache of extracted text and previews (default is None, which opens the default
+                              cache when no extraction pool is given).
+        extraction_pool (PDFExtractionPool): Pool extracting the PDFs (default is None, which uses a pool for
+                                             the duration of the run).
+        on_rename (callable): Called with the old and new path of each renamed receipt (default is None).
+        journal (ReceiptJournal): Journal of each receipt's stages (default is None, which uses the one shared
+                                  for the Excel file).
+        """
+        self.directory_path = directory_path
+        self.excel_file_loc = excel_file_loc
+        self.prepare = prepare
+        self.backend = backend
+        self.queue_size = queue_size
+        self.pdf_cache = pdf_cache
+        self.extraction_pool = extraction_pool
+        self.on_rename = on_rename
+        self.journal = journal or ReceiptJournal.for_workbook(excel_file_loc)
+        self.destination_directory = os.path.join(directory_path, "Receipts")
+        self.results = []
+        self.failures = []
+        self.lock = threading.Lock()
+
+    def fail(self, stage: str, error: BaseException):
+        """
+        Records the error that stopped a stage.
+
+        Parameters:
+        stage (str): Name of the stage.
+        error (BaseException): Error raised in the stage.
+        """
+        with self.lock:
+            self.failures.append((stage, error))
+
+    @staticmethod
+    def put(stage_queue: queue.Queue, item, consumer_closed: threading.Event) -> bool:
+        """
+        Puts an item on a stage queue, waiting while it is full unless its consumer has stopped.
+
+        Parameters:
+        stage_queue (queue.Queue): Queue of the next stage.
+        item: Item to put.
+        consumer_closed (threading.Event): Set once the next stage stops taking items.
+
+        Returns:
+        bool: True if the item was queued, False if the next stage has stopped.
+        """
+        while not consumer_closed.is_set():
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self, filenames: list[str]) -> list[dict]:
+        """
+        Processes the receipts through every stage.
+
+        Parameters:
+        filenames (list[str]): Names of the PDF files, in the order they are processed.
+
+        Returns:
+        list[dict]: 'filename', 'receipt_number', 'new_filename', 'renamed', 'ledger', 'purchase_created',
+                    'uploaded' and 'error' of each receipt that was prepared, in order.
+
+        Raises:
+        RuntimeError: If the extraction or ledger stage failed.
+        """
+        extracted = queue.Queue(self.queue_size)
+        prepared = queue.Queue(self.queue_size)
+        committed = queue.Queue(self.queue_size)
+        preparation_closed = threading.Event()
+        ledger_closed = threading.Event()
+        submission_closed = threading.Event()
+        self.results = []
+        self.failures = []
+
+        extraction_pool = self.extraction_pool or PDFExtractionPool(cache=self.pdf_cache or PDFCache())
+        workers = [
+            threading.Thread(target=self._extract, name="pipeline-extract",
+                             args=(filenames, extraction_pool, extracted, preparation_closed)),
+            threading.Thread(target=self._commit, name="pipeline-ledger",
+                             args=(prepared, committed, ledger_closed, submission_closed)),
+        ]
+        if self.backend is not None:
+            workers.append(threading.Thread(target=self._submit, name="pipeline-submit",
+                                            args=(committed, submission_closed)))
+        else:
+            submission_closed.set()
+        for worker in workers:
+            worker.start()
+        try:
+            self._prepare(extracted, prepared, preparation_closed, ledger_closed)
+        finally:
+            preparation_closed.set()
+            # The ledger stage drains every renamed receipt before it finishes
+            self.put(prepared, DONE, ledger_closed)
+            for worker in workers:
+                worker.join()
+            if self.extraction_pool is None:
+                extraction_pool.shutdown()
+            self.journal.compact()
+        if self.failures:
+            stage, error = self.failures[0]
+            raise RuntimeError(f"The {stage} stage failed: {error}") from error
+        return self.results
+
+    def _extract(self, filenames: list[str], extraction_pool: PDFExtractionPool, extracted: queue.Queue,
+                 preparation_closed: threading.Event):
+        """
+        Extracts the PDFs in order and hands them to the preparation stage.
+        """
+        try:
+            file_paths = [os.path.join(self.directory_path, filename) for filename in filenames]
+            extractions = extraction_pool.prefetch(file_paths)
+            for filename, file_path in zip(filenames, file_paths):
+                with instrumentation.span('pipeline.extract', file=filename):
+                    extraction = next(extractions)
+                if not self.put(extracted, (filename, file_path, extraction), preparation_closed):
+                    return
+        except Exception as error:
+            self.fail('extraction', error)
+        finally:
+            self.put(extracted, DONE, preparation_closed)
+
+    def _prepare(self, extracted: queue.Queue, prepared: queue.Queue, preparation_closed: threading.Event,
+                 ledger_closed: threading.Event):
+        """
+        Builds the transaction of each extracted receipt and renames it, in the calling thread.
+        """
+        while True:
+            item = extracted.get()
+            if item is DONE:
+                return
+            filename, file_path, extraction = item
+            transaction = self.prepare(filename, file_path, extraction)
+            if transaction is None:
+                continue
+            result = {'filename': filename, 'receipt_number': transaction['Receipt Number'],
+                      'new_filename': transaction['New Filename'], 'renamed': False, 'ledger': False,
+                      'purchase_created': False, 'uploaded': False, 'error': None}
+            new_file_path = os.path.join(self.directory_path, transaction['New Filename'] + '.pdf')
+            self.journal.begin(transaction, filename, submit=self.backend is not None)
+            with instrumentation.span('pipeline.rename', file=filename):
+                os.rename(file_path, new_file_path)
+            self.journal.record(transaction['Receipt Number'], 'renamed')
+            result['renamed'] = True
+            if self.on_rename is not None:
+                self.on_rename(file_path, new_file_path)
+            print(f"Renamed '{filename}' to '{transaction['New Filename']}.pdf'\n")
+            self.results.append(result)
+            if not self.put(prepared, (result, transaction), ledger_closed):
+                raise RuntimeError(f"The ledger stage stopped; '{filename}' was renamed but not written.")
+
+    def _commit(self, prepared: queue.Queue, committed: queue.Queue, ledger_closed: threading.Event,
+                submission_closed: threading.Event):
+        """
+        Writes the transactions to the ledger in receipt order, saving whenever the queue runs empty, and hands
+        them to the submission stage once they are saved.
+        """
+        unsaved = []
+        try:
+            with LedgerBatchWriter(self.excel_file_loc, self.journal) as ledger_writer:
+                while True:
+                    item = prepared.get()
+                    if item is DONE:
+                        break
+                    result, transaction = item
+                    ledger_writer.add_transaction(transaction)
+                    unsaved.append((result, transaction))
+                    if prepared.empty():
+                        with instrumentation.span('pipeline.ledger_save', rows=len(unsaved)):
+                            ledger_writer.flush()
+                        self._forward(unsaved, committed, submission_closed)
+                        unsaved = []
+            # Leaving the writer saved the rest
+            self._forward(unsaved, committed, submission_closed)
+        except Exception as error:
+            self.fail('ledger', error)
+        finally:
+            ledger_closed.set()
+            self.put(committed, DONE, submission_closed)
+
+    def _forward(self, saved: list[tuple], committed: queue.Queue, submission_closed: threading.Event):
+        """
+        Marks saved transactions as written and hands them to the submission stage.
+        """
+        for result, transaction in saved:
+            result['ledger'] = True
+            self.put(committed, (result, transaction), submission_closed)
+
+    def _submit(self, committed: queue.Queue, submission_closed: threading.Event):
+        """
+        Creates the purchase of each written transaction and uploads its receipt.
+        """
+        try:
+            while True:
+                item = committed.get()
+                if item is DONE:
+                    return
+                result, transaction = item
+                try:
+                    df = pd.DataFrame([transaction])
+                    df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%m/%d/%Y')
+                    with instrumentation.span('pipeline.submit', receipt=transaction['New Filename']):
+                        submission = self.backend.submit(df, self.directory_path, self.destination_directory,
+                                                         journal=self.journal)[0]
+                except Exception as error:
+                    # The row stays in the ledger for the missing receipts flow and the journal retries it
+                    result['error'] = f"Not submitted: {error}"
+                    continue
+                result['purchase_created'] = submission['purchase_created']
+                result['uploaded'] = submission['uploaded']
+                result['error'] = submission['error']
+        finally:
+            submission_closed.set()
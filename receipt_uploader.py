@@ -6,6 +6,9 @@ import os
 import shutil
 import pandas as pd
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from purchase_index import PurchaseIndex
+from instrumentation import instrumentation
 
 
 class ReceiptUploader:
@@ -13,7 +16,8 @@ class ReceiptUploader:
     This class handles the uploading of receipts.
     """
 
-    def __init__(self, browser, df: pd.DataFrame, directory: str, destination_directory: str):
+    def __init__(self, browser, df: pd.DataFrame, directory: str, destination_directory: str,
+                 purchase_index: PurchaseIndex = None):
         """
         Initializes the ReceiptUploader instance.
 
@@ -22,40 +26,42 @@ class ReceiptUploader:
         df (pd.DataFrame): DataFrame containing the data.
         directory (str): Directory containing the receipts.
         destination_directory (str): Directory to move the uploaded receipts.
+        purchase_index (PurchaseIndex): Index of the portal purchases to reuse across uploaders
+                                        (default is None, which scrapes the listing on first use).
         """
-        self.found = None
-        self.count = None
         self.browser = browser
         self.df = df
         self.directory = directory
         self.destination_directory = destination_directory
+        self.purchase_index = purchase_index or PurchaseIndex(browser)
+        self.results = {}
 
-    def search_and_upload_receipt(self):
+    def search_and_upload_receipt(self) -> dict:
         """
         Searches for and uploads the processed receipts.
+
+        Returns:
+        dict: 'uploaded' or 'not found' for the note of each receipt that was to be uploaded.
         """
         for index, row in self.df.iterrows():
-            self.found = False
-            self.count = 0
-            if row['In HSA?'] == "Y":
-                while not self.found:
-                    img_elements = self.browser.driver.find_elements(By.TAG_NAME, "img")[self.count:]
-                    for imm_val in img_elements:
-                        if self.is_camera_image(imm_val):
-                            imm_val.click()
-                            self.browser.driver.implicitly_wait(10)
-                            note_text = self.get_note_text()
-                            if self.is_matching_receipt(note_text, row):
-                                self.upload_receipt(note_text)
-                                self.move_receipt(note_text)
-                                self.save_and_exit()
-                                self.found = True
-                                break
-                            else:
-                                self.browser.driver.back()
-                                self.browser.driver.implicitly_wait(10)
-                                self.count += 1
-                                break
+            if row['In HSA?'] != "Y":
+                continue
+            note_text = f"{row['New Filename']}.pdf"
+            with instrumentation.span('portal.find_purchase', receipt=note_text):
+                found = self.purchase_index.open_purchase(note_text) and self.is_matching_receipt(
+                    self.get_note_text(), row)
+            if not found:
+                print(f"No purchase with the note '{note_text}' was found on the portal.")
+                self.results[note_text] = 'not found'
+                continue
+            with instrumentation.span('portal.upload_receipt', receipt=note_text):
+                self.upload_receipt(note_text)
+            self.move_receipt(note_text)
+            with instrumentation.span('portal.save_and_exit', receipt=note_text):
+                self.save_and_exit()
+            self.purchase_index.forget(note_text)
+            self.results[note_text] = 'uploaded'
+        return self.results
 
     @staticmethod
     def is_camera_image(image_element) -> bool:
@@ -68,8 +74,7 @@ class ReceiptUploader:
         Returns:
         bool: True if the image is a camera image, False otherwise.
         """
-        name_value = image_element.get_attribute('src')
-        return name_value.split("/")[-1] == "camera.png"
+        return PurchaseIndex.is_camera_image(image_element)
 
     def get_note_text(self) -> str:
         """
@@ -103,11 +108,14 @@ class ReceiptUploader:
         note_text (str): Note text for the receipt file.
         """
         file_input = self.browser.driver.find_element(By.ID, "image")
-        file_input.send_keys(rf'{self.directory}\{note_text}')
+        file_input.send_keys(os.path.abspath(os.path.join(self.directory, note_text)))
         description_input = self.browser.driver.find_element(By.ID, "img_description")
         description_input.send_keys("This is a receipt PDF.")
         submit_button = self.browser.driver.find_element(By.NAME, "upload_image")
         submit_button.click()
+        # The page being left also has the notes and image fields, so wait for it to go first
+        self.browser.waits.navigation_from(submit_button)
+        self.browser.waits.edit_page()
 
     def move_receipt(self, note_text: str):
         """
@@ -126,5 +134,9 @@ class ReceiptUploader:
         """
         save_button = self.browser.driver.find_element(By.NAME, "update_purchase")
         save_button.click()
-        exit_button = self.browser.driver.find_element(By.NAME, "exit_edit")
+        # The update must have finished before leaving, and the old page's exit button is clickable too
+        self.browser.waits.navigation_from(save_button)
+        exit_button = self.browser.waits.wait_for('edit_page',
+                                                  EC.element_to_be_clickable((By.NAME, "exit_edit")))
         exit_button.click()
+        self.browser.waits.listing()
@@ -0,0 +1,406 @@
+"""
+Module to watch the receipt folder and file new receipts as they arrive.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import pandas as pd
+from instrumentation import instrumentation
+from duplicate_index import DuplicateIndex
+from ledger_batch_writer import LedgerBatchWriter
+from pdf_cache import PDFCache
+from receipt_field_extractor import ReceiptFieldExtractor
+from receipt_journal import ReceiptJournal
+from receipt_number_allocator import ReceiptNumberAllocator
+from user_input import UserInput
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class ReceiptWatcher:
+    """
+    This class watches the receipt folder, with inotify (through watchdog) when available and by polling
+    otherwise, and files every new PDF without prompting: it extracts the date, provider and amount,
+    renames the file, adds the ledger row and optionally submits the purchase and uploads the receipt.
+
+    A file is only picked up once its size and modification time have stayed the same for the debounce
+    period, so receipts still being written by a scanner or an email export are left alone. Receipts
+    whose fields cannot be extracted confidently, receipts duplicating a filed receipt or ledger row, and
+    receipts matching a ledger row still waiting for its receipt are left in place for the interactive flows.
+
+    Filed, submitted and duplicate receipts are kept by content hash in a state file in the folder, so a
+    restart skips completed work; receipts that failed or were left for review are looked at again. Filed
+    receipts whose submission failed are retried through the journal every retry_interval seconds.
+    """
+
+    state_filename = ".receipt_watcher_state.json"
+    filed_name_pattern = re.compile(r'^[FR]\d+_\d+(\.\d+)?\.pdf$', re.IGNORECASE)
+    default_choices = {'Type': "Medical", 'Category': "Prescriptions", 'Payment Method': "HSA Account"}
+    terminal_statuses = ('filed', 'submitted', 'duplicate')
+
+    def __init__(self, directory_path: str, excel_file_loc: str, backend=None, choices: dict = None,
+                 debounce: float = 2.0, poll_interval: float = 1.0, min_confidence: float = 0.6,
+                 pdf_cache: PDFCache = None, journal: ReceiptJournal = None, retry_interval: float = 300.0):
+        """
+        Initializes the ReceiptWatcher instance.
+
+        Parameters:
+        directory_path (str): Directory the receipts arrive in.
+        excel_file_loc (str): Location of the Excel file.
+        backend (SubmissionBackend): Backend submitting the purchases and receipts (default is None,
+                                     which only renames the receipts and writes the ledger).
+        choices (dict): 'Type', 'Category' and 'Payment Method' of filed receipts (default is None,
+                        which uses default_choices).
+        debounce (float): Seconds a file must stay unchanged before it is processed (default is 2.0).
+        poll_interval (float): Seconds between folder scans without inotify (default is 1.0).
+        min_confidence (float): Lowest confidence accepted for each extracted field (default is 0.6).
+        pdf_cache (PDFCache): Cache of PDF extractions (default is None, which uses the default cache).
+        journal (ReceiptJournal): Journal of each receipt's stages (default is None, which uses the one shared
+                                  for the Excel file).
+        retry_interval (float): Seconds between retries of unfinished submissions (default is 300.0).
+        """
+        self.directory_path = directory_path
+        self.excel_file_loc = excel_file_loc
+        self.backend = backend
+        self.choices = {**self.default_choices, **(choices or {})}
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.min_confidence = min_confidence
+        self.pdf_cache = pdf_cache or PDFCache()
+        self.allocator = ReceiptNumberAllocator.for_workbook(excel_file_loc)
+        self.journal = journal or ReceiptJournal.for_workbook(excel_file_loc)
+        self.field_extractor = None
+        self.duplicate_index = None
+        self.state_path = os.path.join(directory_path, self.state_filename)
+        self.state = self.load_state()
+        self.retry_interval = retry_interval
+        self.last_retry = None
+        self.candidates = {}
+        self.settled = {}
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.observer = None
+
+    def load_state(self) -> dict:
+        """
+        Loads the final outcomes of earlier runs.
+
+        Returns:
+        dict: Outcome per content hash, empty if there is no state file yet.
+        """
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return {}
+        # State files of older versions also kept errors and receipts left for review
+        return {content_hash: outcome for content_hash, outcome in state.items()
+                if outcome.get('status') in self.terminal_statuses}
+
+    def save_state(self):
+        """
+        Writes the outcomes atomically.
+        """
+        temporary_path = self.state_path + ".tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as state_file:
+            json.dump(self.state, state_file, indent=1)
+        os.replace(temporary_path, self.state_path)
+
+    def get_field_extractor(self) -> ReceiptFieldExtractor:
+        """
+        Gets the field extractor, learning the providers from the ledger on first use.
+
+        Returns:
+        ReceiptFieldExtractor: Field extractor.
+        """
+        if self.field_extractor is None:
+            self.field_extractor = ReceiptFieldExtractor.from_ledger(self.excel_file_loc)
+        return self.field_extractor
+
+    def get_duplicate_index(self) -> DuplicateIndex:
+        """
+        Gets the duplicate index, building it from the folder, its Receipts archive and the ledger on first use.
+
+        Returns:
+        DuplicateIndex: Index of the known receipts and ledger rows.
+        """
+        if self.duplicate_index is None:
+            self.duplicate_index = DuplicateIndex.for_inbox(self.directory_path, self.excel_file_loc,
+                                                            self.pdf_cache, self.get_field_extractor())
+        return self.duplicate_index
+
+    def start_observer(self):
+        """
+        Starts watching the folder with inotify if watchdog is installed.
+
+        Returns:
+        bool: True if file system events are watched, False if the folder is polled.
+        """
+        if Observer is None:
+            return False
+        self.observer = Observer()
+        self.observer.schedule(ReceiptEventHandler(self), self.directory_path, recursive=False)
+        self.observer.start()
+        return True
+
+    def notice(self, file_path: str):
+        """
+        Registers a file that was created or changed, so it is checked for stability.
+
+        Parameters:
+        file_path (str): Path to the file.
+        """
+        filename = os.path.basename(file_path)
+        if not filename.lower().endswith('.pdf') or self.filed_name_pattern.match(filename):
+            return
+        self.candidates.setdefault(filename, None)
+        self.wakeup.set()
+
+    def scan(self):
+        """
+        Registers every PDF in the folder that may still need processing.
+        """
+        with os.scandir(self.directory_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    # Files left for review are not rehashed on every scan unless they change
+                    stat = entry.stat()
+                    if self.settled.get(entry.name) != (stat.st_size, stat.st_mtime_ns):
+                        self.notice(entry.path)
+
+    def collect_ready(self) -> list[str]:
+        """
+        Finds the candidate files that have stayed unchanged for the debounce period.
+
+        Returns:
+        list[str]: Names of the files ready to be processed.
+        """
+        now = time.monotonic()
+        ready = []
+        for filename, seen in list(self.candidates.items()):
+            try:
+                stat = os.stat(os.path.join(self.directory_path, filename))
+            except FileNotFoundError:
+                del self.candidates[filename]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if seen is None or seen[0] != signature:
+                self.candidates[filename] = (signature, now)
+            elif stat.st_size > 0 and now - seen[1] >= self.debounce:
+                ready.append(filename)
+        return sorted(ready)
+
+    def build_transaction(self, filename: str, proposals: dict) -> dict | None:
+        """
+        Builds the ledger row of a receipt from its extracted fields.
+
+        Parameters:
+        filename (str): Name of the PDF file.
+        proposals (dict): Field proposals of ReceiptFieldExtractor.extract.
+
+        Returns:
+        dict | None: Transaction details, or None if a field is missing or not confident enough.
+        """
+        fields = ['Date', 'Provider', 'Amount']
+        if any(proposals.get(field) is None or proposals[field].confidence < self.min_confidence
+               for field in fields):
+            return None
+        user_input = UserInput(filename, self.excel_file_loc, 0, True, self.allocator)
+        user_input.date = proposals['Date'].value
+        user_input.provider = proposals['Provider'].value
+        user_input.amount = proposals['Amount'].value
+        receipt_number = self.allocator.allocate('R' if self.choices['Payment Method'] == "HSA Account" else 'F')
+        return user_input.build_transaction(self.choices['Type'], self.choices['Category'],
+                                            self.choices['Payment Method'], receipt_number, "Filed by the watcher")
+
+    def process(self, filenames: list[str]) -> list[dict]:
+        """
+        Files the given receipts: extraction, renaming and one ledger save, then submission.
+
+        Parameters:
+        filenames (list[str]): Names of the PDF files, unchanged for the debounce period.
+
+        Returns:
+        list[dict]: Outcome of each file that was not already processed.
+        """
+        outcomes = []
+        hashes = []
+        transactions = []
+        duplicate_index = self.get_duplicate_index()
+        pending_paths = {os.path.join(self.directory_path, filename) for filename in filenames}
+        with LedgerBatchWriter(self.excel_file_loc, self.journal) as ledger_writer:
+            for filename in filenames:
+                file_path = os.path.join(self.directory_path, filename)
+                pending_paths.discard(file_path)
+                content_hash = self.pdf_cache.hash_file(file_path)
+                self.settled[filename] = self.candidates.pop(filename)[0]
+                if content_hash in self.state:
+                    continue
+                with instrumentation.span('watcher.extract', file=filename):
+                    extraction = self.pdf_cache.get_or_extract(file_path)
+                outcome = {'filename': filename, 'status': 'needs_review', 'receipt_number': None,
+                           'new_filename': None, 'error': extraction.error, 'processed_at': time.time()}
+                outcomes.append(outcome)
+                hashes.append(content_hash)
+                if extraction.error is not None:
+                    outcome['status'] = 'error'
+                    continue
+                duplicates = duplicate_index.check(file_path, extraction, ignore=pending_paths)
+                if DuplicateIndex.awaited(duplicates):
+                    # Left in the inbox, and not remembered, for the missing receipts flow to attach
+                    rows = ", ".join(location for kind, location in duplicates)
+                    outcome.update(status='awaiting_receipt',
+                                   error=f"receipt of {rows}; attach it through the missing receipts flow")
+                    continue
+                if duplicates:
+                    outcome.update(status='duplicate', error="duplicate of " + ", ".join(
+                        f"{os.path.basename(location)} ({kind})" for kind, location in duplicates))
+                    continue
+                transaction = self.build_transaction(filename, self.get_field_extractor().extract(extraction.text))
+                if transaction is None:
+                    continue
+                new_file_path = os.path.join(self.directory_path, transaction['New Filename'] + '.pdf')
+                if os.path.exists(new_file_path):
+                    outcome.update(status='error', error=f"'{transaction['New Filename']}.pdf' already exists.")
+                    continue
+                self.journal.begin(transaction, filename, submit=self.backend is not None)
+                os.rename(file_path, new_file_path)
+                self.journal.record(transaction['Receipt Number'], 'renamed')
+                duplicate_index.move_file(file_path, new_file_path)
+                duplicate_index.add_transaction(transaction['Date'], transaction['Amount'], transaction['Provider'],
+                                                transaction['Receipt Number'])
+                ledger_writer.add_transaction(transaction)
+                outcome.update(status='filed', receipt_number=transaction['Receipt Number'],
+                               new_filename=transaction['New Filename'])
+                transactions.append((outcome, transaction))
+        # Errors and receipts left for review are looked at again after a restart
+        for content_hash, outcome in zip(hashes, outcomes):
+            if outcome['status'] in self.terminal_statuses:
+                self.state[content_hash] = outcome
+        self.save_state()
+
+        if self.backend is not None and transactions:
+            df = pd.DataFrame([transaction for outcome, transaction in transactions])
+            results = self.backend.submit(df, self.directory_path, os.path.join(self.directory_path, "Receipts"),
+                                          journal=self.journal)
+            # What failed just now is retried after the retry interval, not on the next loop
+            self.last_retry = time.monotonic()
+            for result, (outcome, transaction) in zip(results, transactions):
+                if result['uploaded'] or (result['purchase_created'] and transaction['In HSA?'] != "Y"):
+                    outcome['status'] = 'submitted'
+                elif result['error']:
+                    outcome['error'] = result['error']
+            self.save_state()
+            # Uploaded receipts were moved to the Receipts archive
+            duplicate_index.refresh()
+        self.journal.compact()
+        for outcome in outcomes:
+            print(f"{outcome['filename']}: {outcome['status']}"
+                  + (f" as {outcome['new_filename']}.pdf" if outcome['new_filename'] else "")
+                  + (f" ({outcome['error']})" if outcome['error'] else ""))
+        return outcomes
+
+    def retry_unfinished(self) -> dict:
+        """
+        Resumes the journaled receipts whose submission has not finished, such as filed receipts whose upload
+        failed, at most once per retry interval. Their filed names keep them out of the folder scan.
+
+        Returns:
+        dict: Stage reached by each resumed receipt, or the error that stopped it, empty if nothing was retried.
+        """
+        if self.backend is None or not self.journal.pending():
+            return {}
+        now = time.monotonic()
+        if self.last_retry is not None and now - self.last_retry < self.retry_interval:
+            return {}
+        self.last_retry = now
+        with instrumentation.span('watcher.retry'):
+            resumed = self.journal.resume(self.directory_path, self.excel_file_loc, self.backend)
+        finished = set(resumed) - set(self.journal.pending())
+        for outcome in self.state.values():
+            if outcome['receipt_number'] in finished:
+                outcome.update(status='submitted', error=None)
+        self.save_state()
+        if self.duplicate_index is not None:
+            # Uploaded receipts were moved to the Receipts archive
+            self.duplicate_index.refresh()
+        for receipt_number, stage in resumed.items():
+            print(f"{receipt_number}: {'submitted' if receipt_number in finished else stage} (retried)")
+        return resumed
+
+    def run(self, once: bool = False):
+        """
+        Watches the folder and files receipts until stopped.
+
+        Parameters:
+        once (bool): Whether to stop as soon as every PDF present at the start has been handled
+                     (default is False).
+        """
+        watching = self.start_observer()
+        print(f"Watching {self.directory_path} ({'inotify' if watching else 'polling'}). Press Ctrl+C to stop.")
+        self.scan()
+        try:
+            while not self.stop_event.is_set():
+                self.retry_unfinished()
+                ready = self.collect_ready()
+                if ready:
+                    self.process(ready)
+                if once and not self.candidates:
+                    break
+                # Pending files are rechecked until they settle; an idle watcher waits for events
+                timeout = self.poll_interval if (self.candidates or not watching) else 60
+                self.wakeup.wait(min(timeout, self.debounce) if self.candidates else timeout)
+                self.wakeup.clear()
+                if not watching:
+                    self.scan()
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stops watching.
+        """
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+
+class ReceiptEventHandler(FileSystemEventHandler):
+    """
+    This class forwards file system events of the receipt folder to a ReceiptWatcher.
+    """
+
+    def __init__(self, watcher: ReceiptWatcher):
+        """
+        Initializes the ReceiptEventHandler instance.
+
+        Parameters:
+        watcher (ReceiptWatcher): Watcher to notify.
+        """
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.dest_path)
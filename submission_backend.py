@@ -0,0 +1,575 @@
+"""
+Module providing interchangeable backends for submitting purchases and receipts to the HSA portal.
+"""
+
+import os
+import shutil
+import time
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from browser_setup import BrowserSetup
+from form_automation import FormAutomation
+from instrumentation import instrumentation
+from portal_session_store import PortalSessionStore
+from purchase_index import PurchaseIndex
+from receipt_uploader import ReceiptUploader
+
+
+class SubmissionBackend(ABC):
+    """
+    This class is the interface of a submission backend: it creates the portal purchase of a transaction
+    and uploads its receipt. Subclasses implement create_purchase and upload_receipt.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def login(self):
+        """
+        Connects to the portal and logs in, unless a saved session is still valid. Backends log in on
+        their first portal action anyway; calling this up front only moves the cost.
+        """
+
+    @abstractmethod
+    def create_purchase(self, row: pd.Series):
+        """
+        Creates the portal purchase of a transaction.
+
+        Parameters:
+        row (pd.Series): Transaction, in the form of a ledger row.
+        """
+
+    @abstractmethod
+    def upload_receipt(self, row: pd.Series, directory: str, destination_directory: str) -> bool:
+        """
+        Uploads the receipt of a transaction to its purchase and moves the file to the destination directory.
+
+        Parameters:
+        row (pd.Series): Transaction, in the form of a ledger row.
+        directory (str): Directory containing the receipts.
+        destination_directory (str): Directory to move the uploaded receipts.
+
+        Returns:
+        bool: True if the receipt was uploaded, False if no purchase has the receipt's note.
+        """
+
+    def has_purchase(self, row: pd.Series) -> bool | None:
+        """
+        Checks if the portal already has the purchase of a transaction.
+
+        Parameters:
+        row (pd.Series): Transaction, in the form of a ledger row.
+
+        Returns:
+        bool | None: Whether the purchase exists, or None if the backend cannot tell.
+        """
+        return None
+
+    def submit(self, df: pd.DataFrame, directory: str = None, destination_directory: str = None,
+               upload_indexes: set = None, journal=None) -> list[dict]:
+        """
+        Creates the purchases of the transactions and then uploads their receipts.
+
+        Parameters:
+        df (pd.DataFrame): Transactions, in the form of the ledger rows.
+        directory (str): Directory containing the receipts (default is None, which skips uploads).
+        destination_directory (str): Directory to move the uploaded receipts (default is None).
+        upload_indexes (set): Indexes of the transactions whose receipts are uploaded (default is None,
+                              which uploads every transaction marked as in the HSA).
+        journal (ReceiptJournal): Journal recording each step; steps it shows as done are skipped, and a
+                                  purchase started but not recorded as created is looked up first
+                                  (default is None).
+
+        Returns:
+        list[dict]: Index, 'purchase_created', 'uploaded' and 'error' of each transaction, in df order.
+        """
+        results = []
+        for index, row in df.iterrows():
+            result = {'index': index, 'purchase_created': False, 'uploaded': False, 'error': None}
+            results.append(result)
+            receipt_number = row.get('Receipt Number')
+            try:
+                if journal is not None:
+                    if journal.reached(receipt_number, 'purchase_created'):
+                        result['purchase_created'] = True
+                        continue
+                    if journal.reached(receipt_number, 'purchase_started') and self.has_purchase(row):
+                        journal.record(receipt_number, 'purchase_created')
+                        result['purchase_created'] = True
+                        continue
+                    journal.record(receipt_number, 'purchase_started')
+                with instrumentation.span('submit.create_purchase', receipt=row['New Filename']):
+                    self.create_purchase(row)
+                result['purchase_created'] = True
+                if journal is not None:
+                    journal.record(receipt_number, 'purchase_created')
+            except Exception as error:
+                result['error'] = str(error)
+
+        if directory is None:
+            return results
+        for (index, row), result in zip(df.iterrows(), results):
+            if not result['purchase_created'] or row['In HSA?'] != "Y":
+                continue
+            if upload_indexes is not None and index not in upload_indexes:
+                continue
+            receipt_number = row.get('Receipt Number')
+            if journal is not None and journal.reached(receipt_number, 'uploaded'):
+                result['uploaded'] = True
+                continue
+            try:
+                if journal is not None:
+                    journal.record(receipt_number, 'upload_started')
+                with instrumentation.span('submit.upload_receipt', receipt=row['New Filename']):
+                    result['uploaded'] = self.upload_receipt(row, directory, destination_directory)
+                if not result['uploaded']:
+                    result['error'] = "Purchase not found on the portal."
+                elif journal is not None:
+                    journal.record(receipt_number, 'uploaded')
+                    if destination_directory and os.path.exists(
+                            os.path.join(destination_directory, f"{row['New Filename']}.pdf")):
+                        journal.record(receipt_number, 'archived')
+            except Exception as error:
+                result['error'] = str(error)
+        return results
+
+    def report(self):
+        """
+        Prints where the time on the portal went.
+        """
+
+    def close(self):
+        """
+        Releases the backend's connection to the portal.
+        """
+
+
+class SeleniumSubmissionBackend(SubmissionBackend):
+    """
+    This class submits through a logged-in Chrome session, filling the portal's forms like a user would.
+    """
+
+    def __init__(self, url: str, email: str, password: str, headless: bool = False, browser: BrowserSetup = None):
+        """
+        Initializes the SeleniumSubmissionBackend instance.
+
+        Parameters:
+        url (str): URL of the login page.
+        email (str): User's email address.
+        password (str): User's password.
+        headless (bool): Whether to run Chrome without a window (default is False).
+        browser (BrowserSetup): Browser session to reuse (default is None, which creates one; the browser
+                                itself only starts on first use).
+        """
+        self.browser = browser or BrowserSetup(url, email, password, headless=headless)
+        self.headless = headless
+        self._purchase_index = None
+
+    def login(self):
+        if not self.browser.started:
+            self.browser.start()
+
+    def create_purchase(self, row: pd.Series):
+        FormAutomation(self.browser, None).fill_row(row)
+
+    def has_purchase(self, row: pd.Series) -> bool | None:
+        if self._purchase_index is None:
+            self._purchase_index = PurchaseIndex(self.browser)
+        try:
+            return self._purchase_index.open_purchase(f"{row['New Filename']}.pdf")
+        finally:
+            # The lookup leaves a purchase's edit page open, while create_purchase fills the listing's form
+            self._purchase_index.return_to_listing()
+            self.browser.waits.purchase_form()
+
+    def upload_receipt(self, row: pd.Series, directory: str, destination_directory: str) -> bool:
+        if self._purchase_index is None:
+            self._purchase_index = PurchaseIndex(self.browser)
+        uploader = ReceiptUploader(self.browser, row.to_frame().T, directory, destination_directory,
+                                   self._purchase_index)
+        return uploader.search_and_upload_receipt().get(f"{row['New Filename']}.pdf") == 'uploaded'
+
+    def report(self):
+        if self.browser.started:
+            self.browser.waits.report()
+
+    def close(self):
+        # A windowed browser is left open (detached) for the user, as before
+        if self.headless:
+            self.browser.quit()
+
+
+class PortalPageParser(HTMLParser):
+    """
+    This class collects the forms of a portal page and the edit links around its camera icons.
+    """
+
+    def __init__(self):
+        """
+        Initializes the PortalPageParser instance.
+        """
+        super().__init__(convert_charrefs=True)
+        self.forms = []
+        self.edit_links = []
+        self._form = None
+        self._link = None
+        self._textarea = None
+        self._select = None
+        self._option = None
+
+    def handle_starttag(self, tag: str, attrs: list):
+        attrs = dict(attrs)
+        if tag == 'form':
+            self._form = {'action': attrs.get('action', ''), 'method': attrs.get('method', 'get').lower(),
+                          'fields': {}, 'buttons': set(), 'options': {}}
+            self.forms.append(self._form)
+        elif tag == 'a':
+            self._link = attrs.get('href')
+        elif tag == 'img' and self._link and (attrs.get('src') or '').split('/')[-1] == 'camera.png':
+            self.edit_links.append(self._link)
+        elif tag == 'option' and self._select is not None:
+            self._end_option()
+            self._option = {'value': attrs.get('value'), 'label': '', 'selected': 'selected' in attrs}
+        elif self._form is None or not attrs.get('name'):
+            return
+        elif tag == 'button' or (tag == 'input' and attrs.get('type') == 'submit'):
+            self._form['buttons'].add(attrs['name'])
+        elif tag == 'input' and attrs.get('type') != 'file':
+            self._form['fields'][attrs['name']] = attrs.get('value', '')
+        elif tag == 'textarea':
+            self._textarea = attrs['name']
+            self._form['fields'][self._textarea] = ''
+        elif tag == 'select':
+            self._select = attrs['name']
+            self._form['fields'].setdefault(self._select, None)
+            self._form['options'].setdefault(self._select, {})
+
+    def _end_option(self):
+        """
+        Records the option being read, whose closing tag is optional, under its select.
+
+        An option without a value attribute submits its label, as in a browser; the first or selected option is
+        the select's value.
+        """
+        if self._option is None:
+            return
+        label = ' '.join(self._option['label'].split())
+        value = self._option['value'] if self._option['value'] is not None else label
+        self._form['options'][self._select][label] = value
+        if self._option['selected'] or self._form['fields'][self._select] is None:
+            self._form['fields'][self._select] = value
+        self._option = None
+
+    def handle_endtag(self, tag: str):
+        if tag == 'form':
+            self._form = None
+        elif tag == 'a':
+            self._link = None
+        elif tag == 'textarea':
+            self._textarea = None
+        elif tag == 'option':
+            self._end_option()
+        elif tag == 'select':
+            self._end_option()
+            self._select = None
+
+    def handle_data(self, data: str):
+        if self._option is not None:
+            self._option['label'] += data
+        elif self._textarea is not None:
+            self._form['fields'][self._textarea] += data
+
+    def find_form(self, name: str) -> dict | None:
+        """
+        Gets the first form with a field or button of the given name.
+
+        Parameters:
+        name (str): Field or button name.
+
+        Returns:
+        dict | None: Action, method, fields, buttons and select options (label to value) of the form, or None if
+                     there is no such form.
+        """
+        return next((form for form in self.forms if name in form['fields'] or name in form['buttons']), None)
+
+
+class HTTPSubmissionBackend(SubmissionBackend):
+    """
+    This class submits by posting the portal's forms directly over one pooled keep-alive HTTP session,
+    after logging in once, without rendering any page. It uses the same field names as the forms
+    FormAutomation fills in.
+    """
+
+    def __init__(self, url: str, email: str, password: str, pool_size: int = 4, timeout: float = 30,
+                 session_store: PortalSessionStore = None):
+        """
+        Initializes the HTTPSubmissionBackend instance.
+
+        Parameters:
+        url (str): URL of the login page.
+        email (str): User's email address.
+        password (str): User's password.
+        pool_size (int): Most keep-alive connections kept per host (default is 4).
+        timeout (float): Timeout in seconds of each request (default is 30).
+        session_store (PortalSessionStore): Store of saved sessions (default is None, which uses the default file).
+        """
+        self.url = url
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.session_store = session_store or PortalSessionStore()
+        self.session_restored = False
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.listing_url = None
+        self.listing = None
+        self.known_links = set()
+        self.purchase_links = {}
+        self.request_count = 0
+        self.request_seconds = 0.0
+
+    def _request(self, method: str, url: str, **kwargs) -> tuple[requests.Response, PortalPageParser]:
+        """
+        Sends a request, following redirects, and parses the resulting page.
+
+        Parameters:
+        method (str): HTTP method.
+        url (str): URL to request.
+        **kwargs: Further arguments of requests.Session.request.
+
+        Returns:
+        tuple[requests.Response, PortalPageParser]: Response and its parsed page.
+
+        Raises:
+        requests.HTTPError: If the portal answers with an error status.
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        finally:
+            self.request_count += 1
+            self.request_seconds += time.perf_counter() - start
+            instrumentation.count('http_requests')
+        response.raise_for_status()
+        page = PortalPageParser()
+        page.feed(response.text)
+        return response, page
+
+    def _post_form(self, base_url: str, form: dict, data: dict, **kwargs) -> tuple[requests.Response, PortalPageParser]:
+        """
+        Submits a form with its current values overridden by the given data.
+
+        Parameters:
+        base_url (str): URL of the page holding the form.
+        form (dict): Form, as found by PortalPageParser.find_form.
+        data (dict): Values to submit, including the submit button.
+        **kwargs: Further arguments of requests.Session.request, e.g. files.
+
+        Returns:
+        tuple[requests.Response, PortalPageParser]: Response and its parsed page.
+        """
+        values = {name: value for name, value in form['fields'].items() if value is not None}
+        values.update(data)
+        return self._request(form['method'].upper(), urljoin(base_url, form['action']), data=values, **kwargs)
+
+    def restore_session(self) -> bool:
+        """
+        Loads the saved session cookies and probes the post-login page with them.
+
+        Returns:
+        bool: True if the portal accepted the saved session, False if the user has to log in.
+        """
+        session = self.session_store.load(self.url, self.email)
+        if session is None:
+            return False
+        for cookie in session['cookies']:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain') or '',
+                                     path=cookie.get('path') or '/', secure=bool(cookie.get('secure')),
+                                     expires=cookie.get('expiry'))
+        response, page = self._request('GET', session['landing_url'])
+        if page.find_form('login_email') is None:
+            instrumentation.count('session_restores')
+            self.listing_url = response.url
+            self._update_listing(page)
+            return True
+        self.session.cookies.clear()
+        self.session_store.clear(self.url, self.email)
+        return False
+
+    def login(self):
+        """
+        Logs in the user, unless a saved session is still valid, and loads the purchase listing the portal lands on.
+
+        Raises:
+        RuntimeError: If the portal does not accept the credentials.
+        """
+        self.session_restored = self.restore_session()
+        if self.session_restored:
+            return
+        instrumentation.count('portal_logins')
+        response, page = self._request('GET', self.url)
+        login_form = page.find_form('login_email')
+        if login_form is None:
+            raise RuntimeError(f"No login form at {self.url}.")
+        response, page = self._post_form(response.url, login_form, {
+            'login_email': self.email, 'login_pass': self.password, 'login': ''})
+        if page.find_form('login_email') is not None:
+            raise RuntimeError("The portal did not accept the login.")
+        self.session_store.save(self.url, self.email, [
+            {'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+             'secure': cookie.secure, 'httpOnly': cookie.has_nonstandard_attr('HttpOnly'), 'expiry': cookie.expires}
+            for cookie in self.session.cookies], response.url)
+        self.listing_url = response.url
+        self._update_listing(page)
+
+    def _update_listing(self, page: PortalPageParser) -> list[str]:
+        """
+        Stores a freshly loaded purchase listing.
+
+        Parameters:
+        page (PortalPageParser): Parsed listing page.
+
+        Returns:
+        list[str]: Edit links that were not on the listing before.
+        """
+        self.listing = page
+        links = [urljoin(self.listing_url, link) for link in page.edit_links]
+        new_links = [link for link in links if link not in self.known_links]
+        self.known_links.update(links)
+        return new_links
+
+    @staticmethod
+    def _option_value(form: dict, name: str, label: str) -> str:
+        """
+        Gets the value a select submits for the option with the given label, as a browser would.
+
+        Parameters:
+        form (dict): Form, as found by PortalPageParser.find_form.
+        name (str): Name of the select.
+        label (str): Visible text of the option, as chosen in FormAutomation.
+
+        Returns:
+        str: Value of the option.
+
+        Raises:
+        ValueError: If the select has no option with this label.
+        """
+        options = form['options'].get(name, {})
+        if label not in options:
+            raise ValueError(f"'{label}' is not an option of '{name}' on the portal; expected one of {list(options)}.")
+        return options[label]
+
+    def create_purchase(self, row: pd.Series):
+        if self.listing is None:
+            self.login()
+        purchase_form = self.listing.find_form('create_purchase')
+        if purchase_form is None:
+            raise RuntimeError("No new purchase form on the purchase listing.")
+        note = f"{row['New Filename']}.pdf"
+        response, page = self._post_form(self.listing_url, purchase_form, {
+            'datepicker': row['Date'],
+            'provider': row['Provider'],
+            'description': row['Type'],
+            'amount': row['Amount'],
+            'pmt_method': self._option_value(purchase_form, 'pmt_method', row['Payment Method']),
+            'reimbursed_amount': row['Amount'] if row['Payment Method'] == "HSA Account" else 0,
+            'category': self._option_value(purchase_form, 'category', row['Category']),
+            'notes': note,
+            'create_purchase': ''
+        })
+        if page.find_form('create_purchase') is not None:
+            new_links = self._update_listing(page)
+            if len(new_links) == 1:
+                self.purchase_links[note] = new_links[0]
+
+    def find_purchase(self, note: str) -> str | None:
+        """
+        Finds the edit page of the purchase with the given note, reading unknown purchases' notes as needed.
+
+        Parameters:
+        note (str): Note of the purchase, i.e. the receipt filename.
+
+        Returns:
+        str | None: URL of the purchase's edit page, or None if no purchase has this note.
+        """
+        if note in self.purchase_links:
+            return self.purchase_links[note]
+        if self.listing is None:
+            self.login()
+        else:
+            self._update_listing(self._request('GET', self.listing_url)[1])
+        read_links = set(self.purchase_links.values())
+        for link in [urljoin(self.listing_url, link) for link in self.listing.edit_links]:
+            if link in read_links:
+                continue
+            update_form = self._request('GET', link)[1].find_form('update_purchase')
+            read_note = update_form['fields'].get('notes', '').strip() if update_form else ''
+            self.purchase_links.setdefault(read_note, link)
+            if read_note == note:
+                return link
+        return None
+
+    def has_purchase(self, row: pd.Series) -> bool | None:
+        return self.find_purchase(f"{row['New Filename']}.pdf") is not None
+
+    def upload_receipt(self, row: pd.Series, directory: str, destination_directory: str) -> bool:
+        note = f"{row['New Filename']}.pdf"
+        edit_url = self.find_purchase(note)
+        if edit_url is None:
+            return False
+        response, page = self._request('GET', edit_url)
+        update_form = page.find_form('update_purchase')
+        if update_form is None or update_form['fields'].get('notes', '').strip() != note:
+            self.purchase_links.pop(note, None)
+            return False
+        upload_form = page.find_form('upload_image')
+        if upload_form is None:
+            return False
+        with open(os.path.join(directory, note), 'rb') as receipt_file:
+            response, page = self._post_form(response.url, upload_form, {
+                'img_description': "This is a receipt PDF.", 'upload_image': ''},
+                files={'image': (note, receipt_file, 'application/pdf')})
+        update_form = page.find_form('update_purchase') or update_form
+        self._post_form(response.url, update_form, {'update_purchase': ''})
+        shutil.move(os.path.join(directory, note), os.path.join(destination_directory, note))
+        return True
+
+    def report(self):
+        mean = self.request_seconds / self.request_count if self.request_count else 0.0
+        print(f"{self.request_count} portal requests, {self.request_seconds:.2f} s in total, {mean:.3f} s on average.")
+
+    def close(self):
+        self.session.close()
+
+
+def create_backend(name: str, url: str, email: str, password: str) -> SubmissionBackend:
+    """
+    Creates a submission backend by name.
+
+    Parameters:
+    name (str): 'selenium' or 'http'.
+    url (str): URL of the login page.
+    email (str): User's email address.
+    password (str): User's password.
+
+    Returns:
+    SubmissionBackend: The backend.
+
+    Raises:
+    ValueError: If the name is unknown.
+    """
+    if name == 'selenium':
+        return SeleniumSubmissionBackend(url, email, password)
+    if name == 'http':
+        return HTTPSubmissionBackend(url, email, password)
+    raise ValueError(f"Unknown submission backend '{name}'.")
@@ -0,0 +1,89 @@
+"""
+Shared fixtures of the tests, which run the automation against a local MockPortal.
+"""
+
+import os
+import shutil
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook  # noqa: E402
+from mock_portal import MockPortal  # noqa: E402
+from portal_session_store import PortalSessionStore  # noqa: E402
+
+LEDGER_COLUMNS = ['Date', 'Provider', 'Amount', 'HSA Cash Balance', 'Attachments', 'Receipt no', 'In HSA?', 'Notes',
+                  'New Filename', 'Type', 'Category', 'Payment Method']
+
+CHROME_BINARIES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+
+
+@pytest.fixture(autouse=True)
+def session_store(tmp_path, monkeypatch) -> PortalSessionStore:
+    """
+    Keeps the saved portal sessions of a test in its temporary directory instead of the user's home.
+    """
+    monkeypatch.setattr(PortalSessionStore, 'default_path', str(tmp_path / "portal_session.json"))
+    return PortalSessionStore()
+
+
+@pytest.fixture
+def portal():
+    """
+    Serves a MockPortal on a free local port for the duration of a test.
+    """
+    with MockPortal() as mock_portal:
+        yield mock_portal
+
+
+@pytest.fixture
+def chrome():
+    """
+    Skips a test that drives Chrome when no Chrome is installed.
+    """
+    if not any(shutil.which(binary) for binary in CHROME_BINARIES):
+        pytest.skip("Chrome is not installed.")
+
+
+@pytest.fixture
+def inbox(tmp_path) -> str:
+    """
+    Creates a receipt folder with its Receipts archive.
+    """
+    directory = tmp_path / "inbox"
+    (directory / "Receipts").mkdir(parents=True)
+    return str(directory)
+
+
+@pytest.fixture
+def make_receipt(inbox):
+    """
+    Gets a function building a transaction in the form of a ledger row and writing its renamed receipt PDF
+    to the inbox.
+    """
+    def make(number: int, in_hsa: bool = True) -> dict:
+        amount = f"{number}.25"
+        transaction = {
+            'Date': f"03/{number % 28 + 1:02d}/2024", 'Provider': "CVS Pharmacy", 'Amount': amount,
+            'HSA Cash Balance': '-', 'Attachments': 'Y' if in_hsa else 'N', 'Receipt Number': f"R{number}",
+            'In HSA?': 'Y' if in_hsa else 'N', 'Notes': '', 'New Filename': f"R{number}_{amount}",
+            'Type': "Medical", 'Category': "Prescriptions", 'Payment Method': "HSA Account"}
+        with open(os.path.join(inbox, transaction['New Filename'] + '.pdf'), 'wb') as receipt_file:
+            receipt_file.write(b"%PDF-1.4\n% test receipt\n" + bytes(512))
+        return transaction
+    return make
+
+
+@pytest.fixture
+def ledger(tmp_path) -> str:
+    """
+    Writes an empty ledger with the real header row.
+    """
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "TransactionHistory (2)"
+    sheet.append(LEDGER_COLUMNS)
+    path = str(tmp_path / "HSA.xlsx")
+    workbook.save(path)
+    return path
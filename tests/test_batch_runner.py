@@ -0,0 +1,105 @@
+"""
+Tests of the headless batch run and its results file against the mock portal.
+"""
+
+import csv
+import json
+import os
+import pytest
+from batch_runner import BatchRunner
+from ledger_batch_writer import LedgerBatchWriter
+
+MANIFEST_COLUMNS = ['Filename', 'Date', 'Provider', 'Amount', 'Type', 'Category', 'Payment Method']
+
+
+def write_manifest(inbox: str, entries: list[dict]) -> str:
+    manifest_path = os.path.join(os.path.dirname(inbox), "manifest.csv")
+    with open(manifest_path, 'w', newline='', encoding='utf-8') as manifest_file:
+        writer = csv.DictWriter(manifest_file, MANIFEST_COLUMNS)
+        writer.writeheader()
+        writer.writerows(entries)
+    return manifest_path
+
+
+def write_receipts(inbox: str, count: int) -> list[dict]:
+    entries = []
+    for number in range(1, count + 1):
+        filename = f"scan{number}.pdf"
+        with open(os.path.join(inbox, filename), 'wb') as receipt_file:
+            receipt_file.write(b"%PDF-1.4\n% test receipt\n" + bytes(512))
+        entries.append({'Filename': filename, 'Date': f"03/0{number}/2024", 'Provider': "CVS Pharmacy",
+                        'Amount': f"{number}.50", 'Type': "Medical", 'Category': "Prescriptions",
+                        'Payment Method': "HSA Account"})
+    return entries
+
+
+def read_results(results_path: str) -> dict:
+    with open(results_path, encoding='utf-8') as results_file:
+        return json.load(results_file)
+
+
+def create_runner(portal, inbox: str, ledger: str) -> BatchRunner:
+    return BatchRunner(inbox, ledger, portal.login_url, portal.email, portal.password, backend='http')
+
+
+def test_batch_submits_every_entry(portal, inbox, ledger):
+    manifest_path = write_manifest(inbox, write_receipts(inbox, 2))
+    results_path = os.path.join(os.path.dirname(inbox), "results.json")
+
+    results = create_runner(portal, inbox, ledger).run(manifest_path, results_path)
+
+    assert read_results(results_path) == results
+    assert results['status'] == 'completed'
+    assert [entry['uploaded'] for entry in results['entries']] == [True, True]
+    assert len(portal.purchases) == 2
+
+
+def test_failed_submission_still_writes_the_results(monkeypatch, portal, inbox, ledger):
+    manifest_path = write_manifest(inbox, write_receipts(inbox, 2))
+    results_path = os.path.join(os.path.dirname(inbox), "results.json")
+
+    def fail_submit(self, transactions):
+        raise ConnectionError("portal unreachable")
+
+    monkeypatch.setattr(BatchRunner, 'submit', fail_submit)
+    with pytest.raises(ConnectionError):
+        create_runner(portal, inbox, ledger).run(manifest_path, results_path)
+
+    results = read_results(results_path)
+    assert results['status'] == 'failed'
+    assert results['error'] == "portal unreachable"
+    assert [(entry['renamed'], entry['ledger'], entry['uploaded']) for entry in results['entries']] == \
+        [(True, True, False), (True, True, False)]
+
+
+def test_failed_ledger_save_still_writes_the_results(monkeypatch, portal, inbox, ledger):
+    manifest_path = write_manifest(inbox, write_receipts(inbox, 2))
+    results_path = os.path.join(os.path.dirname(inbox), "results.json")
+
+    def fail_flush(self):
+        raise PermissionError("workbook is open in Excel")
+
+    monkeypatch.setattr(LedgerBatchWriter, 'flush', fail_flush)
+    with pytest.raises(PermissionError):
+        create_runner(portal, inbox, ledger).run(manifest_path, results_path)
+
+    results = read_results(results_path)
+    assert results['status'] == 'failed'
+    assert results['error'] == "workbook is open in Excel"
+    assert [entry['ledger'] for entry in results['entries']] == [False, False]
+    assert portal.purchases == []
+
+
+def test_invalid_manifest_reports_quietly(capsys, portal, inbox, ledger):
+    entries = write_receipts(inbox, 2)
+    entries[0]['Date'] = "2024-03-01"
+    entries[1]['Amount'] = "1.505"
+    manifest_path = write_manifest(inbox, entries)
+    results_path = os.path.join(os.path.dirname(inbox), "results.json")
+
+    results = create_runner(portal, inbox, ledger).run(manifest_path, results_path)
+
+    assert results['status'] == 'invalid'
+    assert results['errors'] == ["Entry 1: invalid date '2024-03-01', expected MM/DD/YYYY.",
+                                 "Entry 2: invalid amount '1.505', expected a number with at most two decimals."]
+    assert "DD/MM/YYYY" not in capsys.readouterr().out
@@ -0,0 +1,141 @@
+"""
+Tests of submitting transactions over a pool of browser sessions against the mock portal.
+"""
+
+import os
+import threading
+import time
+import pandas as pd
+import pytest
+import browser_session_pool
+from browser_session_pool import BrowserSessionPool
+from form_automation import FormAutomation
+from receipt_uploader import ReceiptUploader
+
+
+def count_in_flight(monkeypatch, owner, name: str, counter: dict):
+    """
+    Wraps a method so counter['most'] holds the most calls of the counted methods running at the same time.
+    """
+    original = getattr(owner, name)
+
+    def wrapper(*args, **kwargs):
+        with counter['lock']:
+            counter['current'] += 1
+            counter['most'] = max(counter['most'], counter['current'])
+        try:
+            return original(*args, **kwargs)
+        finally:
+            with counter['lock']:
+                counter['current'] -= 1
+
+    monkeypatch.setattr(owner, name, wrapper)
+
+
+class StubSession:
+    """
+    Stands in for a logged-in BrowserSetup.
+    """
+
+    def quit(self):
+        pass
+
+
+class StubFormAutomation:
+    """
+    Stands in for FormAutomation, taking a moment to create each purchase.
+    """
+
+    def __init__(self, browser, df):
+        self.browser = browser
+
+    def fill_row(self, row):
+        time.sleep(0.02)
+
+
+class StubReceiptUploader:
+    """
+    Stands in for ReceiptUploader, reporting the purchases listed in not_found as missing from the portal.
+    """
+
+    not_found = set()
+
+    def __init__(self, browser, df, directory, destination_directory, purchase_index=None):
+        self.df = df
+
+    def search_and_upload_receipt(self) -> dict:
+        time.sleep(0.02)
+        return {f"{row['New Filename']}.pdf": 'not found' if row['Receipt Number'] in self.not_found else 'uploaded'
+                for index, row in self.df.iterrows()}
+
+
+@pytest.fixture
+def stub_portal(monkeypatch) -> dict:
+    """
+    Replaces the portal automation of the pool with stubs and counts the portal actions in flight.
+    """
+    counter = {'lock': threading.Lock(), 'current': 0, 'most': 0}
+    monkeypatch.setattr(browser_session_pool, 'FormAutomation', StubFormAutomation)
+    monkeypatch.setattr(browser_session_pool, 'ReceiptUploader', StubReceiptUploader)
+    monkeypatch.setattr(browser_session_pool, 'PurchaseIndex', lambda browser: None)
+    count_in_flight(monkeypatch, StubFormAutomation, 'fill_row', counter)
+    count_in_flight(monkeypatch, StubReceiptUploader, 'search_and_upload_receipt', counter)
+    return counter
+
+
+@pytest.mark.parametrize('max_concurrency, cap', [(2, 2), (None, BrowserSessionPool.default_max_concurrency)])
+def test_submit_with_stub_sessions(monkeypatch, stub_portal, inbox, make_receipt, max_concurrency, cap):
+    monkeypatch.setattr(StubReceiptUploader, 'not_found', {'R4'})
+    sessions = []
+    transactions = [make_receipt(number) for number in range(1, 10)]
+    df = pd.DataFrame(transactions, index=[40, 3, 17, 8, 25, 1, 12, 9, 30])
+
+    def start_session() -> StubSession:
+        session = StubSession()
+        sessions.append(session)
+        return session
+
+    with BrowserSessionPool("http://portal", "user", "secret", size=4, max_concurrency=max_concurrency,
+                            session_factory=start_session) as pool:
+        results = pool.submit(df, inbox, os.path.join(inbox, "Receipts"))
+
+    assert len(sessions) == 4
+    assert [result['index'] for result in results] == list(df.index)
+    assert [result['worker'] for result in results] == [position % 4 for position in range(len(df))]
+    assert all(result['purchase_created'] for result in results)
+    assert [result['uploaded'] for result in results] == [number != 4 for number in range(1, 10)]
+    assert [result['error'] for result in results] == [
+        "Purchase not found on the portal." if number == 4 else None for number in range(1, 10)]
+    assert stub_portal['most'] == cap
+
+
+def test_default_concurrency_is_capped_below_the_pool_size(portal):
+    pool = BrowserSessionPool(portal.login_url, portal.email, portal.password, size=4)
+    assert pool.max_concurrency == BrowserSessionPool.default_max_concurrency < pool.size
+    assert BrowserSessionPool(portal.login_url, portal.email, portal.password, size=1).max_concurrency == 1
+    assert BrowserSessionPool(portal.login_url, portal.email, portal.password, size=4,
+                              max_concurrency=3).max_concurrency == 3
+
+
+def test_submit_over_several_sessions(chrome, monkeypatch, portal, inbox, make_receipt):
+    counter = {'lock': threading.Lock(), 'current': 0, 'most': 0}
+    count_in_flight(monkeypatch, FormAutomation, 'fill_row', counter)
+    count_in_flight(monkeypatch, ReceiptUploader, 'search_and_upload_receipt', counter)
+    transactions = [make_receipt(number) for number in range(1, 8)]
+    # A shuffled index checks the results follow the rows, not the index values or the shards
+    df = pd.DataFrame(transactions, index=[40, 3, 17, 8, 25, 1, 12])
+    destination = os.path.join(inbox, "Receipts")
+
+    with BrowserSessionPool(portal.login_url, portal.email, portal.password, size=3,
+                            max_concurrency=2) as pool:
+        results = pool.submit(df, inbox, destination)
+
+    assert [result['index'] for result in results] == list(df.index)
+    assert [result['worker'] for result in results] == [position % 3 for position in range(len(df))]
+    assert all(result['purchase_created'] and result['uploaded'] for result in results)
+    assert [result['error'] for result in results] == [None] * len(df)
+    assert 1 <= counter['most'] <= 2
+    notes = sorted(purchase['fields']['notes'] for purchase in portal.purchases)
+    assert notes == sorted(f"{transaction['New Filename']}.pdf" for transaction in transactions)
+    assert [len(purchase['images']) for purchase in portal.purchases] == [1] * len(df)
+    assert sorted(os.listdir(destination)) == notes
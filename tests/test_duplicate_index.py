@@ -0,0 +1,52 @@
+"""
+Tests of flagging duplicate receipts against the inbox, the archive and the ledger.
+"""
+
+import os
+import fitz
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from duplicate_index import DuplicateIndex
+from pdf_cache import PDFCache
+from receipt_field_extractor import ReceiptFieldExtractor
+
+
+@pytest.fixture
+def duplicate_index(tmp_path, inbox, ledger) -> DuplicateIndex:
+    workbook = load_workbook(ledger)
+    sheet = workbook.active
+    # Uploaded row R1 and row R2 still waiting for its receipt, in ledger column order
+    sheet.append(["03/05/2024", "CVS Pharmacy", 12.5, '-', "Y", "R1", "Y", '', "R1_12.5", "Medical",
+                  "Prescriptions", "HSA Account"])
+    sheet.append(["04/09/2024", "Walgreens", 30.0, '-', "N", "R2", "N", '', "R2_30.0", "Medical",
+                  "Prescriptions", "HSA Account"])
+    workbook.save(ledger)
+    field_extractor = ReceiptFieldExtractor()
+    field_extractor.learn_from_ledger(pd.DataFrame({'Provider': ["CVS Pharmacy", "Walgreens"]}))
+    return DuplicateIndex.for_inbox(inbox, ledger, PDFCache(str(tmp_path / "cache.sqlite")), field_extractor)
+
+
+def write_receipt(path: str, provider: str, date: str, amount: str):
+    document = fitz.open()
+    document.new_page().insert_text((72, 72), f"{provider}\nDate: {date}\nTOTAL ${amount}")
+    document.save(path)
+    document.close()
+
+
+def test_receipt_of_a_row_without_receipt_is_not_a_duplicate(duplicate_index, inbox):
+    write_receipt(os.path.join(inbox, "scan.pdf"), "Walgreens", "04/09/2024", "30.00")
+
+    duplicates = duplicate_index.check(os.path.join(inbox, "scan.pdf"))
+
+    assert duplicates == [('awaiting receipt', "ledger row R2")]
+    assert DuplicateIndex.awaited(duplicates)
+
+
+def test_receipt_of_an_uploaded_row_is_a_duplicate(duplicate_index, inbox):
+    write_receipt(os.path.join(inbox, "scan.pdf"), "CVS Pharmacy", "03/05/2024", "12.50")
+
+    duplicates = duplicate_index.check(os.path.join(inbox, "scan.pdf"))
+
+    assert duplicates == [('same transaction', "ledger row R1")]
+    assert not DuplicateIndex.awaited(duplicates)
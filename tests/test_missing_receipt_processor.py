@@ -0,0 +1,80 @@
+"""
+Tests of matching missing receipts to inbox PDFs, with a stub in place of the portal uploader.
+"""
+
+import os
+import pandas as pd
+import pytest
+import missing_receipt_processor
+from missing_receipt_processor import MissingReceiptProcessor
+from pdf_cache import PDFCache
+
+
+class StubUploader:
+    """
+    Stands in for ReceiptUploader, reporting the purchases listed in not_found as missing from the portal.
+    """
+
+    not_found = set()
+
+    def __init__(self, browser, df, directory, destination_directory, purchase_index=None):
+        self.df = df
+
+    def search_and_upload_receipt(self) -> dict:
+        return {f"{row['New Filename']}.pdf": 'not found' if row['Receipt no'] in self.not_found else 'uploaded'
+                for index, row in self.df.iterrows()}
+
+
+@pytest.fixture
+def marked() -> list:
+    """
+    Collects the receipt numbers the processor marks as uploaded in the ledger.
+    """
+    return []
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch, inbox, marked) -> MissingReceiptProcessor:
+    monkeypatch.setattr(PDFCache, 'default_path', str(tmp_path / "pdf_cache.sqlite"))
+    monkeypatch.setattr(missing_receipt_processor, 'ReceiptUploader', StubUploader)
+    df = pd.DataFrame({'Date': ["03/01/2024", "03/02/2024"], 'Provider': ["CVS Pharmacy", "Walgreens"],
+                       'Amount': ["12.5", "30.0"], 'Attachments': ["N", "N"], 'Receipt no': ["R7", "R8"]})
+    processor = MissingReceiptProcessor(df, str(tmp_path / "HSA.xlsx"), inbox, "http://portal", "user", "secret")
+    processor.filter_not_uploaded()
+    monkeypatch.setattr(processor, 'insert_into_cells', marked.extend)
+    return processor
+
+
+def test_upload_matches_marks_only_uploaded_receipts(monkeypatch, capsys, processor, marked, inbox):
+    monkeypatch.setattr(StubUploader, 'not_found', {'R8'})
+    for filename in ("scan_a.pdf", "scan_b.pdf"):
+        with open(os.path.join(inbox, filename), 'wb') as receipt_file:
+            receipt_file.write(b"%PDF-1.4\n")
+
+    uploaded = processor.upload_matches([(0, "scan_a.pdf", 0.9), (1, "scan_b.pdf", 0.8)])
+
+    assert uploaded == ["R7"]
+    assert marked == ["R7"]
+    assert "'R8_30.0.pdf' was renamed but not uploaded" in capsys.readouterr().out
+    assert sorted(name for name in os.listdir(inbox) if name.endswith('.pdf')) == ["R7_12.5.pdf", "R8_30.0.pdf"]
+
+
+@pytest.mark.parametrize('not_found', [set(), {'R8'}])
+def test_selected_receipt_is_marked_only_once_uploaded(monkeypatch, capsys, processor, marked, inbox, not_found):
+    monkeypatch.setattr(StubUploader, 'not_found', not_found)
+    with open(os.path.join(inbox, "scan_b.pdf"), 'wb') as receipt_file:
+        receipt_file.write(b"%PDF-1.4\n")
+    monkeypatch.setattr(processor, 'extract_inbox', lambda: [("scan_b.pdf", "Walgreens 30.00", {})])
+    processor.inbox_extractions = {"scan_b.pdf": None}
+    monkeypatch.setattr(missing_receipt_processor.PDFReceiptProcessor, 'display_pdf_info', lambda *args: {})
+    answers = iter(["1", "Y"])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+
+    processor.process_receipt_selection()
+
+    assert os.path.exists(os.path.join(inbox, "R8_30.0.pdf"))
+    if not_found:
+        assert marked == []
+        assert "'R8_30.0.pdf' was renamed but not uploaded" in capsys.readouterr().out
+    else:
+        assert marked == ["R8"]
@@ -0,0 +1,24 @@
+"""
+Tests of the on-disk cache of PDF extractions.
+"""
+
+import os
+from pdf_cache import PDFCache
+
+
+def test_prune_forgets_deleted_and_moved_files(tmp_path):
+    pdf_cache = PDFCache(str(tmp_path / "cache.sqlite"))
+    paths = []
+    for number in range(3):
+        path = tmp_path / f"receipt{number}.pdf"
+        path.write_bytes(b"%PDF-1.4\n" + bytes([number]) * 64)
+        pdf_cache.hash_file(str(path))
+        paths.append(str(path))
+    os.remove(paths[0])
+    os.rename(paths[1], str(tmp_path / "moved.pdf"))
+
+    assert pdf_cache.prune() == 2
+    assert pdf_cache.prune() == 0
+    stored = [row[0] for row in pdf_cache.connection.execute("SELECT path FROM file_hashes")]
+    assert stored == [os.path.abspath(paths[2])]
+    pdf_cache.close()
@@ -0,0 +1,51 @@
+"""
+Tests of resuming journaled receipts against the mock portal.
+"""
+
+import os
+import pandas as pd
+import pytest
+from browser_setup import BrowserSetup
+from ledger_batch_writer import LedgerBatchWriter
+from receipt_journal import ReceiptJournal
+from submission_backend import HTTPSubmissionBackend, SeleniumSubmissionBackend
+
+
+def create_backend(name: str, portal):
+    if name == 'selenium':
+        browser = BrowserSetup(portal.login_url, portal.email, portal.password, headless=True)
+        return SeleniumSubmissionBackend(portal.login_url, portal.email, portal.password, headless=True,
+                                         browser=browser)
+    return HTTPSubmissionBackend(portal.login_url, portal.email, portal.password)
+
+
+@pytest.mark.parametrize('backend_name', ['http', 'selenium'])
+def test_resume_after_purchase_started(backend_name, request, portal, ledger, inbox, make_receipt):
+    if backend_name == 'selenium':
+        request.getfixturevalue('chrome')
+    journal = ReceiptJournal(ledger + '.journal.jsonl')
+    created, started, fresh = make_receipt(1), make_receipt(2), make_receipt(3)
+    with LedgerBatchWriter(ledger, journal) as ledger_writer:
+        for transaction in (created, started, fresh):
+            journal.begin(transaction, "scan.pdf")
+            journal.record(transaction['Receipt Number'], 'renamed')
+            ledger_writer.add_transaction(transaction)
+    # The run stopped after creating the first purchase, before journaling it, and before creating the second
+    journal.record(created['Receipt Number'], 'purchase_started')
+    with HTTPSubmissionBackend(portal.login_url, portal.email, portal.password) as crashed_backend:
+        crashed_backend.create_purchase(pd.Series(created))
+    journal.record(started['Receipt Number'], 'purchase_started')
+
+    with create_backend(backend_name, portal) as backend:
+        try:
+            outcomes = ReceiptJournal(journal.journal_path).resume(inbox, ledger, backend)
+        finally:
+            if backend_name == 'selenium':
+                backend.browser.quit()
+
+    assert outcomes == {'R1': 'archived', 'R2': 'archived', 'R3': 'archived'}
+    notes = sorted(purchase['fields']['notes'] for purchase in portal.purchases)
+    assert notes == ["R1_1.25.pdf", "R2_2.25.pdf", "R3_3.25.pdf"]
+    assert [len(purchase['images']) for purchase in portal.purchases] == [1, 1, 1]
+    assert sorted(os.listdir(os.path.join(inbox, "Receipts"))) == notes
+    assert ReceiptJournal(journal.journal_path).pending() == {}
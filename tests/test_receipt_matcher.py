@@ -0,0 +1,52 @@
+"""
+Tests of assigning inbox PDFs to ledger rows from the score matrix.
+"""
+
+import itertools
+import numpy as np
+import pandas as pd
+from receipt_matcher import ReceiptMatcher
+
+
+def matcher_with_scores(scores: list[list[float]]) -> ReceiptMatcher:
+    rows = pd.DataFrame({'Date': [], 'Amount': [], 'Provider': []})
+    matcher = ReceiptMatcher(rows, [])
+    matcher.ledger_rows = pd.DataFrame({'Receipt no': [f"R{row}" for row in range(len(scores))]},
+                                       index=[10 + row for row in range(len(scores))])
+    matcher.filenames = [f"scan{column}.pdf" for column in range(len(scores[0]))]
+    matcher.scores = np.array(scores, dtype=float)
+    return matcher
+
+
+def test_assignment_maximizes_the_total_score():
+    # Taking the single best pair first would leave the second row without a receipt
+    summary = matcher_with_scores([[0.9, 0.8], [0.85, 0.0]]).assign()
+    assert summary == {'matched': [(10, "scan1.pdf", 0.8), (11, "scan0.pdf", 0.85)], 'unmatched': [],
+                       'ambiguous': []}
+
+
+def test_files_matched_to_other_rows_do_not_make_a_row_ambiguous():
+    summary = matcher_with_scores([[0.9, 0.88], [0.0, 0.95]]).assign()
+    assert summary['matched'] == [(10, "scan0.pdf", 0.9), (11, "scan1.pdf", 0.95)]
+    assert summary['ambiguous'] == []
+
+
+def test_close_free_candidates_are_ambiguous():
+    summary = matcher_with_scores([[0.88, 0.9, 0.2], [0.1, 0.0, 0.3]]).assign()
+    assert summary == {'matched': [], 'unmatched': [11], 'ambiguous': [(10, ["scan1.pdf", "scan0.pdf"])]}
+
+
+def test_best_assignment_matches_brute_force():
+    rng = np.random.default_rng(3)
+    for trial in range(200):
+        row_count, column_count = (int(size) for size in rng.integers(1, 6, 2))
+        weights = np.round(rng.random((row_count, column_count)), 2)
+        weights[rng.random((row_count, column_count)) < 0.3] = 0
+        pairs = ReceiptMatcher._best_assignment(weights)
+        assert len({row for row, column in pairs}) == len({column for row, column in pairs}) == len(pairs)
+        # Zero padding to a square matrix makes every assignment a permutation
+        size = max(row_count, column_count)
+        padded = np.zeros((size, size))
+        padded[:row_count, :column_count] = weights
+        best = max(padded[range(size), list(columns)].sum() for columns in itertools.permutations(range(size)))
+        assert np.isclose(sum(weights[row, column] for row, column in pairs), best)
@@ -0,0 +1,69 @@
+"""
+Tests of the submission backends against the mock portal.
+"""
+
+import os
+import pandas as pd
+import pytest
+from receipt_journal import ReceiptJournal
+from submission_backend import HTTPSubmissionBackend, SubmissionBackend
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SubmissionBackend()
+
+
+def test_http_backend_submits_end_to_end(portal, inbox, make_receipt):
+    transactions = [make_receipt(1), make_receipt(2, in_hsa=False), make_receipt(3)]
+    df = pd.DataFrame(transactions, index=[10, 11, 12])
+    destination_directory = os.path.join(inbox, "Receipts")
+
+    with HTTPSubmissionBackend(portal.login_url, portal.email, portal.password) as backend:
+        results = backend.submit(df, inbox, destination_directory)
+
+    assert [result['index'] for result in results] == [10, 11, 12]
+    assert [result['error'] for result in results] == [None, None, None]
+    assert [result['purchase_created'] for result in results] == [True, True, True]
+    assert [result['uploaded'] for result in results] == [True, False, True]
+    purchases = {purchase['fields']['notes']: purchase for purchase in portal.purchases}
+    assert sorted(purchases) == ["R1_1.25.pdf", "R2_2.25.pdf", "R3_3.25.pdf"]
+    assert purchases["R1_1.25.pdf"]['fields']['provider'] == "CVS Pharmacy"
+    assert purchases["R1_1.25.pdf"]['fields']['amount'] == "1.25"
+    # Selects submit their option values, which differ from the labels on the mock portal
+    assert purchases["R1_1.25.pdf"]['fields']['pmt_method'] == "hsa"
+    assert purchases["R1_1.25.pdf"]['fields']['category'] == "rx"
+    assert [image['filename'] for image in purchases["R1_1.25.pdf"]['images']] == ["R1_1.25.pdf"]
+    assert purchases["R2_2.25.pdf"]['images'] == []
+    assert [image['filename'] for image in purchases["R3_3.25.pdf"]['images']] == ["R3_3.25.pdf"]
+    # Uploaded receipts are moved to the archive, the one kept out of the HSA stays in the inbox
+    assert sorted(os.listdir(destination_directory)) == ["R1_1.25.pdf", "R3_3.25.pdf"]
+    assert os.path.exists(os.path.join(inbox, "R2_2.25.pdf"))
+
+
+def test_http_backend_rejects_unknown_option_labels(portal, inbox, make_receipt):
+    transaction = make_receipt(5)
+    transaction['Category'] = "Chiropractic"
+
+    with HTTPSubmissionBackend(portal.login_url, portal.email, portal.password) as backend:
+        results = backend.submit(pd.DataFrame([transaction]), inbox, os.path.join(inbox, "Receipts"))
+
+    assert not results[0]['purchase_created']
+    assert "'Chiropractic' is not an option of 'category'" in results[0]['error']
+    assert portal.purchases == []
+
+
+def test_http_backend_skips_journaled_steps(portal, ledger, inbox, make_receipt):
+    transaction = make_receipt(4)
+    journal = ReceiptJournal(ledger + '.journal.jsonl')
+    journal.begin(transaction, "scan.pdf")
+    df = pd.DataFrame([transaction])
+
+    with HTTPSubmissionBackend(portal.login_url, portal.email, portal.password) as backend:
+        first = backend.submit(df, inbox, os.path.join(inbox, "Receipts"), journal=journal)
+        second = backend.submit(df, inbox, os.path.join(inbox, "Receipts"), journal=journal)
+
+    assert first[0]['uploaded'] and second[0]['uploaded']
+    assert len(portal.purchases) == 1
+    assert len(portal.purchases[0]['images']) == 1
+    assert journal.reached("R4", 'archived')
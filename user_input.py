@@ -3,7 +3,7 @@ Module to handle user inputs for receipt details.
 """
 
 import re
-import pandas as pd
+from receipt_number_allocator import ReceiptNumberAllocator
 
 
 class UserInput:
@@ -11,7 +11,12 @@ class UserInput:
     This class handles user inputs and validation for receipt details.
     """
 
-    def __init__(self, filename: str, transaction_directory: str, receipt_count: int, is_receipt: bool):
+    type_choices = ["Medical", "Other"]
+    category_choices = ["Prescriptions", "Therapy / counseling", "Doctor", "Dental", "Lab / Tests", "Vision"]
+    payment_method_choices = ["HSA Account", "Credit"]
+
+    def __init__(self, filename: str, transaction_directory: str, receipt_count: int, is_receipt: bool,
+                 allocator: ReceiptNumberAllocator = None):
         """
         Initializes the UserInput instance.
 
@@ -20,6 +25,8 @@ class UserInput:
         transaction_directory (str): Directory containing the transaction Excel file.
         receipt_count (int): Number of receipts processed so far.
         is_receipt (bool): Whether the input is for a receipt.
+        allocator (ReceiptNumberAllocator): Receipt number allocator (default is None, which uses the one
+                                            shared for the transaction Excel file).
         """
         self.amount = None
         self.provider = None
@@ -28,6 +35,7 @@ class UserInput:
         self.receipt_count = receipt_count
         self.transaction_directory = transaction_directory
         self.is_receipt = is_receipt
+        self.allocator = allocator or ReceiptNumberAllocator.for_workbook(transaction_directory)
 
     def get_next_receipt_number(self) -> tuple[int, int]:
         """
@@ -36,16 +44,42 @@ class UserInput:
         Returns:
         tuple[int, int]: Next numbers for F and R receipts.
         """
-        current_file_df = pd.read_excel(self.transaction_directory)
-        receipt_list = list(current_file_df['Receipt no'])
-        r_values = [int(re.findall(r'\d+', item)[0]) for item in receipt_list if 'R' in item]
-        f_values = [int(re.findall(r'\d+', item)[0]) for item in receipt_list if 'F' in item]
-        f_next = max(f_values) if f_values else 0
-        r_next = max(r_values) if r_values else 0
-        return f_next + 1, r_next + 1
+        return self.allocator.next_numbers()
+
+    @staticmethod
+    def date_error(date_str: str) -> str | None:
+        """
+        Checks the date format without printing anything.
+
+        Parameters:
+        date_str (str): Date string to check.
+
+        Returns:
+        str | None: Error message, or None if the date is valid.
+        """
+        date_pattern = r'\b(\d{2}/\d{2}/\d{4})\b'
+        if re.match(date_pattern, date_str):
+            return None
+        return f"invalid date '{date_str}', expected MM/DD/YYYY"
 
     @staticmethod
-    def _validate_date(date_str: str) -> bool:
+    def amount_error(amount_str: str) -> str | None:
+        """
+        Checks the amount format without printing anything.
+
+        Parameters:
+        amount_str (str): Amount string to check.
+
+        Returns:
+        str | None: Error message, or None if the amount is valid.
+        """
+        amount_pattern = r'^\d+(\.\d{1,2})?$'
+        if re.match(amount_pattern, amount_str):
+            return None
+        return f"invalid amount '{amount_str}', expected a number with at most two decimals"
+
+    @classmethod
+    def _validate_date(cls, date_str: str) -> bool:
         """
         Validates the date format.
 
@@ -55,15 +89,14 @@ class UserInput:
         Returns:
         bool: True if the date is valid, False otherwise.
         """
-        date_pattern = r'\b(\d{2}/\d{2}/\d{4})\b'
-        if re.match(date_pattern, date_str):
+        if cls.date_error(date_str) is None:
             return True
         else:
             print("Invalid date format. Please enter the date in DD/MM/YYYY format.")
             return False
 
-    @staticmethod
-    def _validate_amount(amount_str: str) -> bool:
+    @classmethod
+    def _validate_amount(cls, amount_str: str) -> bool:
         """
         Validates the amount format.
 
@@ -73,8 +106,7 @@ class UserInput:
         Returns:
         bool: True if the amount is valid, False otherwise.
         """
-        amount_pattern = r'^\d+(\.\d{1,2})?$'
-        if re.match(amount_pattern, amount_str):
+        if cls.amount_error(amount_str) is None:
             return True
         else:
             print("Invalid amount format. Please enter a valid number.")
@@ -105,27 +137,47 @@ class UserInput:
             except ValueError:
                 print("That's not a valid choice. Please choose again.")
 
-    def get_user_inputs(self) -> dict:
+    @staticmethod
+    def _input_with_suggestion(prompt: str, suggestion=None) -> str:
+        """
+        Prompts the user for a value, accepting a proposed value when the user just presses Enter.
+
+        Parameters:
+        prompt (str): Prompt message for the user.
+        suggestion (FieldProposal): Proposed value (default is None, which prompts without a default).
+
+        Returns:
+        str: Value entered or accepted by the user.
+        """
+        if suggestion is None:
+            return input(f"{prompt}: ").strip()
+        value = input(f"{prompt} [{suggestion.value}, {suggestion.confidence:.0%} sure]: ").strip()
+        return value or suggestion.value
+
+    def get_user_inputs(self, suggestions: dict = None) -> dict:
         """
         Collects and validates user inputs for the receipt details.
 
+        Parameters:
+        suggestions (dict): Proposed 'Date', 'Provider' and 'Amount' values from ReceiptFieldExtractor
+                            that the user can accept by pressing Enter (default is None).
+
         Returns:
         dict: Dictionary containing the user inputs.
         """
+        suggestions = suggestions or {}
         valid_date = False
         valid_amount = False
         while not valid_date:
-            self.date = input("Enter the date (DD/MM/YYYY): ").strip()
+            self.date = self._input_with_suggestion("Enter the date (DD/MM/YYYY)", suggestions.get('Date'))
             valid_date = self._validate_date(self.date)
-        self.provider = input("Enter the provider: ").strip()
+        self.provider = self._input_with_suggestion("Enter the provider", suggestions.get('Provider'))
         while not valid_amount:
-            self.amount = input("Enter the amount: ").strip()
+            self.amount = self._input_with_suggestion("Enter the amount", suggestions.get('Amount'))
             valid_amount = self._validate_amount(self.amount)
-        type_choice = self._get_user_choice("Select the type:", ["Medical", "Other"])
-        category_choice = self._get_user_choice("Select the category:",
-                                                ["Prescriptions", "Therapy / counseling", "Doctor", "Dental",
-                                                 "Lab / Tests", "Vision"])
-        payment_method_choice = self._get_user_choice("Select the payment method:", ["HSA Account", "Credit"])
+        type_choice = self._get_user_choice("Select the type:", self.type_choices)
+        category_choice = self._get_user_choice("Select the category:", self.category_choices)
+        payment_method_choice = self._get_user_choice("Select the payment method:", self.payment_method_choices)
         f_next, r_next = self.get_next_receipt_number()
         if payment_method_choice == "HSA Account":
             receipt_number = f"R{r_next}"
@@ -141,10 +193,28 @@ class UserInput:
                 break
             else:
                 print("Invalid input. Please enter 1 for Yes or 0 for No.")
+        self.allocator.reserve(receipt_number)
+        notes = input("NOTES: ").strip()
+        return self.build_transaction(type_choice, category_choice, payment_method_choice, receipt_number, notes)
+
+    def build_transaction(self, type_choice: str, category_choice: str, payment_method_choice: str,
+                          receipt_number: str, notes: str) -> dict:
+        """
+        Builds the transaction details from the date, provider and amount set on this instance.
+
+        Parameters:
+        type_choice (str): Type of the transaction.
+        category_choice (str): Category of the transaction.
+        payment_method_choice (str): Payment method of the transaction.
+        receipt_number (str): Receipt number of the transaction.
+        notes (str): Notes for the transaction.
+
+        Returns:
+        dict: Dictionary containing the transaction details.
+        """
         hsa_cash_bal = "-"
         attachments = "Y" if self.is_receipt else "N"
         in_hsa = "Y" if payment_method_choice == "HSA Account" else "N"
-        notes = input("NOTES: ").strip()
         new_name = f"{receipt_number}_{self.amount}"
         user_inputs = {
             'Date': self.date,